@@ -1,50 +1,55 @@
+import time
+script_start = time.perf_counter()
+
 import os
 import streamlit as st
 from app_tab1 import render_story_tab
+from app_tab2 import render_mktg_campaign_tab
+from playground import render_playground_tab
+from registry import load_registry
+from router import ModelRouter
+from run_timing import record, render_run_times
 from vertexai.preview.generative_models import GenerativeModel
 import vertexai
 import logging
 from google.cloud import logging as cloud_logging
 
-# configure logging
-logging.basicConfig(level=logging.INFO)
-# attach a Cloud Logging handler to the root logger
-log_client = cloud_logging.Client()
-log_client.setup_logging()
-
 PROJECT_ID = os.environ.get('PROJECT_ID')   # Your Qwiklabs Google Cloud Project ID
 LOCATION = os.environ.get('REGION')         # Your Qwiklabs Google Cloud Project Region
-vertexai.init(project=PROJECT_ID, location=LOCATION)
 
+# configure logging and Vertex AI once per process, not on every rerun
+@st.cache_resource
+def setup():
+    logging.basicConfig(level=logging.INFO)
+    # attach a Cloud Logging handler to the root logger
+    log_client = cloud_logging.Client()
+    log_client.setup_logging()
+    vertexai.init(project=PROJECT_ID, location=LOCATION)
+
+# both kinds of request go through the router, which picks a model per request
 @st.cache_resource
 def load_models():
-    text_model = GenerativeModel("gemini-2.0-flash")
-    multimodal_model = GenerativeModel("gemini-2.0-flash")
-    return text_model, multimodal_model
+    router = ModelRouter(GenerativeModel)
+    return router, router
 
+setup()
 st.header("Vertex AI Gemini API", divider="rainbow")
 text_model, multimodal_model = load_models()
 
-tab1, tab2, tab3, tab4 = st.tabs(["Story", "Marketing Campaign", "Video Playground", "Image Playground"])
+# the playground tabs come from the scenario registry
+playgrounds = load_registry().playgrounds
+tab1, tab2, *playground_tabs = st.tabs(["Story", "Marketing Campaign"] + [playground["title"] for playground in playgrounds])
 
+# each tab is a fragment: its widgets only rerun that tab
 with tab1:
     render_story_tab(text_model)
 
-
-from app_tab2 import render_mktg_campaign_tab
-
 with tab2:
     render_mktg_campaign_tab(text_model)
 
+for tab, playground in zip(playground_tabs, playgrounds):
+    with tab:
+        render_playground_tab(multimodal_model, playground["id"])
 
-from app_tab3 import render_video_playground_tab
-
-with tab3:
-    render_video_playground_tab(multimodal_model)
-
-
-from app_tab4 import render_image_playground_tab
-
-with tab4:
-    render_image_playground_tab(multimodal_model)
-
+render_run_times()
+record("full script", time.perf_counter() - script_start)
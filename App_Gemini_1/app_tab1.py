@@ -1,62 +1,118 @@
 import streamlit as st
 from vertexai.preview.generative_models import GenerativeModel
 from response_utils import *
+from prompts import semantic_key, story_config, story_prompt, story_request_type
+from story_pipeline import expand_sections, generate_outline, stitch_story
+from run_timing import timed
+from telemetry import request_tab
+from cancellation import session_request
+from output_store import log_response
 import logging
+import time
 
 # create the model prompt based on user input.
 def generate_prompt():
     # Story character input
-    character_name = st.text_input("Enter character name: \n\n",key="character_name",value="Mittens")
-    character_type = st.text_input("What type of character is it? \n\n",key="character_type",value="Cat")
+    character_name = st.text_input("Enter character name: \n\n",key="character_name",value="Mittens",max_chars=100)
+    character_type = st.text_input("What type of character is it? \n\n",key="character_type",value="Cat",max_chars=100)
     character_persona = st.text_input("What personality does the character have? \n\n",
-                                      key="character_persona",value="Mitten is a very friendly cat.")
-    character_location = st.text_input("Where does the character live? \n\n",key="character_location",value="Andromeda Galaxy")
+                                      key="character_persona",value="Mitten is a very friendly cat.",max_chars=500)
+    character_location = st.text_input("Where does the character live? \n\n",key="character_location",value="Andromeda Galaxy",max_chars=200)
 
     # Story length and premise
     length_of_story = st.radio("Select the length of the story: \n\n",["Short","Long"],key="length_of_story",horizontal=True)
     story_premise = st.multiselect("What is the story premise? (can select multiple) \n\n",["Love","Adventure","Mystery","Horror","Comedy","Sci-Fi","Fantasy","Thriller"],key="story_premise",default=["Love","Adventure"])
     creative_control = st.radio("Select the creativity level: \n\n",["Low","High"],key="creative_control",horizontal=True)
-    if creative_control == "Low":
-        temperature = 0.30
-    else:
-        temperature = 0.95
-
-    prompt = f"""Write a {length_of_story} story based on the following premise: \n
-    character_name: {character_name} \n
-    character_type: {character_type} \n
-    character_persona: {character_persona} \n
-    character_location: {character_location} \n
-    story_premise: {",".join(story_premise)} \n
-    If the story is "short", then make sure to have 5 chapters or else if it is "long" then 10 chapters. 
-    Important point is that each chapter should be generated based on the premise given above.
-    First start by giving the book introduction, chapter introductions and then each chapter. It should also have a proper ending.
-    The book should have a prologue and an epilogue.
-    """
-
-    return temperature, prompt
+
+    details = {
+        "name": character_name,
+        "type": character_type,
+        "persona": character_persona,
+        "location": character_location,
+        "length": length_of_story,
+        "premise": story_premise,
+        "creativity": creative_control,
+    }
+
+    return details, story_config(details)
+
+# write the story in one call, streaming it as it is generated.
+def render_single_call_story(text_model: GenerativeModel, prompt, config, details):
+    stats = StreamStats()
+    try:
+        response = st.write_stream(stream_gemini_text_response(text_model, prompt, generation_config=config, stats=stats,
+                                                               semantic_key=semantic_key("story", details),
+                                                               route=story_request_type(details)))
+    except PromptTooLargeError as e:
+        st.error(f"Your story details are too long: {e}. Please shorten them.")
+        response = None
+    st.caption(stats.summary())
+    return response
+
+# plan the chapters, then write them concurrently, showing each one as soon as it is finished.
+def render_chaptered_story(text_model: GenerativeModel, details, temperature):
+    start = time.monotonic()
+    with st.spinner("Planning the chapters..."):
+        book_title, sections, outline = generate_outline(text_model, details, temperature)
+
+    st.markdown(f"# {book_title}")
+    placeholders = []
+    for section in sections:
+        placeholder = st.empty()
+        placeholder.caption(f"Writing {section['title']}...")
+        placeholders.append(placeholder)
+
+    results = [None] * len(sections)
+    for index, result in expand_sections(text_model, details, book_title, sections, temperature):
+        results[index] = result
+        with placeholders[index].container():
+            st.markdown(f"## {sections[index]['title']}")
+            if result.ok:
+                st.markdown(result.text)
+                st.caption(f"Written in {result.latency:.1f}s")
+            else:
+                st.error(f"This section could not be written: {result.error}")
+
+    failed = sum(1 for result in results if not result.ok)
+    summary = f"{len(sections)} sections in {time.monotonic() - start:.1f}s"
+    if failed:
+        summary += f", {failed} failed"
+    st.caption(summary)
+    return stitch_story(book_title, sections, results), outline
 
 # function to render the story tab, and call the model, and display the model prompt and response.
+@st.fragment
+@timed("story tab")
+@request_tab("story")
 def render_story_tab (text_model: GenerativeModel):
     st.subheader("Generate a story")
 
-    temperature, prompt = generate_prompt()
-
-    config = {
-        "temperature": temperature,
-        "max_output_tokens": 2048,
-        }
+    details, config = generate_prompt()
+    temperature = config["temperature"]
+    prompt = story_prompt(details)
+    generation_mode = st.radio("How should the story be written? \n\n",["Chapter by chapter","Single call"],key="story_generation_mode",horizontal=True)
 
     generate_t2t = st.button("Generate my story", key="generate_t2t")
     if generate_t2t and prompt:
         # st.write(prompt)
-        with st.spinner("Generating your story using Gemini..."):
+        # a new story cancels this session's previous one if it is still being written
+        with st.spinner("Generating your story using Gemini..."), session_request("story"):
             first_tab1, first_tab2 = st.tabs(["Story response", "Prompt"])
-            with first_tab1: 
-                response = get_gemini_text_response(text_model, prompt, generation_config=config)
+            with first_tab1:
+                st.write("Your story:")
+                if generation_mode == "Chapter by chapter":
+                    try:
+                        response, outline = render_chaptered_story(text_model, details, temperature)
+                    except (PromptTooLargeError, ValueError) as e:
+                        # fall back to writing the whole story in one call
+                        logging.warning(f"chaptered story failed, using a single call: {e}")
+                        response, outline = render_single_call_story(text_model, prompt, config, details), None
+                else:
+                    response, outline = render_single_call_story(text_model, prompt, config, details), None
                 if response:
-                    st.write("Your story:")
-                    st.write(response)
-                    logging.info(response)
-            with first_tab2: 
+                    log_response("story", prompt, response)
+            with first_tab2:
                 st.text(prompt)
-
+                if outline:
+                    st.write("Chapter outline:")
+                    st.text(outline)
@@ -1,12 +1,16 @@
 import streamlit as st
 from vertexai.preview.generative_models import GenerativeModel
+from prompts import campaign_config, campaign_prompt, semantic_key
 from response_utils import *
-import logging
+from run_timing import timed
+from telemetry import request_tab
+from cancellation import session_request
+from output_store import log_response
 
 # create the model prompt based on user input.
 def generate_prompt():
 
-    product_name = st.text_input("What is the name of the product? \n\n",key="product_name",value="ZomZoo")
+    product_name = st.text_input("What is the name of the product? \n\n",key="product_name",value="ZomZoo",max_chars=100)
     product_category = st.radio("Select your product category: \n\n",["Clothing","Electronics","Food","Health & Beauty","Home & Garden"],key="product_category",horizontal=True)
 
     st.write("Select your target audience: ")
@@ -21,61 +25,46 @@ def generate_prompt():
     brand_voice = st.radio("Select your brand voice: \n\n",["Formal","Informal","Serious","Humorous"],key="brand_voice",horizontal=True)
     estimated_budget = st.radio("Select your estimated budget ($): \n\n",["1,000-5,000","5,000-10,000","10,000-20,000","20,000+"],key="estimated_budget",horizontal=True)
 
-    prompt = f"""Generate a marketing campaign for {product_name}, a {product_category} designed for the age group: {target_audience_age}. 
-    The target location is this: {target_audience_location}.
-    Aim to primarily achieve {campaign_goal}. 
-    Emphasize the product's unique selling proposition while using a {brand_voice} tone of voice. 
-    Allocate the total budget of {estimated_budget}.  
-    With these inputs, make sure to follow following guidelines and generate the marketing campaign with proper headlines: \n
-    - Briefly describe the company, its values, mission, and target audience.
-    - Highlight any relevant brand guidelines or messaging frameworks.
-    - Provide a concise overview of the campaign's objectives and goals.
-    - Briefly explain the product or service being promoted.
-    - Define your ideal customer with clear demographics, psychographics, and behavioral insights.
-    - Understand their needs, wants, motivations, and pain points.
-    - Clearly articulate the desired outcomes for the campaign.
-    - Use SMART goals (Specific, Measurable, Achievable, Relevant, and Time-bound) for clarity.
-    - Define key performance indicators (KPIs) to track progress and success.
-    - Specify the primary and secondary goals of the campaign.
-    - Examples include brand awareness, lead generation, sales growth, or website traffic.
-    - Clearly define what differentiates your product or service from competitors.
-    - Emphasize the value proposition and unique benefits offered to the target audience.
-    - Define the desired tone and personality of the campaign messaging.
-    - Identify the specific channels you will use to reach your target audience.
-    - Clearly state the desired action you want the audience to take.
-    - Make it specific, compelling, and easy to understand.
-    - Identify and analyze your key competitors in the market.
-    - Understand their strengths and weaknesses, target audience, and marketing strategies.
-    - Develop a differentiation strategy to stand out from the competition.
-    - Define how you will track the success of the campaign.
-    - Use relevant KPIs to measure performance and return on investment (ROI).
-    Provide bullet points and headlines for the marketing campaign. Do not produce any empty lines. Be very succinct and to the point.
-    """
+    inputs = {
+        "product_name": product_name,
+        "product_category": product_category,
+        "target_audience_age": target_audience_age,
+        "target_audience_location": target_audience_location,
+        "campaign_goal": campaign_goal,
+        "brand_voice": brand_voice,
+        "estimated_budget": estimated_budget,
+    }
 
-    return prompt
+    return inputs
 
 # function to render the story tab, and call the model, and display the model prompt and response.
+@st.fragment
+@timed("campaign tab")
+@request_tab("campaign")
 def render_mktg_campaign_tab (text_model: GenerativeModel):
     st.subheader("Generate a marketing campaign")
 
-    prompt = generate_prompt()
-
-    config = {
-        "temperature": 0.8,
-        "max_output_tokens": 2048,
-        }
+    inputs = generate_prompt()
+    prompt, config = campaign_prompt(inputs), campaign_config(inputs)
 
     generate_t2m = st.button("Generate campaign", key="generate_t2m")
     if generate_t2m and prompt:
         # st.write(prompt)
-        with st.spinner("Generating a marketing campaign using Gemini..."):
+        with st.spinner("Generating a marketing campaign using Gemini..."), session_request("campaign"):
             first_tab1, first_tab2 = st.tabs(["Campaign response", "Prompt"])
             with first_tab1: 
-                response = get_gemini_text_response(text_model, prompt, generation_config=config)
+                st.write("Marketing campaign:")
+                stats = StreamStats()
+                try:
+                    response = st.write_stream(stream_gemini_text_response(text_model, prompt, generation_config=config, stats=stats,
+                                                               semantic_key=semantic_key("campaign", inputs),
+                                                               route="campaign"))
+                except PromptTooLargeError as e:
+                    st.error(f"Your campaign details are too long: {e}. Please shorten them.")
+                    response = None
+                st.caption(stats.summary())
                 if response:
-                    st.write("Marketing campaign:")
-                    st.write(response)
-                    logging.info(response)
+                    log_response("campaign", prompt, response, stats)
             with first_tab2: 
                 st.text(prompt)
 
@@ -0,0 +1,202 @@
+"""Local disk cache of the playground's gs:// images.
+
+The playground tabs showed their images from storage.googleapis.com, so every
+page load pulled them from Cloud Storage. They are now downloaded once per
+container, in parallel, into ASSET_CACHE_DIR, and shown from disk. Videos are
+not cached: Streamlit would hold each one in the server's memory and send it
+through the app, so the browser streams them from their public URL instead,
+in ranges as they play. A file is named after its object's generation (or ETag), so a
+changed object is downloaded again; a cheap HEAD request checks this when the
+process starts. Large objects are fetched in parallel ranges, and downloads
+are checked against the object's MD5 before they are used. If Cloud Storage
+cannot be reached, the newest cached copy is used.
+
+The Dockerfile runs this module at build time, so a container starts with the
+assets in place:
+
+    python asset_cache.py
+"""
+
+import base64
+import glob
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent import futures
+
+ENABLED = os.environ.get("ASSET_CACHE_ENABLED", "1") == "1"
+CACHE_DIR = os.environ.get("ASSET_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gemini_assets"))
+BASE_URL = os.environ.get("ASSET_BASE_URL", "https://storage.googleapis.com")
+# objects at least this large are downloaded as parallel ranges of RANGE_BYTES
+RANGE_THRESHOLD_BYTES = 8 * 1024 * 1024
+RANGE_BYTES = 4 * 1024 * 1024
+MAX_CONNECTIONS = 8
+TIMEOUT_SECONDS = 60
+
+
+# whether an asset is cached and served by the app, rather than by Cloud Storage.
+def is_cached_type(mime_type):
+    return mime_type.startswith("image/")
+
+
+def http_url(uri, base_url=BASE_URL):
+    return f"{base_url.rstrip('/')}/{uri[len('gs://'):]}"
+
+
+# size, version and MD5 of an object, from the headers of a HEAD request.
+def _object_metadata(headers):
+    hashes = ",".join(headers.get_all("x-goog-hash") or [])
+    md5 = re.search(r"md5=([^,\s]+)", hashes)
+    version = headers.get("x-goog-generation") or (headers.get("ETag") or "").strip('"')
+    return {
+        "size": int(headers.get("Content-Length", 0)),
+        "version": re.sub(r"[^\w.-]", "_", version) or "unversioned",
+        "md5": base64.b64decode(md5.group(1)) if md5 else None,
+    }
+
+
+class AssetCache:
+
+    def __init__(self, directory=CACHE_DIR, base_url=BASE_URL, max_connections=MAX_CONNECTIONS,
+                 range_threshold=RANGE_THRESHOLD_BYTES, range_bytes=RANGE_BYTES):
+        self.directory = directory
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.range_threshold = range_threshold
+        self.range_bytes = range_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.downloads = 0
+        self.failures = 0
+        self.bytes_downloaded = 0
+
+    def _request(self, url, method="GET", headers=None):
+        return urllib.request.urlopen(urllib.request.Request(url, method=method, headers=headers or {}),
+                                      timeout=TIMEOUT_SECONDS)
+
+    # files of an object are <prefix>-<version><extension>
+    def _prefix(self, uri):
+        return os.path.join(self.directory, hashlib.sha256(uri.encode("utf-8")).hexdigest()[:16])
+
+    def _path(self, uri, version):
+        return f"{self._prefix(uri)}-{version}{os.path.splitext(uri)[1]}"
+
+    def _count(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    # local path of the current version of the object, downloading it if needed.
+    def fetch(self, uri):
+        url = http_url(uri, self.base_url)
+        try:
+            with self._request(url, method="HEAD") as response:
+                metadata = _object_metadata(response.headers)
+        except OSError as e:
+            cached = sorted(glob.glob(self._prefix(uri) + "-*"), key=os.path.getmtime)
+            if cached:
+                logging.warning(f"could not check {uri}, using the cached copy: {e}")
+                self._count(hits=1)
+                return cached[-1]
+            raise
+
+        path = self._path(uri, metadata["version"])
+        if os.path.exists(path) and os.path.getsize(path) == metadata["size"]:
+            self._count(hits=1)
+            return path
+
+        os.makedirs(self.directory, exist_ok=True)
+        partial = f"{path}.{threading.get_ident()}.part"
+        try:
+            self._download(url, partial, metadata["size"])
+            if metadata["md5"] is not None and _md5(partial) != metadata["md5"]:
+                raise IOError(f"{uri} does not match its MD5")
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        self._count(downloads=1)
+
+        # older versions of the object are no longer needed
+        for old in glob.glob(self._prefix(uri) + "-*"):
+            if old != path and not old.endswith(".part"):
+                os.remove(old)
+        return path
+
+    def _download(self, url, path, size):
+        if size < self.range_threshold:
+            with self._request(url) as response, open(path, "wb") as f:
+                data = response.read()
+                f.write(data)
+            self._count(bytes_downloaded=len(data))
+            return
+
+        with open(path, "wb") as f:
+            f.truncate(size)
+
+        def fetch_range(start):
+            end = min(start + self.range_bytes, size) - 1
+            with self._request(url, headers={"Range": f"bytes={start}-{end}"}) as response:
+                data = response.read()
+            if len(data) != end - start + 1:
+                raise IOError(f"range {start}-{end} of {url} returned {len(data)} bytes")
+            with open(path, "r+b") as f:
+                f.seek(start)
+                f.write(data)
+            self._count(bytes_downloaded=len(data))
+
+        with futures.ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix="asset-range") as executor:
+            for future in [executor.submit(fetch_range, start) for start in range(0, size, self.range_bytes)]:
+                future.result()
+
+    # fetch every object in parallel; returns uri -> local path, or None if it failed.
+    def prefetch(self, uris):
+        uris = list(dict.fromkeys(uris))
+
+        def fetch(uri):
+            try:
+                return self.fetch(uri)
+            except Exception as e:
+                self._count(failures=1)
+                logging.warning(f"could not cache {uri}, it will be loaded from Cloud Storage: {e}")
+                return None
+
+        with futures.ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix="asset") as executor:
+            return dict(zip(uris, executor.map(fetch, uris)))
+
+    def metrics(self):
+        with self.lock:
+            return {"hits": self.hits, "downloads": self.downloads, "failures": self.failures,
+                    "bytes_downloaded": self.bytes_downloaded}
+
+
+def _md5(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+# one cache per process
+ASSET_CACHE = AssetCache()
+
+
+def main():
+    from registry import load_registry
+    logging.basicConfig(level=logging.INFO)
+    assets = load_registry().assets
+    start = time.perf_counter()
+    paths = ASSET_CACHE.prefetch(asset["uri"] for asset in assets.values() if is_cached_type(asset["mime_type"]))
+    metrics = ASSET_CACHE.metrics()
+    print(f"{sum(1 for path in paths.values() if path)}/{len(paths)} assets cached in {CACHE_DIR} "
+          f"in {time.perf_counter() - start:.1f}s, {metrics['bytes_downloaded'] / 1e6:.1f} MB downloaded")
+
+
+if __name__ == "__main__":
+    main()
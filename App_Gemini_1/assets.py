@@ -0,0 +1,57 @@
+"""Images and videos used by the playground tabs.
+
+Streamlit reruns the whole script on every interaction. The images are cached
+on local disk once per process (see asset_cache.py), videos are shown from
+their public URL, and the display sources
+and Part objects for them are built once and reused by every rerun and every
+session. Small images are sent to the model inline, which saves the model a
+fetch from Cloud Storage; videos and large images are sent by URI.
+"""
+
+import os
+
+import streamlit as st
+from asset_cache import ASSET_CACHE, ENABLED as ASSET_CACHE_ENABLED, is_cached_type
+from registry import load_registry
+from vertexai.preview.generative_models import Part
+
+# name -> {"uri": gs:// URI, "mime_type": ...}, from the scenario registry
+ASSETS = load_registry().assets
+
+# images up to this size are sent inline rather than by URI
+INLINE_MAX_BYTES = int(os.environ.get("ASSET_INLINE_MAX_BYTES", 256 * 1024))
+
+
+def public_url(uri):
+    return "https://storage.googleapis.com/"+uri.split("gs://")[1]
+
+
+# local path of each image that could be cached.
+@st.cache_resource
+def asset_files():
+    if not ASSET_CACHE_ENABLED:
+        return {}
+    cached = {name: asset for name, asset in ASSETS.items() if is_cached_type(asset["mime_type"])}
+    paths = ASSET_CACHE.prefetch(asset["uri"] for asset in cached.values())
+    return {name: paths[asset["uri"]] for name, asset in cached.items() if paths[asset["uri"]]}
+
+
+# what st.image and st.video show for each asset: the cached file, else its public URL.
+@st.cache_data
+def asset_sources():
+    files = asset_files()
+    return {name: files.get(name) or public_url(asset["uri"]) for name, asset in ASSETS.items()}
+
+
+def _part(asset, path):
+    if path and asset["mime_type"].startswith("image/") and os.path.getsize(path) <= INLINE_MAX_BYTES:
+        with open(path, "rb") as f:
+            return Part.from_data(f.read(), mime_type=asset["mime_type"])
+    return Part.from_uri(asset["uri"], mime_type=asset["mime_type"])
+
+
+# Part of each asset, for prompts. Parts are not picklable, so they are a cached resource.
+@st.cache_resource
+def asset_parts():
+    files = asset_files()
+    return {name: _part(asset, files.get(name)) for name, asset in ASSETS.items()}
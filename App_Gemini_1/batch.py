@@ -0,0 +1,279 @@
+"""Generate campaigns and stories offline from a file of inputs.
+
+Each row of a JSONL or CSV file holds the inputs of one campaign or story (the
+same fields as the Streamlit tabs; missing fields take the tab defaults, list
+fields are ";"-separated in CSV). Prompts are built with the templates in
+prompts.py and the results are appended to a JSONL file, one line per row.
+
+Rows are sent online with bounded concurrency, or as one Vertex AI batch
+prediction job with --vertex-batch. The output file is the checkpoint: a rerun
+skips rows that already succeeded, and a submitted batch job is resumed rather
+than submitted again.
+
+    python batch.py campaigns.csv --kind campaign --output campaigns.jsonl
+    python batch.py rows.jsonl --output results.jsonl --concurrency 8
+    python batch.py campaigns.csv --kind campaign --output campaigns.jsonl --vertex-batch gs://my-bucket/batch
+    python batch.py campaigns.csv --kind campaign --output campaigns.jsonl --fake
+"""
+
+import argparse
+import csv
+import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+
+from prompts import TEMPLATES
+from rate_limiter import BATCH
+from response_utils import (MAX_CONCURRENT_REQUESTS, REQUEST_TIMEOUT_SECONDS, SAFETY_SETTINGS, estimate_text_tokens,
+                            fan_out, get_gemini_text_response)
+from telemetry import request_tab
+
+MODEL_NAME = "gemini-2.0-flash"
+CHECKPOINT_EVERY = 50
+POLL_SECONDS = 30
+
+
+def _parse_value(field, value, defaults):
+    if isinstance(defaults.get(field), list) and isinstance(value, str):
+        return [item.strip() for item in value.split(";") if item.strip()]
+    return value
+
+
+# read the rows of a JSONL or CSV file as {"id", "kind", "inputs"}.
+def read_rows(path, kind=None):
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            records = list(csv.DictReader(f))
+        else:
+            records = [json.loads(line) for line in f if line.strip()]
+
+    rows = []
+    for number, record in enumerate(records, start=1):
+        row_kind = record.pop("kind", None) or kind
+        if row_kind not in TEMPLATES:
+            raise ValueError(f"row {number}: unknown kind {row_kind!r}, expected one of {sorted(TEMPLATES)}")
+        row_id = str(record.pop("id", None) or number)
+        defaults = TEMPLATES[row_kind][0]
+        inputs = dict(defaults)
+        inputs.update({field: _parse_value(field, value, defaults)
+                       for field, value in record.items() if value not in (None, "")})
+        rows.append({"id": row_id, "kind": row_kind, "inputs": inputs})
+    return rows
+
+
+def build_request(row):
+    _, prompt_template, config_template = TEMPLATES[row["kind"]]
+    return prompt_template(row["inputs"]), config_template(row["inputs"])
+
+
+# ids of the rows already written successfully to the output file.
+def completed_ids(output):
+    status = {}
+    if os.path.exists(output):
+        with open(output, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    result = json.loads(line)
+                    status[result["id"]] = result["status"]
+    return {row_id for row_id, row_status in status.items() if row_status == "ok"}
+
+
+def _record(row, text=None, error=None, latency=None):
+    return {
+        "id": row["id"],
+        "kind": row["kind"],
+        "inputs": row["inputs"],
+        "status": "ok" if error is None else "error",
+        "text": text,
+        "error": None if error is None else str(error),
+        "latency_s": latency,
+        "completed_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def _append(output, records):
+    with open(output, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# send the rows online, checkpointing every CHECKPOINT_EVERY rows.
+def run_online(model, rows, output, concurrency, timeout, checkpoint_every=CHECKPOINT_EVERY):
+    records = []
+    for start in range(0, len(rows), checkpoint_every):
+        chunk = rows[start:start + checkpoint_every]
+
+        def generate(row):
+            prompt, config = build_request(row)
+            # queued behind the app's interactive requests for quota
+            return get_gemini_text_response(model, prompt, config, priority=BATCH)
+
+        results = fan_out(generate, chunk, concurrency, timeout)
+        chunk_records = [_record(row, result.text, result.error, result.latency) for row, result in zip(chunk, results)]
+        _append(output, chunk_records)
+        records.extend(chunk_records)
+        logging.info(f"{start + len(chunk)}/{len(rows)} rows done")
+    return records
+
+
+# a Vertex AI batch prediction job reading from and writing to Cloud Storage.
+class VertexBatchBackend:
+
+    def __init__(self, staging_uri):
+        from google.cloud import storage
+        from vertexai.batch_prediction import BatchPredictionJob
+        self.storage = storage.Client()
+        self.jobs = BatchPredictionJob
+        self.staging_uri = staging_uri.rstrip("/")
+
+    def _blob(self, uri):
+        bucket, _, name = uri[len("gs://"):].partition("/")
+        return self.storage.bucket(bucket).blob(name)
+
+    def submit(self, model_name, requests):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        input_uri = f"{self.staging_uri}/input-{stamp}.jsonl"
+        self._blob(input_uri).upload_from_string("\n".join(json.dumps(request) for request in requests))
+        job = self.jobs.submit(source_model=model_name, input_dataset=input_uri,
+                               output_uri_prefix=f"{self.staging_uri}/output-{stamp}")
+        return job.resource_name
+
+    # wait for the job; returns None on success or its error.
+    def wait(self, job_name, poll_seconds=POLL_SECONDS):
+        job = self.jobs(job_name)
+        while not job.has_ended:
+            logging.info(f"batch job {job_name} is {job.state.name}")
+            time.sleep(poll_seconds)
+            job.refresh()
+        return None if job.has_succeeded else job.error
+
+    def results(self, job_name):
+        bucket, _, prefix = self.jobs(job_name).output_location[len("gs://"):].partition("/")
+        for blob in self.storage.list_blobs(bucket, prefix=prefix):
+            if blob.name.endswith(".jsonl"):
+                for line in blob.download_as_text().splitlines():
+                    if line.strip():
+                        yield json.loads(line)
+
+
+# the same request the tabs and online mode send, as a line of the job's input.
+def _batch_request(prompt, config):
+    return {"request": {"contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                        "generationConfig": {"temperature": config["temperature"],
+                                             "maxOutputTokens": config["max_output_tokens"]},
+                        "safetySettings": [{"category": category.name, "threshold": threshold.name}
+                                           for category, threshold in SAFETY_SETTINGS.items()]}}
+
+
+def _prompt_key(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _response_text(result):
+    candidates = result.get("response", {}).get("candidates", [])
+    if not candidates:
+        return None
+    return "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+
+
+# submit the rows as one batch prediction job, or resume the one recorded next to the output.
+def run_batch_job(backend, model_name, rows, output):
+    job_file = f"{output}.job"
+    prompts = {}
+    for row in rows:
+        prompt, config = build_request(row)
+        prompts.setdefault(_prompt_key(prompt), (prompt, config, []))[2].append(row)
+
+    if os.path.exists(job_file):
+        with open(job_file) as f:
+            job_name = f.read().strip()
+        logging.info(f"resuming batch job {job_name}")
+    else:
+        job_name = backend.submit(model_name, [_batch_request(prompt, config) for prompt, config, _ in prompts.values()])
+        with open(job_file, "w") as f:
+            f.write(job_name)
+        logging.info(f"submitted batch job {job_name}")
+
+    error = backend.wait(job_name)
+    if error:
+        os.remove(job_file)
+        raise RuntimeError(f"batch job {job_name} failed: {error}")
+
+    # the output repeats each request, which maps it back to its rows
+    records, seen = [], set()
+    for result in backend.results(job_name):
+        key = _prompt_key(result["request"]["contents"][0]["parts"][0]["text"])
+        if key not in prompts or key in seen:
+            continue
+        seen.add(key)
+        text = _response_text(result)
+        error = result.get("status") or (None if text is not None else "no response")
+        records.extend(_record(row, text, error) for row in prompts[key][2])
+    for key, (_, _, key_rows) in prompts.items():
+        if key not in seen:
+            records.extend(_record(row, error="missing from batch output") for row in key_rows)
+
+    _append(output, records)
+    os.remove(job_file)
+    return records
+
+
+def report(records, elapsed):
+    ok = [record for record in records if record["status"] == "ok"]
+    errors = len(records) - len(ok)
+    tokens = sum(estimate_text_tokens(record["text"]) for record in ok)
+    print(f"{len(records)} rows in {elapsed:.1f}s: {len(ok)} ok, {errors} failed "
+          f"(error rate {100 * errors / len(records) if records else 0:.1f}%)")
+    if elapsed:
+        print(f"throughput {len(records) / elapsed:.2f} rows/s, ~{tokens / elapsed:.0f} output tokens/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", help="JSONL or CSV file of inputs")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("--kind", choices=sorted(TEMPLATES), help="template for rows without a kind field")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_REQUESTS)
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT_SECONDS, help="seconds per request")
+    parser.add_argument("--vertex-batch", metavar="GS_URI", help="submit a Vertex AI batch prediction job staged here")
+    parser.add_argument("--fake", action="store_true", help="use a local fake model (and batch job) instead of Vertex AI")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    rows = read_rows(args.input, args.kind)
+    done = completed_ids(args.output)
+    pending = [row for row in rows if row["id"] not in done]
+    if done:
+        logging.info(f"skipping {len(rows) - len(pending)} rows already in {args.output}")
+    if not pending:
+        print("nothing to do")
+        return
+
+    if args.fake:
+        from fakes import FakeBatchBackend, FakeGenerativeModel
+        model = FakeGenerativeModel(model_name=args.model, first_token_latency=0.2, tokens_per_second=2000)
+        backend = FakeBatchBackend(model)
+    else:
+        import vertexai
+        from vertexai.preview.generative_models import GenerativeModel
+        vertexai.init(project=os.environ.get('PROJECT_ID'), location=os.environ.get('REGION'))
+        model = GenerativeModel(args.model)
+        backend = VertexBatchBackend(args.vertex_batch) if args.vertex_batch else None
+
+    start = time.perf_counter()
+    if args.vertex_batch:
+        records = run_batch_job(backend, args.model, pending, args.output)
+    else:
+        with request_tab("batch"):
+            records = run_online(model, pending, args.output, args.concurrency, args.timeout)
+    report(records, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Measure loading the playground assets from Cloud Storage and from the disk cache.
+
+A FakeStorageServer stands in for storage.googleapis.com, serving objects of
+the registry's paths and types (sizes are made up: the videos are large, the
+images small) with a fixed delay per request and bandwidth per connection.
+
+  - direct: every page load fetches every asset from storage, six at a time,
+    as a browser does when the page shows public URLs.
+  - cold cache: AssetCache downloads the images once.
+  - warm restart: a new process only checks the versions (HEAD requests).
+  - one changed: one image has a new generation and is downloaded again.
+  - app first run: the app script in AppTest, with an empty and a warm cache.
+
+"MB from storage" is what the server (or, for direct, the browser) downloads
+from Cloud Storage. "MB via app" is what Streamlit holds in memory for the
+page's media and sends to every browser that loads it; the videos are still
+fetched by the browser from Cloud Storage, as the last line reports.
+
+    python benchmark_assets.py
+    python benchmark_assets.py --video-mb 64 --bandwidth-mb 20
+"""
+
+import argparse
+import io
+import os
+import tempfile
+import time
+import urllib.request
+from concurrent import futures
+
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+
+from asset_cache import AssetCache, http_url, is_cached_type
+from benchmark_rerun import HARNESS
+from fakes import FakeStorageServer
+from registry import load_registry
+
+
+# a noise image of about size bytes, which st.image can decode. Noise does not
+# compress: a PNG takes 3 bytes a pixel, a JPEG at quality 95 about 1.2.
+def noise_image(size, mime_type):
+    kind = mime_type.split("/")[1]
+    side = max(1, int((size / (3 if kind == "png" else 1.2)) ** 0.5))
+    output = io.BytesIO()
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(output, kind, quality=95)
+    return output.getvalue()
+
+
+def make_objects(video_mb, image_kb):
+    objects = {}
+    for asset in load_registry().assets.values():
+        if asset["mime_type"].startswith("video/"):
+            data = os.urandom(video_mb * 1024 * 1024)
+        else:
+            data = noise_image(image_kb * 1024, asset["mime_type"])
+        objects[asset["uri"][len("gs://"):]] = data
+    return objects
+
+
+def direct_page_load(storage, uris):
+
+    def get(uri):
+        with urllib.request.urlopen(http_url(uri, storage.base_url)) as response:
+            return len(response.read())
+
+    with futures.ThreadPoolExecutor(max_workers=6) as executor:
+        return sum(executor.map(get, uris))
+
+
+def timed(storage, action):
+    storage.reset_counts()
+    start = time.perf_counter()
+    result = action()
+    return time.perf_counter() - start, storage.requests, storage.bytes_sent, result
+
+
+# appended to the app script: the bytes of media files Streamlit holds in memory
+# and serves from /media to every browser that loads the page.
+MEDIA_BYTES = """
+from streamlit.runtime import Runtime
+stats = Runtime.instance().media_file_mgr._storage.get_stats()
+st.session_state["media_bytes"] = sum(stat.byte_length for family in stats.values() for stat in family)
+"""
+
+
+# the app's first run, with its asset cache pointed at the fake storage; returns
+# the bytes of media it serves.
+def app_first_run(storage, directory):
+    harness = (f"from asset_cache import ASSET_CACHE\n"
+               f"ASSET_CACHE.base_url = {storage.base_url!r}\n"
+               f"ASSET_CACHE.directory = {directory!r}\n") + HARNESS + MEDIA_BYTES
+    import streamlit as st
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    app = AppTest.from_string(harness, default_timeout=300)
+    app.run()
+    if app.exception:
+        raise SystemExit(app.exception[0].message)
+    return app.session_state["media_bytes"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--video-mb", type=int, default=24, help="size of each video")
+    parser.add_argument("--image-kb", type=int, default=200, help="size of each image")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="delay of each request")
+    parser.add_argument("--bandwidth-mb", type=float, default=40.0, help="MB/s per connection")
+    args = parser.parse_args()
+
+    objects = make_objects(args.video_mb, args.image_kb)
+    storage = FakeStorageServer(objects, latency=args.latency_ms / 1000, bandwidth=args.bandwidth_mb * 1024 * 1024)
+    uris = [f"gs://{name}" for name in objects]
+    assets = load_registry().assets.values()
+    image_uris = [asset["uri"] for asset in assets if is_cached_type(asset["mime_type"])]
+    video_bytes = sum(len(objects[asset["uri"][len("gs://"):]]) for asset in assets if not is_cached_type(asset["mime_type"]))
+    directory = tempfile.mkdtemp(prefix="assets-")
+
+    print(f"{'case':<22}{'seconds':>9}{'requests':>10}{'MB from storage':>17}{'MB via app':>12}")
+    cases = [
+        ("direct (per load)", lambda: direct_page_load(storage, uris)),
+        ("cold cache", lambda: AssetCache(directory, storage.base_url).prefetch(image_uris)),
+        ("warm restart", lambda: AssetCache(directory, storage.base_url).prefetch(image_uris)),
+        ("one changed", lambda: (storage.update(next(name for name in objects if name.endswith(".png")), noise_image(1000, "image/png")),
+                                 AssetCache(directory, storage.base_url).prefetch(image_uris))),
+        ("app first run, cold", lambda: app_first_run(storage, tempfile.mkdtemp(prefix="assets-"))),
+        ("app first run, warm", lambda: app_first_run(storage, directory)),
+    ]
+    for name, action in cases:
+        seconds, requests, sent, result = timed(storage, action)
+        served = f"{result / 1e6:.2f}" if name.startswith("app") else "-"
+        print(f"{name:<22}{seconds:>9.2f}{requests:>10}{sent / 1e6:>17.2f}{served:>12}")
+    print(f"\nper page load, each browser also streams {video_bytes / 1e6:.2f} MB of video from Cloud Storage")
+    storage.close()
+
+
+if __name__ == "__main__":
+    main()
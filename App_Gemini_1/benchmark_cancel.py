@@ -0,0 +1,105 @@
+"""Measure the tokens generated for responses nobody reads, with a fake model.
+
+Each case gives up on its requests part way, the way a Streamlit rerun or a
+second click does, then waits for the fake model to go idle. Wasted tokens are
+those the model generated beyond what the caller read.
+
+  - chapters abandoned: the chaptered story's reader stops after the first
+    section, like a rerun while the sections are being shown.
+  - stream abandoned: a single streamed response is closed after three chunks.
+  - run all timeouts: fan_out gives up on requests after a per-request timeout.
+  - superseded: a request running under a cancel token is cancelled, like a
+    session slot's previous request when "Generate" is clicked again.
+
+    python benchmark_cancel.py
+"""
+
+import argparse
+import threading
+import time
+
+from cancellation import CancelToken, cancel_scope
+from fakes import FakeGenerativeModel
+from rate_limiter import SCHEDULER, TokenBucket
+from response_utils import fan_out, get_gemini_text_response, stream_gemini_text_response
+from story_pipeline import expand_sections
+
+CONFIG = {"temperature": 0.9, "max_output_tokens": 2048}
+SECTIONS = [{"title": f"Chapter {number}", "summary": "Something happens."} for number in range(1, 8)]
+DETAILS = {"name": "Mittens", "type": "Cat", "persona": "Friendly.", "location": "Andromeda", "premise": ["Love"]}
+
+
+def words(text):
+    return len(text.split())
+
+
+def chapters_abandoned(model):
+    sections = expand_sections(model, DETAILS, "Mittens", SECTIONS, temperature=0.9, max_concurrency=4)
+    _, result = next(sections)
+    sections.close()
+    return words(result.text)
+
+
+def stream_abandoned(model):
+    stream = stream_gemini_text_response(model, "a single story", CONFIG, use_cache=False)
+    read = sum(words(next(stream)) for _ in range(3))
+    stream.close()
+    return read
+
+
+def run_all_timeouts(model):
+    prompts = [f"scenario {number}" for number in range(4)]
+    results = fan_out(lambda prompt: get_gemini_text_response(model, prompt, CONFIG, use_cache=False),
+                      prompts, max_concurrency=4, timeout=0.5)
+    return sum(words(result.text) for result in results if result.ok)
+
+
+def superseded(model):
+    token = CancelToken()
+
+    def request():
+        try:
+            with cancel_scope(token):
+                get_gemini_text_response(model, "first click", CONFIG, use_cache=False)
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=request)
+    thread.start()
+    time.sleep(0.5)
+    token.cancel("superseded")
+    thread.join()
+    return 0
+
+
+# wait until the model has generated nothing new for a while.
+def wait_idle(model, quiet=1.0):
+    last = -1
+    while model.tokens_generated != last:
+        last = model.tokens_generated
+        time.sleep(quiet)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="simulated output rate per request")
+    args = parser.parse_args()
+
+    # the benchmark measures generation, not the client-side quota
+    SCHEDULER.requests = TokenBucket(10 ** 6)
+    SCHEDULER.tokens = TokenBucket(10 ** 9)
+
+    print(f"{'case':<22}{'generated':>10}{'read':>8}{'wasted':>8}")
+    for name, case in [("chapters abandoned", chapters_abandoned),
+                       ("stream abandoned", stream_abandoned),
+                       ("run all timeouts", run_all_timeouts),
+                       ("superseded", superseded)]:
+        model = FakeGenerativeModel(response_text=" ".join(["word"] * 1500), first_token_latency=0.1,
+                                    tokens_per_second=args.tokens_per_second)
+        read = case(model)
+        wait_idle(model)
+        print(f"{name:<22}{model.tokens_generated:>10}{read:>8}{model.tokens_generated - read:>8}")
+
+
+if __name__ == "__main__":
+    main()
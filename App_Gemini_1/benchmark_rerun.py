@@ -0,0 +1,80 @@
+"""Measure how long Streamlit takes to rerun the app script.
+
+Every widget interaction reruns the script. This runs the four tabs, as app.py
+lays them out, in Streamlit's headless AppTest with fake models, then times the
+first run and reruns triggered by a widget in the marketing tab.
+
+AppTest always reruns the whole script, even for widgets inside a fragment, so
+the time of each tab is also reported from run_timing: in the app, a widget in
+a tab only reruns that tab's fragment.
+
+    python benchmark_rerun.py --reruns 20
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+from streamlit.testing.v1 import AppTest
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HARNESS = f"""
+import sys
+sys.path.insert(0, {APP_DIR!r})
+
+import streamlit as st
+from fakes import FakeGenerativeModel
+from app_tab1 import render_story_tab
+from app_tab2 import render_mktg_campaign_tab
+from playground import render_playground_tab
+from registry import load_registry
+
+@st.cache_resource
+def load_models():
+    return FakeGenerativeModel(first_token_latency=0), FakeGenerativeModel(first_token_latency=0)
+
+text_model, multimodal_model = load_models()
+playgrounds = load_registry().playgrounds
+tab1, tab2, *playground_tabs = st.tabs(["Story", "Marketing Campaign"] + [playground["title"] for playground in playgrounds])
+with tab1:
+    render_story_tab(text_model)
+with tab2:
+    render_mktg_campaign_tab(text_model)
+for tab, playground in zip(playground_tabs, playgrounds):
+    with tab:
+        render_playground_tab(multimodal_model, playground["id"])
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--reruns", type=int, default=20, help="widget interactions to time")
+    args = parser.parse_args()
+
+    app = AppTest.from_string(HARNESS, default_timeout=60)
+    start = time.perf_counter()
+    app.run()
+    first_run = time.perf_counter() - start
+    if app.exception:
+        raise SystemExit(app.exception[0].message)
+
+    voices = ["Formal", "Informal", "Serious", "Humorous"]
+    reruns = []
+    for i in range(args.reruns):
+        start = time.perf_counter()
+        app.radio(key="brand_voice").set_value(voices[(i + 1) % len(voices)]).run()
+        reruns.append(time.perf_counter() - start)
+
+    print(f"first run   {1000 * first_run:8.1f} ms")
+    print(f"rerun p50   {1000 * statistics.median(reruns):8.1f} ms")
+    print(f"rerun max   {1000 * max(reruns):8.1f} ms")
+
+    run_times = app.session_state["run_times"] if "run_times" in app.session_state else {}
+    for name, times in run_times.items():
+        print(f"{name:<12}{1000 * statistics.median(times):8.1f} ms (median)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Compare model routing policies on a mix of app requests, with fake models.
+
+Each model is a FakeGenerativeModel with its own latency profile; the default
+profiles make the light model start sooner and write faster than the strong
+one, roughly as gemini-2.0-flash-lite and gemini-2.0-flash do (they are not
+measurements). Cost is estimated from the list prices in telemetry.py.
+
+The first table runs the same requests with every request on the strong model,
+every request on the light one, and with the default routes. The second shows
+fallback: the light model is first unavailable, then too slow to answer within
+the route's first token timeout, then merely slow.
+
+    python benchmark_router.py
+    python benchmark_router.py --repeat 5 --time-scale 1
+"""
+
+import argparse
+
+from fakes import FakeGenerativeModel
+from rate_limiter import SCHEDULER, TokenBucket
+from response_utils import max_output_tokens_for, stream_gemini_text_response
+from router import DEFAULT_ROUTES, LIGHT_MODEL, STRONG_MODEL, ModelRouter
+from telemetry import TELEMETRY, percentile
+
+# (route, words the model writes) for one pass over the app's kinds of request
+WORKLOAD = [
+    ("story_short", 1500),
+    ("story_short", 1500),
+    ("story_long", 6000),
+    ("campaign", 400),
+    ("campaign", 400),
+    ("vision", 200),
+    ("vision", 200),
+    ("vision", 200),
+    ("vision_complex", 800),
+]
+
+# model -> (seconds to first token, output tokens per second)
+PROFILES = {
+    LIGHT_MODEL: (0.25, 300.0),
+    STRONG_MODEL: (0.45, 180.0),
+}
+
+
+def make_router(time_scale, routes=None, light_profile=None, **light_options):
+    profiles = dict(PROFILES)
+    if light_profile:
+        profiles[LIGHT_MODEL] = light_profile
+
+    def load(name):
+        first_token, tokens_per_second = profiles[name]
+        options = light_options if name == LIGHT_MODEL else {}
+        return FakeGenerativeModel(model_name=name,
+                                   respond=lambda prompt: " ".join(["word"] * int(prompt.split()[-1])),
+                                   first_token_latency=first_token / time_scale,
+                                   tokens_per_second=tokens_per_second * time_scale,
+                                   **options)
+
+    return ModelRouter(load, routes=routes)
+
+
+def run(router, workload):
+    TELEMETRY.reset()
+    for number, (route, words) in enumerate(workload):
+        # the prompt ends with the number of words the fake should write
+        prompt = f"request {number} for {route}: {words}"
+        config = {"temperature": 0.9, "max_output_tokens": max_output_tokens_for(route)}
+        "".join(stream_gemini_text_response(router, prompt, config, use_cache=False, route=route))
+    return sorted(TELEMETRY.slowest(len(workload)), key=lambda span: span["prompt"])
+
+
+def single_model_routes(name):
+    return {route: dict(policy, models=[name]) for route, policy in DEFAULT_ROUTES.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=2, help="passes over the workload")
+    parser.add_argument("--time-scale", type=float, default=10.0,
+                        help="run the simulation this many times faster; reported times are scaled back")
+    args = parser.parse_args()
+    scale = args.time_scale
+
+    # the benchmark measures generation, not the client-side quota
+    SCHEDULER.requests = TokenBucket(10 ** 6)
+    SCHEDULER.tokens = TokenBucket(10 ** 9)
+
+    workload = WORKLOAD * args.repeat
+    print(f"{'policy':<14}{'requests':>9}{'p50 s':>8}{'p95 s':>8}{'total s':>9}{'cost $':>10}{'on light':>10}")
+    for policy, routes in [("all strong", single_model_routes(STRONG_MODEL)),
+                           ("all light", single_model_routes(LIGHT_MODEL)),
+                           ("routed", None)]:
+        spans = run(make_router(scale, routes), workload)
+        latencies = [span["latency_s"] * scale for span in spans]
+        light = sum(1 for span in spans if span["model"] == LIGHT_MODEL)
+        print(f"{policy:<14}{len(spans):>9}{percentile(latencies, 50):>8.1f}{percentile(latencies, 95):>8.1f}"
+              f"{sum(latencies):>9.1f}{sum(span['cost_usd'] for span in spans):>10.5f}{light:>7}/{len(spans)}")
+
+    print()
+    print("campaign requests while the light model is degraded (first token timeout 3s)")
+    policy = {"models": [LIGHT_MODEL, STRONG_MODEL], "max_first_token_s": 5 / scale, "first_token_timeout_s": 3 / scale}
+    patient = dict(policy, first_token_timeout_s=60)
+    campaigns = [("campaign", 400)] * 4
+    for case, router in [("unavailable twice", make_router(scale, {"campaign": policy}, unavailable_errors=2)),
+                         ("hangs 10s", make_router(scale, {"campaign": policy}, light_profile=(10.0, 300.0))),
+                         ("first token 8s", make_router(scale, {"campaign": patient}, light_profile=(8.0, 300.0)))]:
+        spans = run(router, campaigns)
+        served = ", ".join(f"{span['model'].replace('gemini-2.0-', '')} {span['latency_s'] * scale:.1f}s"
+                           + (" (fell back)" if span["fallback_from"] else "") for span in spans)
+        print(f"  {case:<18} {served}")
+
+
+if __name__ == "__main__":
+    main()
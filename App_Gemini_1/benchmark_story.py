@@ -0,0 +1,104 @@
+"""Compare the chaptered story pipeline with the single-call story prompt.
+
+Both approaches run against FakeGenerativeModel, which writes at a fixed token
+rate and stops at max_output_tokens like the real model. Every section the fake
+writes ends with "(end of <section>)", so completeness is the number of those
+markers that made it into the story.
+
+    python benchmark_story.py
+    python benchmark_story.py --chapter-words 1200 --tokens-per-second 80 --time-scale 1
+"""
+
+import argparse
+import re
+import time
+
+from fakes import FakeGenerativeModel
+from rate_limiter import SCHEDULER, TokenBucket
+from prompts import story_config, story_prompt
+from response_utils import stream_gemini_text_response
+from story_pipeline import CHAPTERS, generate_story
+
+DETAILS = {
+    "name": "Mittens",
+    "type": "Cat",
+    "persona": "Mitten is a very friendly cat.",
+    "location": "Andromeda Galaxy",
+    "premise": ["Love", "Adventure"],
+    "creativity": "High",
+}
+
+
+def _section_text(title, words):
+    return " ".join(["meow"] * words) + f" (end of {title})"
+
+
+# what the fake model writes for each kind of prompt.
+def make_responder(chapter_words):
+
+    def respond(prompt):
+        if "Reply with JSON only" in prompt:
+            chapters = int(re.search(r"a prologue, (\d+) chapters", prompt).group(1))
+            chapter_list = ", ".join(f'{{"title": "Part {n}", "summary": "Something happens."}}'
+                                     for n in range(1, chapters + 1))
+            return (f'{{"title": "Mittens in Andromeda", "prologue": "It begins.", '
+                    f'"chapters": [{chapter_list}], "epilogue": "It ends."}}')
+
+        match = re.search(r'Write only the section "([^"]+)"', prompt)
+        if match:
+            return _section_text(match.group(1), chapter_words)
+
+        chapters = 10 if "Write a Long story" in prompt else 5
+        titles = ["Prologue"] + [f"Chapter {n}" for n in range(1, chapters + 1)] + ["Epilogue"]
+        return " ".join(f"## {title} " + _section_text(title, chapter_words) for title in titles)
+
+    return respond
+
+
+def completed_sections(text):
+    return text.count("(end of ")
+
+
+def run_single_call(model, details):
+    config = story_config(details)
+    return "".join(stream_gemini_text_response(model, story_prompt(details), generation_config=config, use_cache=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chapter-words", type=int, default=900, help="length of each section the model writes")
+    parser.add_argument("--tokens-per-second", type=float, default=150.0, help="simulated output rate per request")
+    parser.add_argument("--first-token-ms", type=float, default=600.0, help="simulated time to first token")
+    parser.add_argument("--concurrency", type=int, default=4, help="sections written at once by the pipeline")
+    parser.add_argument("--time-scale", type=float, default=10.0,
+                        help="run the simulation this many times faster; reported times are scaled back")
+    args = parser.parse_args()
+
+    # the benchmark measures generation, not the client-side quota
+    SCHEDULER.requests = TokenBucket(10 ** 6)
+    SCHEDULER.tokens = TokenBucket(10 ** 9)
+
+    model = FakeGenerativeModel(respond=make_responder(args.chapter_words),
+                                first_token_latency=args.first_token_ms / 1000 / args.time_scale,
+                                tokens_per_second=args.tokens_per_second * args.time_scale)
+
+    print(f"{'length':<8}{'approach':<14}{'calls':>7}{'seconds':>10}{'sections':>12}{'words':>9}")
+    for length in ["Short", "Long"]:
+        details = dict(DETAILS, length=length)
+        expected = CHAPTERS[length] + 2
+
+        for approach in ["single call", "chaptered"]:
+            calls_before = model.calls
+            start = time.perf_counter()
+            if approach == "single call":
+                story = run_single_call(model, details)
+            else:
+                story = generate_story(model, details, temperature=0.95, max_concurrency=args.concurrency)
+            elapsed = (time.perf_counter() - start) * args.time_scale
+
+            print(f"{length:<8}{approach:<14}{model.calls - calls_before:>7}{elapsed:>10.1f}"
+                  f"{completed_sections(story):>6}/{expected:<5}{len(story.split()):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Cancellation of Gemini requests whose results nobody will read.
+
+When a Streamlit user clicks "Generate" again or leaves the page, the script run
+is interrupted, but requests running in worker threads (chapters, "Run all")
+or waiting for their first token would otherwise carry on to the end, using
+quota and threads. Requests check the CancelToken of their context:
+
+  - before they are sent, so one admitted after its caller gave up is not sent;
+  - while waiting for the first chunk, and between chunks, after which the
+    response stream is closed.
+
+cancel_scope sets the token for the code inside and cancels it if that code
+exits with an exception, including Streamlit's rerun and stop exceptions.
+fan_out and the story pipeline give their workers child tokens. session_request
+keeps one token per session and slot (e.g. a tab's button), cancelling the
+previous request of the slot when a new one starts.
+"""
+
+import contextlib
+import contextvars
+import threading
+
+import streamlit as st
+
+
+class Cancelled(Exception):
+    pass
+
+
+class CancelToken:
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.reason = None
+        self._event = threading.Event()
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled(f"request {self.reason}")
+        if self.parent is not None:
+            self.parent.raise_if_cancelled()
+
+    def child(self):
+        return CancelToken(self)
+
+
+_current = contextvars.ContextVar("cancel_token", default=None)
+
+
+def current_token():
+    return _current.get()
+
+
+# run the code inside with token (by default a child of the current one), cancelling it
+# if the code exits with an exception.
+@contextlib.contextmanager
+def cancel_scope(token=None):
+    if token is None:
+        token = CancelToken(current_token())
+    reset = _current.set(token)
+    try:
+        yield token
+    except BaseException:
+        token.cancel("abandoned")
+        raise
+    finally:
+        _current.reset(reset)
+
+
+# a cancel scope for this session's request in slot, superseding the slot's previous one.
+@contextlib.contextmanager
+def session_request(slot):
+    if "cancel_tokens" not in st.session_state:
+        st.session_state.cancel_tokens = {}
+    tokens = st.session_state.cancel_tokens
+    previous = tokens.get(slot)
+    if previous is not None:
+        previous.cancel("superseded")
+    token = tokens[slot] = CancelToken()
+    with cancel_scope(token):
+        yield token
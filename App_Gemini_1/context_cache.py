@@ -0,0 +1,178 @@
+"""Vertex AI context caching for large multimodal inputs.
+
+Sending the same video with every question makes the model ingest the whole
+video each time. A cached-content resource holds those parts on the Vertex AI
+side instead: it is created once per (model, parts) and later prompts only send
+their question text. Cached input tokens are billed at a fraction of the normal
+input price and are not processed again, so follow-up questions on the same
+asset start faster.
+
+Handles are shared by every Streamlit session in the process and, through
+their display name, by other processes using the same project. They expire
+after CONTEXT_CACHE_TTL_SECONDS; a handle close to expiry is extended when it
+is used, and an expired one is created again. Assets that cannot be cached
+(e.g. below the minimum size for context caching) are remembered and sent
+normally.
+"""
+
+import datetime
+import logging
+import os
+import threading
+
+from response_cache import cache_key, model_name
+
+ENABLED = os.environ.get("CONTEXT_CACHE_ENABLED", "1") == "1"
+TTL_SECONDS = int(os.environ.get("CONTEXT_CACHE_TTL_SECONDS", 60 * 60))
+# extend a handle that has less than this long left when it is used
+REFRESH_MARGIN_SECONDS = int(os.environ.get("CONTEXT_CACHE_REFRESH_MARGIN_SECONDS", 5 * 60))
+# do not try to cache an asset again for this long after it failed
+FAILURE_BACKOFF_SECONDS = 10 * 60
+
+DISPLAY_NAME_PREFIX = "gemini-app-"
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+# cached contents in Vertex AI, through vertexai.preview.caching.
+class VertexCacheBackend:
+
+    def __init__(self):
+        from vertexai.preview import caching
+        self.caching = caching
+
+    def create(self, model_name, contents, ttl, display_name):
+        return self.caching.CachedContent.create(model_name=model_name,
+                                                 contents=contents,
+                                                 ttl=ttl,
+                                                 display_name=display_name)
+
+    def list(self):
+        return self.caching.CachedContent.list()
+
+    def extend(self, handle, ttl):
+        handle.update(ttl=ttl)
+        # expire_time is only re-read on refresh
+        handle.refresh()
+        return handle
+
+    def delete(self, handle):
+        handle.delete()
+
+    def model_for(self, handle, model):
+        from vertexai.preview.generative_models import GenerativeModel
+        return GenerativeModel.from_cached_content(cached_content=handle)
+
+
+class ContextCache:
+
+    def __init__(self, backend=None, ttl_seconds=TTL_SECONDS, refresh_margin_seconds=REFRESH_MARGIN_SECONDS, clock=_now):
+        self._backend = backend
+        self.ttl = datetime.timedelta(seconds=ttl_seconds)
+        self.refresh_margin = datetime.timedelta(seconds=refresh_margin_seconds)
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.handles = {}
+        self.failures = {}
+        self.discovered = False
+
+        self.hits = 0
+        self.creates = 0
+        self.extensions = 0
+        self.errors = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = VertexCacheBackend()
+        return self._backend
+
+    def _key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    # pick up handles created by other processes, once.
+    def _discover(self):
+        if self.discovered:
+            return
+        self.discovered = True
+        try:
+            for handle in self.backend.list():
+                display_name = getattr(handle, "display_name", "") or ""
+                if display_name.startswith(DISPLAY_NAME_PREFIX):
+                    self.handles.setdefault(display_name[len(DISPLAY_NAME_PREFIX):], handle)
+        except Exception as e:
+            logging.warning(f"could not list context caches: {e}")
+
+    def _handle_for(self, model, parts, key):
+        now = self.clock()
+        handle = self.handles.get(key)
+        if handle is not None and handle.expire_time > now + self.refresh_margin:
+            self.hits += 1
+            return handle
+
+        if handle is not None and handle.expire_time > now:
+            # still alive, push the expiry out instead of re-uploading the asset
+            try:
+                handle = self.backend.extend(handle, self.ttl)
+                self.extensions += 1
+                self.hits += 1
+                self.handles[key] = handle
+                return handle
+            except Exception as e:
+                logging.warning(f"could not extend context cache {handle.name}: {e}")
+
+        handle = self.backend.create(model_name(model), parts, self.ttl, DISPLAY_NAME_PREFIX + key)
+        self.creates += 1
+        self.handles[key] = handle
+        return handle
+
+    # a model bound to cached content holding parts, or None to send the parts as usual.
+    def model_for(self, model, parts):
+        if not ENABLED or not parts:
+            return None
+        # display names are limited to 128 characters
+        key = cache_key(model, parts)[:64]
+
+        with self._key_lock(key):
+            failed_at = self.failures.get(key)
+            if failed_at is not None and (self.clock() - failed_at).total_seconds() < FAILURE_BACKOFF_SECONDS:
+                return None
+            try:
+                self._discover()
+                handle = self._handle_for(model, parts, key)
+                cached_model = self.backend.model_for(handle, model)
+            except Exception as e:
+                self.errors += 1
+                self.failures[key] = self.clock()
+                self.handles.pop(key, None)
+                logging.warning(f"context caching unavailable for {model_name(model)}, sending the parts instead: {e}")
+                return None
+            self.failures.pop(key, None)
+            return cached_model
+
+    # delete every handle this process knows about.
+    def clear(self):
+        with self.lock:
+            handles, self.handles = list(self.handles.values()), {}
+        for handle in handles:
+            try:
+                self.backend.delete(handle)
+            except Exception as e:
+                logging.warning(f"could not delete context cache {handle.name}: {e}")
+
+    def metrics(self):
+        return {
+            "handles": len(self.handles),
+            "hits": self.hits,
+            "creates": self.creates,
+            "extensions": self.extensions,
+            "errors": self.errors,
+        }
+
+
+# one registry per process, shared by all Streamlit sessions
+CONTEXT_CACHE = ContextCache()
@@ -0,0 +1,331 @@
+"""Local stand-ins for Vertex AI, for benchmarks and for running the helpers
+in response_utils without a Google Cloud project.
+"""
+
+import base64
+import datetime
+import hashlib
+import itertools
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+
+
+class FakeUsageMetadata:
+
+    def __init__(self, prompt_token_count, candidates_token_count, cached_content_token_count=0):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = cached_content_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeChunk:
+
+    def __init__(self, text, usage_metadata=None, finish_reason=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+        self.finish_reason = finish_reason
+
+
+# behaves like GenerativeModel.generate_content(..., stream=True): after an initial
+# latency, plus the time to read the input if prefill_tokens_per_second is set,
+# it yields chunks of a canned response at a fixed token rate.
+class FakeGenerativeModel:
+
+    def __init__(self,
+                 model_name="fake-gemini",
+                 response_text=None,
+                 first_token_latency=0.2,
+                 tokens_per_second=200.0,
+                 tokens_per_chunk=20,
+                 quota_errors=0,
+                 unavailable_errors=0,
+                 respond=None,
+                 media_tokens=258,
+                 prefill_tokens_per_second=None,
+                 cached_contents=None):
+        self._model_name = model_name
+        self.response_text = response_text
+        # optional function from the prompt text to the full text the model would write
+        self.respond = respond
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.tokens_per_chunk = tokens_per_chunk
+        self.quota_errors = quota_errors
+        self.unavailable_errors = unavailable_errors
+        self.media_tokens = media_tokens
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        # parts held in context cache, prepended to every prompt without being read again
+        self.cached_contents = cached_contents or []
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.tokens_generated = 0
+
+    def _input_tokens(self, contents):
+        return sum(len(part) // 4 if isinstance(part, str) else self.media_tokens for part in contents)
+
+    # a model bound to cached content, like GenerativeModel.from_cached_content.
+    def with_cached_contents(self, contents):
+        return FakeGenerativeModel(model_name=self._model_name,
+                                   response_text=self.response_text,
+                                   first_token_latency=self.first_token_latency,
+                                   tokens_per_second=self.tokens_per_second,
+                                   tokens_per_chunk=self.tokens_per_chunk,
+                                   respond=self.respond,
+                                   media_tokens=self.media_tokens,
+                                   prefill_tokens_per_second=self.prefill_tokens_per_second,
+                                   cached_contents=list(contents))
+
+    def _text_for(self, contents):
+        if self.response_text is not None:
+            return self.response_text
+        if not isinstance(contents, list):
+            contents = [contents]
+        prompt = " ".join(part for part in contents if isinstance(part, str))
+        if self.respond is not None:
+            return self.respond(prompt)
+        return f"Response to: {prompt.strip()[:80]}. " + "lorem ipsum dolor sit amet " * 400
+
+    def generate_content(self, contents, generation_config=None, safety_settings=None, stream=False):
+        with self.lock:
+            self.calls += 1
+            if self.quota_errors > 0:
+                self.quota_errors -= 1
+                raise ResourceExhausted("fake quota exceeded")
+            if self.unavailable_errors > 0:
+                self.unavailable_errors -= 1
+                raise ServiceUnavailable("fake model unavailable")
+
+        config = generation_config or {}
+        if hasattr(config, "to_dict"):
+            config = config.to_dict()
+        max_output_tokens = int(config.get("max_output_tokens", 2048))
+        # like the real model, output stops at max_output_tokens (a word per token here)
+        words = self._text_for(contents).split(" ")[:max_output_tokens]
+        if not isinstance(contents, list):
+            contents = [contents]
+        cached_tokens = self._input_tokens(self.cached_contents)
+        new_tokens = self._input_tokens(contents)
+
+        latency = self.first_token_latency
+        if self.prefill_tokens_per_second:
+            latency += new_tokens / self.prefill_tokens_per_second
+        chunks = self._chunks(words, cached_tokens + new_tokens, cached_tokens, latency)
+        if stream:
+            return chunks
+        chunks = list(chunks)
+        return FakeChunk("".join(chunk.text for chunk in chunks),
+                         usage_metadata=chunks[-1].usage_metadata,
+                         finish_reason=chunks[-1].finish_reason)
+
+    def _chunks(self, words, prompt_tokens, cached_tokens, latency):
+        time.sleep(latency)
+        emitted = 0
+        for start in range(0, len(words), self.tokens_per_chunk):
+            piece = words[start:start + self.tokens_per_chunk]
+            if start:
+                time.sleep(len(piece) / self.tokens_per_second)
+            emitted += len(piece)
+            with self.lock:
+                self.tokens_generated += len(piece)
+            last = start + self.tokens_per_chunk >= len(words)
+            text = " ".join(piece) + ("" if last else " ")
+            yield FakeChunk(text,
+                            usage_metadata=FakeUsageMetadata(prompt_tokens, emitted, cached_tokens),
+                            finish_reason="STOP" if last else None)
+
+
+class FakeCachedContent:
+
+    def __init__(self, name, display_name, model_name, contents, expire_time):
+        self.name = name
+        self.display_name = display_name
+        self.model_name = model_name
+        self.contents = contents
+        self.expire_time = expire_time
+
+
+# stands in for vertexai.preview.caching in context_cache.ContextCache.
+class FakeCacheBackend:
+
+    def __init__(self, clock=None):
+        self.clock = clock or (lambda: datetime.datetime.now(datetime.timezone.utc))
+        self.caches = {}
+        self.ids = itertools.count(1)
+        self.creates = 0
+        self.extensions = 0
+
+    def create(self, model_name, contents, ttl, display_name):
+        self.creates += 1
+        handle = FakeCachedContent(f"cachedContents/{next(self.ids)}", display_name, model_name,
+                                   list(contents), self.clock() + ttl)
+        self.caches[handle.name] = handle
+        return handle
+
+    def list(self):
+        now = self.clock()
+        return [handle for handle in self.caches.values() if handle.expire_time > now]
+
+    def extend(self, handle, ttl):
+        self.extensions += 1
+        handle.expire_time = self.clock() + ttl
+        return handle
+
+    def delete(self, handle):
+        self.caches.pop(handle.name, None)
+
+    def model_for(self, handle, model):
+        return model.with_cached_contents(handle.contents)
+
+
+# stands in for a Vertex AI batch prediction job in batch.VertexBatchBackend:
+# the job runs every request through the fake model when it is waited on.
+class FakeBatchBackend:
+
+    def __init__(self, model, failures=0):
+        self.model = model
+        self.failures = failures
+        self.jobs = {}
+        self.ids = itertools.count(1)
+
+    def submit(self, model_name, requests):
+        job_name = f"batchPredictionJobs/{next(self.ids)}"
+        self.jobs[job_name] = {"requests": requests, "results": None}
+        return job_name
+
+    def wait(self, job_name, poll_seconds=0):
+        job = self.jobs[job_name]
+        if job["results"] is None:
+            job["results"] = [self._predict(request, index) for index, request in enumerate(job["requests"])]
+        return None
+
+    def _predict(self, request, index):
+        body = request["request"]
+        if index < self.failures:
+            return {"request": body, "status": "fake prediction error"}
+        prompt = body["contents"][0]["parts"][0]["text"]
+        config = {"max_output_tokens": body["generationConfig"]["maxOutputTokens"]}
+        response = self.model.generate_content(prompt, generation_config=config)
+        return {"request": body,
+                "status": "",
+                "response": {"candidates": [{"content": {"role": "model", "parts": [{"text": response.text}]},
+                                             "finishReason": response.finish_reason}]}}
+
+    def results(self, job_name):
+        return iter(self.jobs[job_name]["results"])
+
+
+# deterministic stand-in for a text embedding model: hashed counts of the
+# lower-cased words, so prompts differing in a few words are close.
+class FakeEmbedder:
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def embed(self, text):
+        self.calls += 1
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] % 2 else -1.0
+        return vector
+
+
+class _StorageHTTPServer(ThreadingHTTPServer):
+    # the default backlog of 5 drops connections when many ranges start at once
+    request_queue_size = 128
+
+
+# serves objects like storage.googleapis.com, for asset_cache.AssetCache: HEAD gives
+# the generation and MD5, GET honours Range. Each request waits latency seconds and
+# sends at most bandwidth bytes per second.
+class FakeStorageServer:
+
+    def __init__(self, objects, latency=0.0, bandwidth=None):
+        # "bucket/path" -> bytes
+        self.objects = dict(objects)
+        self.generations = {name: 1 for name in self.objects}
+        self.md5s = {name: hashlib.md5(data).digest() for name, data in self.objects.items()}
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.server = _StorageHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def update(self, name, data):
+        with self.lock:
+            self.objects[name] = data
+            self.md5s[name] = hashlib.md5(data).digest()
+            self.generations[name] = self.generations.get(name, 0) + 1
+
+    def reset_counts(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_sent = 0
+
+    def close(self):
+        self.server.shutdown()
+
+    def _handler(self):
+        storage = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def _headers(self, data, generation, md5, status=200, length=None):
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(data) if length is None else length))
+                self.send_header("x-goog-generation", str(generation))
+                self.send_header("ETag", f'"{md5.hex()}"')
+                self.send_header("x-goog-hash", "md5=" + base64.b64encode(md5).decode())
+                self.end_headers()
+
+            def _object(self):
+                with storage.lock:
+                    storage.requests += 1
+                    name = self.path.lstrip("/")
+                    data, generation, md5 = storage.objects.get(name), storage.generations.get(name), storage.md5s.get(name)
+                time.sleep(storage.latency)
+                if data is None:
+                    self.send_error(404)
+                return data, generation, md5
+
+            def do_HEAD(self):
+                data, generation, md5 = self._object()
+                if data is not None:
+                    self._headers(data, generation, md5)
+
+            def do_GET(self):
+                data, generation, md5 = self._object()
+                if data is None:
+                    return
+                body, status = data, 200
+                match = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+                if match:
+                    body, status = data[int(match.group(1)):int(match.group(2)) + 1], 206
+                self._headers(data, generation, md5, status, len(body))
+                step = 64 * 1024
+                for start in range(0, len(body), step):
+                    piece = body[start:start + step]
+                    self.wfile.write(piece)
+                    with storage.lock:
+                        storage.bytes_sent += len(piece)
+                    if storage.bandwidth:
+                        time.sleep(len(piece) / storage.bandwidth)
+
+        return Handler
@@ -0,0 +1,282 @@
+"""Store of full Gemini prompts and responses, out of the logs.
+
+The tabs used to log every response in full, synchronously through the Cloud
+Logging handler. Now the prompt and response are saved here, compressed, and
+the log line carries only the record's id, its size and timings:
+
+    story response 9f3c2a1b7d604e5a: 8123 chars, first token 0.91s, 12.30s total
+
+Records are written by a background thread in batches, so saving never
+blocks the script; if the writer falls behind by OUTPUT_STORE_QUEUE records,
+new ones are dropped and counted. Each batch goes to:
+
+  - SQLite (OUTPUT_STORE_PATH, in the temp directory by default), on the
+    instance's own disk, for quick lookups from the admin page. It is lost
+    with the instance, and records older than OUTPUT_STORE_RETENTION_DAYS are
+    deleted. Keep it on local disk: SQLite's locking is not reliable on
+    network file systems, and each instance needs a file of its own.
+  - the Cloud Logging log OUTPUT_STORE_LOG, in one API call, as the durable
+    copy shared by all instances. It defaults to "gemini-outputs" on Cloud
+    Run and is off locally.
+
+Look a record up in the local store with:
+
+    python output_store.py 9f3c2a1b7d604e5a
+
+or in Logs Explorer with logName="projects/PROJECT/logs/gemini-outputs" and
+jsonPayload.id="9f3c2a1b7d604e5a".
+"""
+
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+
+ENABLED = os.environ.get("OUTPUT_STORE_ENABLED", "1") == "1"
+STORE_PATH = os.environ.get("OUTPUT_STORE_PATH", os.path.join(tempfile.gettempdir(), "gemini_outputs.sqlite3"))
+# K_SERVICE is set by Cloud Run, where the local file does not outlive the instance
+LOG_NAME = os.environ.get("OUTPUT_STORE_LOG", "gemini-outputs" if os.environ.get("K_SERVICE") else "")
+RETENTION_DAYS = float(os.environ.get("OUTPUT_STORE_RETENTION_DAYS", 30))
+MAX_QUEUE = int(os.environ.get("OUTPUT_STORE_QUEUE", 1000))
+BATCH_SIZE = 100
+FLUSH_SECONDS = 1.0
+PURGE_EVERY_SECONDS = 60 * 60
+# a log entry is limited to 256 KB, so longer texts are cut in the log (not in SQLite)
+MAX_LOG_CHARS = 100000
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS outputs (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    kind TEXT,
+    chars INTEGER,
+    metadata TEXT,
+    prompt BLOB,
+    response BLOB
+)"""
+
+
+def _compress(text):
+    return zlib.compress((text or "").encode("utf-8"), 6)
+
+
+def _decompress(blob):
+    return zlib.decompress(blob).decode("utf-8") if blob is not None else None
+
+
+# the text of a prompt; image and video parts are marked, not stored.
+def prompt_text(contents):
+    if not isinstance(contents, list):
+        contents = [contents]
+    return "\n".join(part if isinstance(part, str) else f"[{type(part).__name__} part]" for part in contents)
+
+
+class OutputStore:
+
+    def __init__(self, path=STORE_PATH, retention_days=RETENTION_DAYS, max_queue=MAX_QUEUE,
+                 batch_size=BATCH_SIZE, flush_seconds=FLUSH_SECONDS, log_name=LOG_NAME):
+        self.path = path
+        self.log_name = log_name
+        self.cloud_logger = None
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue(max_queue)
+        self.lock = threading.Lock()
+        self.writer = None
+        self.written = 0
+        self.logged = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def _start_writer(self):
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._run, name="output-store", daemon=True)
+                self.writer.start()
+                # write what is queued before the process exits, e.g. at the end of batch.py
+                atexit.register(self.flush, 5)
+
+    # queue a record for writing; returns its id at once.
+    def save(self, kind, prompt, response, **metadata):
+        record_id = uuid.uuid4().hex[:16]
+        self._start_writer()
+        try:
+            self.queue.put_nowait((record_id, time.time(), kind, prompt, response, metadata))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            logging.warning(f"output store is behind, record {record_id} dropped")
+        return record_id
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute(SCHEMA)
+        return connection
+
+    # take up to batch_size records, waiting at most flush_seconds after the first.
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        connection = self._connect()
+        purged_at = 0.0
+        while True:
+            batch = self._next_batch()
+            try:
+                rows = [(record_id, created, kind, len(response or ""), json.dumps(metadata, default=str),
+                         _compress(prompt_text(prompt)), _compress(response))
+                        for record_id, created, kind, prompt, response, metadata in batch]
+                with connection:
+                    connection.executemany("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                with self.lock:
+                    self.written += len(rows)
+                if time.monotonic() - purged_at > PURGE_EVERY_SECONDS:
+                    self.purge(connection)
+                    purged_at = time.monotonic()
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                logging.warning(f"output store write failed: {e}")
+            try:
+                if self.log_name:
+                    self._log_batch(batch)
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                logging.warning(f"output store could not write to the {self.log_name} log: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    # write a batch of records to Cloud Logging in one request.
+    def _log_batch(self, batch):
+        if self.cloud_logger is None:
+            from google.cloud import logging as cloud_logging
+            self.cloud_logger = cloud_logging.Client().logger(self.log_name)
+        with self.cloud_logger.batch() as entries:
+            for record_id, created, kind, prompt, response, metadata in batch:
+                text = prompt_text(prompt)
+                entries.log_struct(
+                    dict(metadata, id=record_id, kind=kind, chars=len(response or ""),
+                         prompt=text[:MAX_LOG_CHARS], response=(response or "")[:MAX_LOG_CHARS],
+                         truncated=len(text) > MAX_LOG_CHARS or len(response or "") > MAX_LOG_CHARS),
+                    timestamp=datetime.datetime.fromtimestamp(created, datetime.timezone.utc))
+        with self.lock:
+            self.logged += len(batch)
+
+    # delete records past the retention period.
+    def purge(self, connection=None):
+        own_connection = connection is None
+        if own_connection:
+            connection = self._connect()
+        try:
+            with connection:
+                deleted = connection.execute("DELETE FROM outputs WHERE created < ?",
+                                             (time.time() - self.retention_days * 24 * 60 * 60,)).rowcount
+        finally:
+            if own_connection:
+                connection.close()
+        if deleted:
+            logging.info(f"output store purged {deleted} records older than {self.retention_days} days")
+        return deleted
+
+    # wait up to timeout seconds for the queued records to be written.
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def get(self, record_id):
+        if not os.path.exists(self.path):
+            return None
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT id, created, kind, chars, metadata, prompt, response FROM outputs WHERE id = ?",
+                                     (record_id,)).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        record_id, created, kind, chars, metadata, prompt, response = row
+        return {"id": record_id, "created": created, "kind": kind, "chars": chars,
+                "metadata": json.loads(metadata), "prompt": _decompress(prompt), "response": _decompress(response)}
+
+    def metrics(self):
+        with self.lock:
+            written, logged, dropped, errors = self.written, self.logged, self.dropped, self.errors
+        return {
+            "queued": self.queue.qsize(),
+            "written": written,
+            "logged": logged,
+            "dropped": dropped,
+            "errors": errors,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+
+# one store per process, shared by all Streamlit sessions
+OUTPUT_STORE = OutputStore()
+
+
+# save a response and log a short reference to it; returns the record id.
+def log_response(kind, prompt, response, stats=None, latency=None):
+    timings = {}
+    if stats is not None:
+        timings["time_to_first_token"] = stats.time_to_first_token
+        if stats.end is not None:
+            latency = stats.end - stats.start
+        timings["cached"] = stats.cached
+    if latency is not None:
+        timings["latency"] = latency
+
+    summary = f"{len(response or '')} chars"
+    if timings.get("time_to_first_token") is not None:
+        summary += f", first token {timings['time_to_first_token']:.2f}s"
+    if latency is not None:
+        summary += f", {latency:.2f}s total"
+    if timings.get("cached"):
+        summary += ", from cache"
+
+    if not ENABLED:
+        logging.info(f"{kind} response: {summary}")
+        return None
+    record_id = OUTPUT_STORE.save(kind, prompt, response, **timings)
+    logging.info(f"{kind} response {record_id}: {summary}")
+    return record_id
+
+
+def main():
+    if len(sys.argv) != 2:
+        raise SystemExit("usage: python output_store.py RECORD_ID")
+    record = OUTPUT_STORE.get(sys.argv[1])
+    if record is None:
+        raise SystemExit(f"no record {sys.argv[1]} in {OUTPUT_STORE.path}; records of other instances "
+                         f"are in the {LOG_NAME or 'gemini-outputs'} log, if OUTPUT_STORE_LOG was set")
+    print(f"{record['kind']} response {record['id']}, {record['chars']} chars, "
+          f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['created']))}")
+    print(json.dumps(record["metadata"]))
+    print("\n--- prompt ---\n" + record["prompt"])
+    print("\n--- response ---\n" + record["response"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Admin page: Gemini request telemetry and cache metrics for this process.
+
+Nothing is shown unless ADMIN_PASSWORD is set and the same password is entered.
+"""
+
+import hmac
+import os
+
+import streamlit as st
+from asset_cache import ASSET_CACHE
+from context_cache import CONTEXT_CACHE
+from output_store import OUTPUT_STORE
+from rate_limiter import SCHEDULER
+from response_cache import RESPONSE_CACHE
+from semantic_cache import SEMANTIC_CACHE
+from telemetry import TELEMETRY
+
+ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD")
+
+st.header("Admin", divider="rainbow")
+
+if not ADMIN_PASSWORD:
+    st.error("The admin page is disabled: set ADMIN_PASSWORD to enable it.")
+    st.stop()
+
+password = st.text_input("Password", type="password", key="admin_password")
+if not hmac.compare_digest(password.encode("utf-8"), ADMIN_PASSWORD.encode("utf-8")):
+    st.stop()
+
+st.caption("Telemetry covers the requests served by this process since it started (or was last reset).")
+
+rates = TELEMETRY.token_rates()
+requests_column, input_column, output_column = st.columns(3)
+requests_column.metric("Requests per minute", f"{rates['requests_per_minute']:.1f}")
+input_column.metric("Input tokens per minute", f"{rates['input_tokens_per_minute']:.0f}")
+output_column.metric("Output tokens per minute", f"{rates['output_tokens_per_minute']:.0f}")
+
+st.subheader("By tab, model and config")
+summary = TELEMETRY.summary()
+if summary:
+    for row in summary:
+        row["finish_reasons"] = ", ".join(f"{reason}: {count}" for reason, count in row["finish_reasons"].items())
+    st.dataframe(summary)
+    st.caption(f"Estimated cost: ${sum(row['estimated_cost_usd'] for row in summary):.4f}")
+else:
+    st.write("No requests yet.")
+
+st.subheader("Slowest recent requests")
+slowest = TELEMETRY.slowest()
+if slowest:
+    st.dataframe(slowest)
+else:
+    st.write("No requests yet.")
+
+st.subheader("Quota and caches")
+st.json({
+    "quota scheduler": SCHEDULER.metrics(),
+    "response cache": {"hits": RESPONSE_CACHE.hits, "misses": RESPONSE_CACHE.misses},
+    "semantic cache": SEMANTIC_CACHE.metrics(),
+    "context cache": CONTEXT_CACHE.metrics(),
+    "output store": OUTPUT_STORE.metrics(),
+    "asset cache": ASSET_CACHE.metrics(),
+})
+
+st.subheader("Stored responses")
+record_id = st.text_input("Record id from a log line", key="output_record_id").strip()
+if record_id:
+    record = OUTPUT_STORE.get(record_id)
+    if record is None:
+        st.write(f"No record {record_id}.")
+    else:
+        st.caption(f"{record['kind']}, {record['chars']} chars, {record['metadata']}")
+        st.text(record["prompt"])
+        st.markdown(record["response"])
+
+if st.button("Reset telemetry", key="reset_telemetry"):
+    TELEMETRY.reset()
+    st.rerun()
@@ -0,0 +1,93 @@
+import time
+import streamlit as st
+from vertexai.preview.generative_models import GenerativeModel
+from assets import asset_parts, asset_sources
+from registry import load_registry, prompt_parts, prompt_text
+from response_utils import *
+from run_timing import record
+from telemetry import request_tab
+from cancellation import session_request
+from output_store import log_response
+from rate_limiter import BATCH
+
+# run every scenario concurrently, returning a BatchResult for each in order. they are
+# queued for quota behind single interactive requests, so "Run all" does not hold them up.
+def run_scenarios(multimodal_model: GenerativeModel, scenarios,
+                  max_concurrency=MAX_CONCURRENT_REQUESTS, timeout=REQUEST_TIMEOUT_SECONDS):
+    parts = asset_parts()
+
+    def run(scenario):
+        return get_gemini_vision_response(multimodal_model, prompt_parts(scenario, parts),
+                                          scenario.get("generation_config"),
+                                          use_context_cache=scenario.get("use_context_cache", False),
+                                          route=scenario.get("route", "vision"), priority=BATCH)
+
+    return fan_out(run, scenarios, max_concurrency, timeout)
+
+# show the assets of a scenario: videos one after another, images side by side.
+def render_assets(scenario, sources):
+    registry = load_registry()
+    for item in scenario.get("display", []):
+        names = item["assets"]
+        if registry.assets[names[0]]["mime_type"].startswith("video/"):
+            for name in names:
+                st.video(sources[name])
+            continue
+        options = {"width": item["width"]} if "width" in item else {}
+        captions = item.get("captions")
+        if len(names) == 1:
+            st.image(sources[names[0]], caption=captions[0] if captions else None, **options)
+        else:
+            st.image([sources[name] for name in names], caption=captions, **options)
+
+# render one scenario: its assets, its button, and the streamed response.
+def render_scenario(multimodal_model: GenerativeModel, scenario, sources, parts):
+    render_assets(scenario, sources)
+    st.markdown(scenario["description"])
+
+    tab1, tab2 = st.tabs(["Response", "Prompt"])
+    generate = st.button(scenario["button"]["label"], key=scenario["button"]["key"])
+    with tab1:
+        if generate:
+            with st.spinner(scenario.get("spinner", "Generating using Gemini...")), session_request(scenario["id"]):
+                stats = StreamStats()
+                response = st.write_stream(stream_gemini_vision_response(multimodal_model,
+                                                                         prompt_parts(scenario, parts),
+                                                                         scenario.get("generation_config"),
+                                                                         stats=stats,
+                                                                         use_context_cache=scenario.get("use_context_cache", False),
+                                                                         route=scenario.get("route", "vision")))
+                st.caption(stats.summary())
+                log_response(scenario["id"], prompt_text(scenario), response, stats)
+    with tab2:
+        st.write("Prompt used:")
+        st.text(prompt_text(scenario))
+
+# render a playground tab from the registry, with a child tab per scenario.
+@st.fragment
+def render_playground_tab(multimodal_model: GenerativeModel, playground_id):
+    start = time.perf_counter()
+    playground = load_registry().playground(playground_id)
+    with request_tab(playground_id):
+        sources = asset_sources()
+        parts = asset_parts()
+
+        scenarios = playground["scenarios"]
+        for tab, scenario in zip(st.tabs([scenario["title"] for scenario in scenarios]), scenarios):
+            with tab:
+                render_scenario(multimodal_model, scenario, sources, parts)
+
+        # run all of the playground's prompts at once
+        st.divider()
+        run_all = st.button(playground["run_all"]["label"], key=playground["run_all"]["key"])
+        if run_all:
+            with st.spinner("Generating all responses concurrently..."), session_request(playground["run_all"]["key"]):
+                batch_start = time.perf_counter()
+                results = run_scenarios(multimodal_model, scenarios)
+                elapsed = time.perf_counter() - batch_start
+            render_batch_results([scenario["title"] for scenario in scenarios], results, elapsed)
+            for scenario, result in zip(scenarios, results):
+                if result.ok:
+                    log_response(scenario["id"], prompt_text(scenario), result.text, latency=result.latency)
+
+    record(f"{playground_id} tab", time.perf_counter() - start)
@@ -0,0 +1,84 @@
+"""Pre-compute the responses of the registry's playground scenarios.
+
+Runs every scenario in scenarios.json (or the ones selected) through the same
+code path as the app, so the responses land in the response cache under the
+keys the app will look up. Set RESPONSE_CACHE_DIR or RESPONSE_CACHE_REDIS_URL
+to the same shared tier the app uses, otherwise the responses are only cached
+in this process.
+
+    python precompute.py
+    python precompute.py --playground video --concurrency 2
+    python precompute.py --scenario er_diagram --fake
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+from registry import load_registry
+from router import ModelRouter
+from response_cache import RESPONSE_CACHE, is_cacheable
+from response_utils import MAX_CONCURRENT_REQUESTS, REQUEST_TIMEOUT_SECONDS, VISION_GENERATION_CONFIG
+from telemetry import request_tab
+
+
+# routed like the app, so responses are cached under the models the app will ask.
+def load_model(fake):
+    if fake:
+        from fakes import FakeGenerativeModel
+        return ModelRouter(lambda name: FakeGenerativeModel(model_name=name, first_token_latency=0.1, tokens_per_second=2000))
+
+    import vertexai
+    from vertexai.preview.generative_models import GenerativeModel
+    vertexai.init(project=os.environ.get('PROJECT_ID'), location=os.environ.get('REGION'))
+    return ModelRouter(GenerativeModel)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--playground", action="append", help="only this playground (repeatable)")
+    parser.add_argument("--scenario", action="append", help="only this scenario id (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_REQUESTS)
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT_SECONDS)
+    parser.add_argument("--fake", action="store_true", help="use a local fake model instead of Vertex AI")
+    args = parser.parse_args()
+
+    registry = load_registry()
+    scenarios = [scenario
+                 for playground in registry.playgrounds
+                 if not args.playground or playground["id"] in args.playground
+                 for scenario in playground["scenarios"]
+                 if not args.scenario or scenario["id"] in args.scenario]
+    if not scenarios:
+        raise SystemExit("no scenarios selected")
+
+    skipped = [s["id"] for s in scenarios if not is_cacheable(s.get("generation_config") or VISION_GENERATION_CONFIG)]
+    if skipped:
+        logging.warning(f"not cacheable at their temperature, the app will not reuse these: {', '.join(skipped)}")
+    if RESPONSE_CACHE.shared_tier is None:
+        logging.warning("no RESPONSE_CACHE_DIR or RESPONSE_CACHE_REDIS_URL set, responses are only cached in this process")
+
+    # imported after the checks: the playground module needs streamlit's caches
+    from playground import run_scenarios
+    model = load_model(args.fake)
+
+    start = time.perf_counter()
+    with request_tab("precompute"):
+        results = run_scenarios(model, scenarios, max_concurrency=args.concurrency, timeout=args.timeout)
+    elapsed = time.perf_counter() - start
+
+    failed = 0
+    for scenario, result in zip(scenarios, results):
+        if result.ok:
+            print(f"{scenario['id']:<28} ok      {result.latency:6.1f}s  {len(result.text)} chars")
+        else:
+            failed += 1
+            print(f"{scenario['id']:<28} failed  {result.latency:6.1f}s  {result.error}")
+    print(f"{len(scenarios) - failed}/{len(scenarios)} scenarios pre-computed in {elapsed:.1f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Prompt templates shared by the Streamlit tabs and the batch CLI.
+
+Each kind of request has its defaults (the tab's default widget values), a
+prompt template and a generation config, so a batch row and the equivalent
+tab inputs produce exactly the same request.
+"""
+
+from response_utils import max_output_tokens_for
+
+CAMPAIGN_DEFAULTS = {
+    "product_name": "ZomZoo",
+    "product_category": "Clothing",
+    "target_audience_age": "18-24",
+    "target_audience_location": "Urban",
+    "campaign_goal": ["Increase brand awareness", "Generate leads"],
+    "brand_voice": "Formal",
+    "estimated_budget": "1,000-5,000",
+}
+
+STORY_DEFAULTS = {
+    "name": "Mittens",
+    "type": "Cat",
+    "persona": "Mitten is a very friendly cat.",
+    "location": "Andromeda Galaxy",
+    "length": "Short",
+    "premise": ["Love", "Adventure"],
+    "creativity": "Low",
+}
+
+
+def campaign_prompt(inputs):
+    return f"""Generate a marketing campaign for {inputs['product_name']}, a {inputs['product_category']} designed for the age group: {inputs['target_audience_age']}. 
+    The target location is this: {inputs['target_audience_location']}.
+    Aim to primarily achieve {inputs['campaign_goal']}. 
+    Emphasize the product's unique selling proposition while using a {inputs['brand_voice']} tone of voice. 
+    Allocate the total budget of {inputs['estimated_budget']}.  
+    With these inputs, make sure to follow following guidelines and generate the marketing campaign with proper headlines: \n
+    - Briefly describe the company, its values, mission, and target audience.
+    - Highlight any relevant brand guidelines or messaging frameworks.
+    - Provide a concise overview of the campaign's objectives and goals.
+    - Briefly explain the product or service being promoted.
+    - Define your ideal customer with clear demographics, psychographics, and behavioral insights.
+    - Understand their needs, wants, motivations, and pain points.
+    - Clearly articulate the desired outcomes for the campaign.
+    - Use SMART goals (Specific, Measurable, Achievable, Relevant, and Time-bound) for clarity.
+    - Define key performance indicators (KPIs) to track progress and success.
+    - Specify the primary and secondary goals of the campaign.
+    - Examples include brand awareness, lead generation, sales growth, or website traffic.
+    - Clearly define what differentiates your product or service from competitors.
+    - Emphasize the value proposition and unique benefits offered to the target audience.
+    - Define the desired tone and personality of the campaign messaging.
+    - Identify the specific channels you will use to reach your target audience.
+    - Clearly state the desired action you want the audience to take.
+    - Make it specific, compelling, and easy to understand.
+    - Identify and analyze your key competitors in the market.
+    - Understand their strengths and weaknesses, target audience, and marketing strategies.
+    - Develop a differentiation strategy to stand out from the competition.
+    - Define how you will track the success of the campaign.
+    - Use relevant KPIs to measure performance and return on investment (ROI).
+    Provide bullet points and headlines for the marketing campaign. Do not produce any empty lines. Be very succinct and to the point.
+    """
+
+
+def campaign_config(inputs):
+    return {
+        "temperature": 0.8,
+        "max_output_tokens": max_output_tokens_for("campaign"),
+        }
+
+
+# prompt for writing the whole story in one call.
+def story_prompt(details):
+    return f"""Write a {details['length']} story based on the following premise: \n
+    character_name: {details['name']} \n
+    character_type: {details['type']} \n
+    character_persona: {details['persona']} \n
+    character_location: {details['location']} \n
+    story_premise: {",".join(details['premise'])} \n
+    If the story is "short", then make sure to have 5 chapters or else if it is "long" then 10 chapters.
+    Important point is that each chapter should be generated based on the premise given above.
+    First start by giving the book introduction, chapter introductions and then each chapter. It should also have a proper ending.
+    The book should have a prologue and an epilogue.
+    """
+
+
+# the kind of request a story is, for its output budget and model route.
+def story_request_type(details):
+    return "story_long" if details["length"] == "Long" else "story_short"
+
+
+def story_config(details):
+    if details["creativity"] == "Low":
+        temperature = 0.30
+    else:
+        temperature = 0.95
+
+    # longer stories get a larger output budget so they are not cut short
+    return {
+        "temperature": temperature,
+        "max_output_tokens": max_output_tokens_for(story_request_type(details)),
+        }
+
+
+# inputs whose wording may vary without changing the request; the semantic cache
+# compares their embeddings, and every other input must match exactly.
+SEMANTIC_TEXT_FIELDS = {
+    "story": ["persona"],
+    "campaign": [],
+}
+
+
+def _normalise(value):
+    if isinstance(value, list):
+        return [_normalise(item) for item in value]
+    return " ".join(str(value).split()).casefold()
+
+
+# (scope, identifying fields, free text) of a request, for the semantic cache, or
+# None if the kind has no free text, so near-duplicates are left to the response cache.
+def semantic_key(kind, inputs):
+    text_fields = SEMANTIC_TEXT_FIELDS.get(kind)
+    if not text_fields:
+        return None
+    fields = {field: _normalise(value) for field, value in inputs.items() if field not in text_fields}
+    return kind, fields, "\n".join(f"{field}: {inputs[field]}" for field in text_fields)
+
+
+# name -> (defaults, prompt template, generation config)
+TEMPLATES = {
+    "campaign": (CAMPAIGN_DEFAULTS, campaign_prompt, campaign_config),
+    "story": (STORY_DEFAULTS, story_prompt, story_config),
+}
@@ -0,0 +1,163 @@
+"""Client-side rate limiting and scheduling of Vertex AI requests.
+
+A single QuotaScheduler per process is shared by every Streamlit session. It
+admits requests in priority order once both the requests-per-minute and the
+estimated tokens-per-minute buckets allow them, and retries requests that
+still fail with ResourceExhausted (429) using jittered exponential backoff.
+"""
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from google.api_core.exceptions import ResourceExhausted
+
+REQUESTS_PER_MINUTE = int(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", 60))
+TOKENS_PER_MINUTE = int(os.environ.get("GEMINI_TOKENS_PER_MINUTE", 250000))
+MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", 5))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 32.0
+
+# lower values are scheduled first
+INTERACTIVE = 0
+BATCH = 10
+
+
+# refills continuously at rate_per_minute, holding at most capacity.
+class TokenBucket:
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # seconds until amount can be taken, 0 if it can be taken now.
+    def wait_time(self, amount):
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+
+def is_quota_error(error):
+    return isinstance(error, ResourceExhausted) or getattr(error, "code", None) == 429
+
+
+class QuotaScheduler:
+
+    def __init__(self,
+                 requests_per_minute=REQUESTS_PER_MINUTE,
+                 tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_retries=MAX_RETRIES,
+                 clock=time.monotonic,
+                 sleep=time.sleep):
+        self.requests = TokenBucket(requests_per_minute, clock=clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock=clock)
+        self.max_retries = max_retries
+        self.clock = clock
+        self.sleep = sleep
+        self.condition = threading.Condition()
+        self.queue = []
+        self.sequence = itertools.count()
+
+        self.queue_waits = deque(maxlen=1000)
+        self.admitted = 0
+        self.quota_errors = 0
+        self.retries = 0
+
+    # block until the request is at the head of the queue and the buckets allow it.
+    # returns the time spent waiting.
+    def acquire(self, estimated_tokens, priority=INTERACTIVE):
+        entry = (priority, next(self.sequence))
+        start = self.clock()
+        with self.condition:
+            heapq.heappush(self.queue, entry)
+            try:
+                while True:
+                    if self.queue[0] == entry:
+                        wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+                        if wait <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(estimated_tokens)
+                            heapq.heappop(self.queue)
+                            break
+                        self.condition.wait(timeout=wait)
+                    else:
+                        self.condition.wait()
+            except BaseException:
+                # e.g. the Streamlit script was stopped; give up our place in the queue
+                self.queue.remove(entry)
+                heapq.heapify(self.queue)
+                raise
+            finally:
+                self.condition.notify_all()
+
+            waited = self.clock() - start
+            self.queue_waits.append(waited)
+            self.admitted += 1
+        return waited
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    # run fn() once admitted, retrying quota errors with exponential backoff.
+    # returns fn's result and the total time spent queued.
+    def call(self, fn, estimated_tokens=0, priority=INTERACTIVE):
+        queued = 0.0
+        for attempt in range(self.max_retries + 1):
+            queued += self.acquire(estimated_tokens, priority)
+            try:
+                return fn(), queued
+            except Exception as e:
+                if not is_quota_error(e):
+                    raise
+                with self.condition:
+                    self.quota_errors += 1
+                if attempt == self.max_retries:
+                    raise
+                with self.condition:
+                    self.retries += 1
+                pause = self._backoff(attempt)
+                self.sleep(pause)
+                queued += pause
+
+    def metrics(self):
+        with self.condition:
+            waits = sorted(self.queue_waits)
+            queue_length = len(self.queue)
+            admitted, quota_errors, retries = self.admitted, self.quota_errors, self.retries
+
+        def percentile(pct):
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(pct / 100 * len(waits)))]
+
+        return {
+            "queue_length": queue_length,
+            "admitted": admitted,
+            "quota_errors": quota_errors,
+            "retries": retries,
+            "queue_wait_p50": percentile(50),
+            "queue_wait_p95": percentile(95),
+            "queue_wait_max": waits[-1] if waits else 0.0,
+        }
+
+
+# one scheduler per process, shared by all Streamlit sessions
+SCHEDULER = QuotaScheduler()
@@ -0,0 +1,67 @@
+"""Registry of the playground scenarios, loaded from scenarios.json.
+
+Each scenario names the assets it shows, its prompt (a list of text pieces and
+{"asset": name} references), its button and, optionally, a generation config,
+whether its assets go into context cache and the model route it takes (see
+router.py; "vision" by default). The playground tabs, the "Run
+all" buttons and precompute.py are all driven from it, so a new scenario only
+needs a new entry in the file. The file is parsed once per process.
+"""
+
+import functools
+import json
+import os
+
+REGISTRY_PATH = os.environ.get("SCENARIO_REGISTRY",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios.json"))
+
+
+class Registry:
+
+    def __init__(self, data):
+        self.assets = data["assets"]
+        self.playgrounds = data["playgrounds"]
+        self.scenarios = {}
+        self._validate()
+
+    def _validate(self):
+        keys = set()
+        for playground in self.playgrounds:
+            keys.add(playground["run_all"]["key"])
+            for scenario in playground["scenarios"]:
+                if scenario["id"] in self.scenarios:
+                    raise ValueError(f"duplicate scenario id {scenario['id']}")
+                self.scenarios[scenario["id"]] = scenario
+
+                key = scenario["button"]["key"]
+                if key in keys:
+                    raise ValueError(f"duplicate widget key {key} in scenario {scenario['id']}")
+                keys.add(key)
+
+                referenced = [piece["asset"] for piece in scenario["prompt"] if isinstance(piece, dict)]
+                referenced += [name for item in scenario.get("display", []) for name in item["assets"]]
+                for name in referenced:
+                    if name not in self.assets:
+                        raise ValueError(f"scenario {scenario['id']} uses unknown asset {name}")
+
+    def playground(self, playground_id):
+        for playground in self.playgrounds:
+            if playground["id"] == playground_id:
+                return playground
+        raise KeyError(playground_id)
+
+
+# the prompt of a scenario, with its asset references replaced by Parts.
+def prompt_parts(scenario, parts):
+    return [parts[piece["asset"]] if isinstance(piece, dict) else piece for piece in scenario["prompt"]]
+
+
+# the prompt of a scenario as text, for showing to the user.
+def prompt_text(scenario):
+    return "\n".join("{" + piece["asset"] + "}" if isinstance(piece, dict) else piece for piece in scenario["prompt"])
+
+
+@functools.lru_cache(maxsize=None)
+def load_registry(path=REGISTRY_PATH):
+    with open(path, encoding="utf-8") as f:
+        return Registry(json.load(f))
@@ -0,0 +1,194 @@
+"""Cache of complete Gemini responses for deterministic requests.
+
+Responses are keyed by a hash of the model name, the prompt parts (text, and
+URI / mime type or data of each Part), the generation config and the safety
+settings. Entries live in an in-memory LRU and, optionally, in a second tier
+on disk (RESPONSE_CACHE_DIR) or in Redis (RESPONSE_CACHE_REDIS_URL), shared
+across processes. Requests with a temperature above
+RESPONSE_CACHE_MAX_TEMPERATURE are never cached.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 24 * 60 * 60))
+MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+MAX_CACHEABLE_TEMPERATURE = float(os.environ.get('RESPONSE_CACHE_MAX_TEMPERATURE', 0.2))
+CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR')
+REDIS_URL = os.environ.get('RESPONSE_CACHE_REDIS_URL')
+# a cache that cannot be reached must not hold up the request it was meant to speed up
+REDIS_CONNECT_TIMEOUT = float(os.environ.get('RESPONSE_CACHE_REDIS_CONNECT_TIMEOUT', 1.0))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('RESPONSE_CACHE_REDIS_TIMEOUT', 1.0))
+
+
+# canonical, JSON-serialisable form of one prompt part.
+def _canonical_part(part):
+    if isinstance(part, str):
+        return {"text": part}
+    if hasattr(part, "to_dict"):
+        return part.to_dict()
+    return {"repr": repr(part)}
+
+
+# canonical form of a generation config given as a dict or GenerationConfig.
+def canonical_config(config):
+    if not config:
+        return {}
+    if hasattr(config, "to_dict"):
+        return config.to_dict()
+    return dict(config)
+
+
+def _canonical_safety_settings(safety_settings):
+    if not safety_settings:
+        return {}
+    return {str(category): str(threshold) for category, threshold in safety_settings.items()}
+
+
+def model_name(model):
+    return getattr(model, "_model_name", type(model).__name__)
+
+
+# hash identifying a request; equal requests give equal keys.
+def cache_key(model, contents, generation_config=None, safety_settings=None):
+    if not isinstance(contents, list):
+        contents = [contents]
+    payload = json.dumps({
+        "model": model_name(model),
+        "contents": [_canonical_part(part) for part in contents],
+        "generation_config": canonical_config(generation_config),
+        "safety_settings": _canonical_safety_settings(safety_settings),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# only low temperature requests are deterministic enough to reuse.
+def is_cacheable(generation_config):
+    temperature = canonical_config(generation_config).get("temperature", 1.0)
+    return temperature <= MAX_CACHEABLE_TEMPERATURE
+
+
+class MemoryTier:
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, text = entry
+            if expires < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return text
+
+    def put(self, key, text, ttl):
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, text)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class DiskTier:
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires"] < time.time():
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        return entry["text"]
+
+    def put(self, key, text, ttl):
+        # write to a temporary file first so readers never see a partial entry
+        path = self._path(key)
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump({"expires": time.time() + ttl, "text": text}, f)
+        os.replace(temporary_path, path)
+
+
+class RedisTier:
+
+    def __init__(self, url, prefix="gemini-response:", connect_timeout=REDIS_CONNECT_TIMEOUT,
+                 socket_timeout=REDIS_SOCKET_TIMEOUT):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_connect_timeout=connect_timeout,
+                                           socket_timeout=socket_timeout)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def put(self, key, text, ttl):
+        self.client.setex(self.prefix + key, ttl, text.encode("utf-8"))
+
+
+class ResponseCache:
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES, shared_tier=None):
+        self.ttl = ttl
+        self.memory = MemoryTier(max_entries)
+        self.shared_tier = shared_tier
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        text = self.memory.get(key)
+        if text is None and self.shared_tier is not None:
+            try:
+                text = self.shared_tier.get(key)
+            except Exception as e:
+                logging.warning(f"response cache lookup failed: {e}")
+            if text is not None:
+                self.memory.put(key, text, self.ttl)
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return text
+
+    def put(self, key, text):
+        self.memory.put(key, text, self.ttl)
+        if self.shared_tier is not None:
+            try:
+                self.shared_tier.put(key, text, self.ttl)
+            except Exception as e:
+                logging.warning(f"response cache store failed: {e}")
+
+
+def _shared_tier():
+    if REDIS_URL:
+        return RedisTier(REDIS_URL)
+    if CACHE_DIR:
+        return DiskTier(CACHE_DIR)
+    return None
+
+
+# one cache per process, shared by all Streamlit sessions
+RESPONSE_CACHE = ResponseCache(shared_tier=_shared_tier())
@@ -1,54 +1,562 @@
+import contextvars
+import functools
+import logging
+import os
+import re
+import time
+from concurrent import futures
 
+import streamlit as st
+from cancellation import Cancelled, CancelToken, cancel_scope, current_token
+from context_cache import CONTEXT_CACHE
+from rate_limiter import INTERACTIVE, SCHEDULER
+from response_cache import RESPONSE_CACHE, cache_key, is_cacheable, model_name
+from router import DEFAULT_ROUTE, ModelRouter, should_fall_back
+from semantic_cache import ENABLED as SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE, is_semantic_cacheable
+from telemetry import TELEMETRY
 from vertexai.preview.generative_models import (Content,
                                             GenerationConfig,
                                             GenerativeModel,
                                             GenerationResponse,
                                             Image,
-                                            HarmCategory, 
+                                            HarmCategory,
                                             HarmBlockThreshold,
                                             Part)
 
-def get_gemini_text_response( model: GenerativeModel,
-                            prompt: str, 
-                            generation_config: GenerationConfig,
-                            stream=True):
+SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+}
 
-    safety_settings={
-        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-    }
+# max_output_tokens for each kind of request
+OUTPUT_TOKEN_BUDGETS = {
+    "story_short": 2048,
+    "story_long": 8192,
+    "story_outline": 1024,
+    "story_chapter": 2048,
+    "campaign": 2048,
+    "vision": 2048,
+}
+DEFAULT_OUTPUT_TOKENS = 2048
 
-    responses = model.generate_content(prompt,
-                                   generation_config = generation_config,
-                                   safety_settings = safety_settings,
-                                   stream=True)
+# prompts estimated above this many input tokens are rejected before dispatch
+MAX_INPUT_TOKENS = int(os.environ.get("GEMINI_MAX_INPUT_TOKENS", 32000))
 
-    final_response = []
-    for response in responses:
+# ask the API for exact token counts instead of using the local estimate
+EXACT_TOKEN_COUNT = os.environ.get("GEMINI_EXACT_TOKEN_COUNT") == "1"
+
+VISION_GENERATION_CONFIG = {'temperature': 0.1,
+                            'max_output_tokens': OUTPUT_TOKEN_BUDGETS["vision"]
+                            }
+
+# rough number of characters per token, used when the API reports no usage
+CHARS_PER_TOKEN = 4
+
+# rough number of tokens for an image or video part, used for rate limiting
+MEDIA_PART_TOKENS = 258
+
+# defaults for running several requests at once
+MAX_CONCURRENT_REQUESTS = 4
+REQUEST_TIMEOUT_SECONDS = 120
+
+# waits for the first chunk of requests, so they can time out or be cancelled
+_starter = futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="gemini-start")
+# how often a request waiting for its first chunk checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.1
+
+
+# the finish reason of a streamed chunk, if it is the last one.
+def _finish_reason(response):
+    candidates = getattr(response, "candidates", None)
+    reason = candidates[0].finish_reason if candidates else getattr(response, "finish_reason", None)
+    if not reason:
+        return None
+    # FINISH_REASON_UNSPECIFIED is 0 on every chunk but the last
+    return getattr(reason, "name", str(reason))
+
+
+# timing of a streamed response: time to first token and output tokens per second.
+class StreamStats:
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.end = None
+        self.characters = 0
+        self.reported_tokens = None
+        self.reported_input_tokens = None
+        self.estimated_input_tokens = 0
+        self.finish_reason = None
+        self.cached = False
+        self.queue_wait = 0.0
+        self.context_cached_tokens = 0
+        self.semantic_similarity = None
+
+    def record(self, response, text):
+        if text and self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.characters += len(text)
+
+        # usage metadata is cumulative, the last chunk carries the total
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and getattr(usage, "candidates_token_count", 0):
+            self.reported_tokens = usage.candidates_token_count
+        if usage is not None and getattr(usage, "prompt_token_count", 0):
+            self.reported_input_tokens = usage.prompt_token_count
+        if usage is not None and getattr(usage, "cached_content_token_count", 0):
+            self.context_cached_tokens = usage.cached_content_token_count
+        reason = _finish_reason(response)
+        if reason is not None:
+            self.finish_reason = reason
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def output_tokens(self):
+        if self.reported_tokens is not None:
+            return self.reported_tokens
+        return self.characters // CHARS_PER_TOKEN
+
+    @property
+    def input_tokens(self):
+        if self.reported_input_tokens is not None:
+            return self.reported_input_tokens
+        return self.estimated_input_tokens
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.start
+
+    @property
+    def tokens_per_second(self):
+        if self.first_token_at is None or self.end is None or self.end <= self.first_token_at:
+            return None
+        return self.output_tokens / (self.end - self.first_token_at)
+
+    def summary(self):
+        if self.time_to_first_token is None:
+            return "No output received."
+        if self.cached and self.semantic_similarity is not None:
+            return (f"Served from cache for a similar prompt (similarity {self.semantic_similarity:.3f}) "
+                    f"in {self.time_to_first_token:.3f}s, {self.output_tokens} tokens")
+        if self.cached:
+            return f"Served from cache in {self.time_to_first_token:.3f}s, {self.output_tokens} tokens"
+        summary = f"First token after {self.time_to_first_token:.2f}s, {self.output_tokens} tokens"
+        if self.tokens_per_second is not None:
+            summary += f" at {self.tokens_per_second:.1f} tokens/s"
+        if self.queue_wait >= 0.1:
+            summary += f" (queued {self.queue_wait:.1f}s for quota)"
+        if self.context_cached_tokens:
+            summary += f", {self.context_cached_tokens} input tokens read from context cache"
+        return summary
+
+
+# raised instead of sending a prompt that is over its input token budget.
+class PromptTooLargeError(ValueError):
+
+    def __init__(self, tokens, budget):
+        super().__init__(f"prompt is about {tokens} tokens, over the budget of {budget} tokens")
+        self.tokens = tokens
+        self.budget = budget
+
+
+def max_output_tokens_for(request_type):
+    return OUTPUT_TOKEN_BUDGETS.get(request_type, DEFAULT_OUTPUT_TOKENS)
+
+
+# local estimate of the tokens in a piece of text: words and punctuation marks
+# are roughly a token each, long words several.
+@functools.lru_cache(maxsize=1024)
+def estimate_text_tokens(text):
+    pieces = len(re.findall(r"\w+|[^\w\s]", text))
+    return max(pieces, len(text) // CHARS_PER_TOKEN) + 1
+
+
+# estimated input tokens of a prompt; image and video parts count a fixed amount.
+def estimate_tokens(contents):
+    if not isinstance(contents, list):
+        contents = [contents]
+    tokens = 0
+    for part in contents:
+        if isinstance(part, str):
+            tokens += estimate_text_tokens(part)
+        else:
+            tokens += MEDIA_PART_TOKENS
+    return tokens
+
+
+_exact_token_counts = {}
+
+
+# input tokens of a prompt, from the count_tokens API if exact, else the local estimate.
+def count_tokens(model: GenerativeModel, contents, exact=EXACT_TOKEN_COUNT):
+    if not exact or not hasattr(model, "count_tokens"):
+        return estimate_tokens(contents)
+
+    key = cache_key(model, contents)
+    if key not in _exact_token_counts:
         try:
-            final_response.append(response.text)
-        except IndexError:
-            final_response.append("")
-            continue
-    return " ".join(final_response)
+            _exact_token_counts[key] = model.count_tokens(contents).total_tokens
+        except Exception as e:
+            logging.warning(f"count_tokens failed, using the local estimate: {e}")
+            return estimate_tokens(contents)
+    return _exact_token_counts[key]
+
+
+# reject a prompt that is over budget before paying for it; returns its token count.
+def check_prompt_budget(model: GenerativeModel, contents, max_input_tokens=MAX_INPUT_TOKENS):
+    tokens = count_tokens(model, contents)
+    if tokens > max_input_tokens:
+        raise PromptTooLargeError(tokens, max_input_tokens)
+    return tokens
+
+
+# the stream with its first chunk (if any) put back; closing it closes the stream.
+def _with_first(first, responses):
+    try:
+        if first is not None:
+            yield first
+        yield from responses
+    finally:
+        close = getattr(responses, "close", None)
+        if close is not None:
+            close()
+
 
+# close the stream of a request that was given up on while it started.
+def _close_started(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
 
-def get_gemini_vision_response(model: GenerativeModel, prompt_list, generation_config={}, stream=True):
 
-    generation_config = {'temperature': 0.1,
-                     'max_output_tokens': 2048
-                     }
+# start a streamed request through the shared quota scheduler. quota errors surface
+# when the first chunk is read, so that happens inside the scheduler's retries.
+# raises TimeoutError if there is no first chunk within first_token_timeout seconds,
+# and Cancelled if the request's cancel token is cancelled first.
+def _start_stream(model, contents, generation_config, safety_settings, priority, input_tokens,
+                  first_token_timeout=None):
+    token = current_token()
 
-    responses = model.generate_content(prompt_list, generation_config = generation_config, stream=True)
+    def start():
+        # the caller may have given up while the request was queued for quota
+        if token is not None:
+            token.raise_if_cancelled()
+        responses = iter(model.generate_content(contents,
+                                                generation_config = generation_config,
+                                                safety_settings = safety_settings,
+                                                stream=True))
+        return _with_first(next(responses, None), responses)
 
-    final_response = []
+    def start_in_background():
+        future = _starter.submit(start)
+        deadline = None if first_token_timeout is None else time.monotonic() + first_token_timeout
+        while True:
+            try:
+                return future.result(timeout=CANCEL_POLL_SECONDS)
+            except futures.TimeoutError:
+                pass
+            if token is not None and token.cancelled:
+                future.add_done_callback(_close_started)
+                token.raise_if_cancelled()
+            if deadline is not None and time.monotonic() > deadline:
+                future.add_done_callback(_close_started)
+                raise TimeoutError(f"no response from {model_name(model)} within {first_token_timeout}s")
+
+    if token is None and first_token_timeout is None:
+        return SCHEDULER.call(start, estimated_tokens=input_tokens, priority=priority)
+    return SCHEDULER.call(start_in_background, estimated_tokens=input_tokens, priority=priority)
+
+
+# yield the text of each streamed chunk as it arrives, until the cancel token is cancelled.
+def _iter_text(responses, stats=None, token=None):
     for response in responses:
+        if token is not None:
+            token.raise_if_cancelled()
+        try:
+            text = response.text
+        except (IndexError, ValueError):
+            # chunks without text, e.g. an empty or blocked candidate
+            text = ""
+        if stats is not None:
+            stats.record(response, text)
+        if text:
+            yield text
+    if stats is not None:
+        stats.finish()
+
+
+# move the image and video parts of a prompt into context cache, leaving only the text to send.
+def _with_context_cache(model, contents):
+    if not isinstance(contents, list):
+        return model, contents
+    media = [part for part in contents if not isinstance(part, str)]
+    cached_model = CONTEXT_CACHE.model_for(model, media)
+    if cached_model is None:
+        return model, contents
+    return cached_model, [part for part in contents if isinstance(part, str)]
+
+
+def _serve_cached(text, stats, similarity=None):
+    if stats is not None:
+        stats.cached = True
+        stats.semantic_similarity = similarity
+        stats.record(None, text)
+        stats.finish()
+
+
+# stream the model's response, serving deterministic requests from the response cache
+# and, given a semantic_key of (scope, identifying fields, free text), near-duplicate
+# requests from the semantic cache if their scope and temperature allow it.
+def _generate(model, contents, generation_config, safety_settings, stats, use_cache,
+              priority, use_context_cache, semantic_key, first_token_timeout=None):
+    key = None
+    if use_cache and is_cacheable(generation_config):
+        key = cache_key(model, contents, generation_config, safety_settings)
+        text = RESPONSE_CACHE.get(key)
+        if text is not None:
+            _serve_cached(text, stats)
+            yield text
+            return
+
+    embedding = None
+    if (use_cache and semantic_key is not None and SEMANTIC_CACHE_ENABLED
+            and is_semantic_cacheable(generation_config, semantic_key[0])):
+        scope, fields, semantic_text = semantic_key
         try:
-            final_response.append(response.text)
-        except IndexError: 
-            final_response.append("")
-            continue
-    return(" ".join(final_response))
+            text, similarity, embedding = SEMANTIC_CACHE.get(model, semantic_text, generation_config, scope, fields)
+        except Exception as e:
+            logging.warning(f"semantic cache lookup failed: {e}")
+            text = None
+        if text is not None:
+            _serve_cached(text, stats, similarity)
+            yield text
+            return
+
+    if use_context_cache:
+        model, contents = _with_context_cache(model, contents)
+
+    input_tokens = check_prompt_budget(model, contents)
+    stats.estimated_input_tokens = input_tokens
+    responses, queue_wait = _start_stream(model, contents, generation_config, safety_settings, priority, input_tokens,
+                                          first_token_timeout)
+    stats.queue_wait = queue_wait
+
+    chunks = []
+    try:
+        for text in _iter_text(responses, stats, current_token()):
+            chunks.append(text)
+            yield text
+    finally:
+        # stop the model generating a response that will not be read
+        responses.close()
+
+    # only complete responses are cached: not ones abandoned part way, nor empty,
+    # blocked or truncated (MAX_TOKENS) ones, which a retry may well get right
+    text = "".join(chunks)
+    if not text or stats.finish_reason != "STOP":
+        return
+    if key is not None:
+        RESPONSE_CACHE.put(key, text)
+    if embedding is not None:
+        SEMANTIC_CACHE.put(model, generation_config, embedding, text, scope, fields)
+
+
+# _generate on the model, or on the route's models in turn if given a ModelRouter, falling
+# back to the next one if a model fails before any output. recorded as a telemetry span
+# whether it completes, fails or is abandoned.
+def _stream_response(model, contents, generation_config, safety_settings, stats, use_cache,
+                     priority=INTERACTIVE, use_context_cache=False, semantic_key=None, route=None):
+    if stats is None:
+        stats = StreamStats()
+    router, first_token_timeout = None, None
+    candidates = [model]
+    if isinstance(model, ModelRouter):
+        router, route = model, route or DEFAULT_ROUTE
+        candidates, first_token_timeout = router.candidates(route), router.first_token_timeout(route)
+
+    span = TELEMETRY.start_span(candidates[0], contents, generation_config)
+    try:
+        for attempt, candidate in enumerate(candidates):
+            span.model = model_name(candidate)
+            attempt_start = time.perf_counter()
+            started = False
+            try:
+                for text in _generate(candidate, contents, generation_config, safety_settings, stats, use_cache,
+                                      priority, use_context_cache, semantic_key, first_token_timeout):
+                    started = True
+                    yield text
+            except Exception as e:
+                if router is None or isinstance(e, Cancelled):
+                    raise
+                fall_back = not started and attempt + 1 < len(candidates) and should_fall_back(e)
+                router.record_failure(span.model, e, fall_back)
+                if not fall_back:
+                    raise
+                span.fallback_from.append(span.model)
+                continue
+            if router is not None and not stats.cached and stats.first_token_at is not None:
+                router.record_success(span.model, stats.first_token_at - attempt_start)
+            return
+    except GeneratorExit:
+        span.status = "abandoned"
+        raise
+    except Cancelled as e:
+        span.status = "cancelled"
+        span.error = e
+        raise
+    except Exception as e:
+        span.status = "error"
+        span.error = e
+        raise
+    finally:
+        TELEMETRY.end_span(span, stats)
+
+
+# stream a text response chunk by chunk, e.g. for st.write_stream.
+def stream_gemini_text_response(model: GenerativeModel,
+                                prompt: str,
+                                generation_config: GenerationConfig,
+                                stats: StreamStats = None,
+                                use_cache=True,
+                                semantic_key=None,
+                                route="text",
+                                priority=INTERACTIVE):
+
+    yield from _stream_response(model, prompt, generation_config, SAFETY_SETTINGS, stats, use_cache,
+                                priority=priority, semantic_key=semantic_key, route=route)
+
+
+# stream a multimodal response chunk by chunk, e.g. for st.write_stream.
+def stream_gemini_vision_response(model: GenerativeModel,
+                                  prompt_list,
+                                  generation_config=None,
+                                  stats: StreamStats = None,
+                                  use_cache=True,
+                                  use_context_cache=False,
+                                  route="vision",
+                                  priority=INTERACTIVE):
+
+    if not generation_config:
+        generation_config = VISION_GENERATION_CONFIG
+
+    yield from _stream_response(model, prompt_list, generation_config, None, stats, use_cache,
+                                priority=priority, use_context_cache=use_context_cache, route=route)
+
+
+def get_gemini_text_response( model: GenerativeModel,
+                            prompt: str,
+                            generation_config: GenerationConfig,
+                            stream=True,
+                            use_cache=True,
+                            semantic_key=None,
+                            route="text",
+                            priority=INTERACTIVE):
+
+    return "".join(stream_gemini_text_response(model, prompt, generation_config, use_cache=use_cache,
+                                               semantic_key=semantic_key, route=route, priority=priority))
+
+
+def get_gemini_vision_response(model: GenerativeModel, prompt_list, generation_config=None, stream=True, use_cache=True,
+                               use_context_cache=False, route="vision", priority=INTERACTIVE):
+
+    return "".join(stream_gemini_vision_response(model, prompt_list, generation_config, use_cache=use_cache,
+                                                 use_context_cache=use_context_cache, route=route,
+                                                 priority=priority))
+
+
+# outcome of one request in a batch, in the same position as its request.
+class BatchResult:
+
+    def __init__(self, text=None, error=None, latency=0.0):
+        self.text = text
+        self.error = error
+        self.latency = latency
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+# run call(item) for every item on a bounded thread pool, returning results in input order.
+# each request gets its own timeout, counted from when it starts running, and its own
+# cancel token, cancelled when it times out or the caller's token is cancelled.
+def fan_out(call, items, max_concurrency, timeout):
+    started = [None] * len(items)
+    tokens = [CancelToken(current_token()) for _ in items]
+
+    def run(index, item):
+        started[index] = time.monotonic()
+        with cancel_scope(tokens[index]):
+            text = call(item)
+        return text, time.monotonic() - started[index]
+
+    executor = futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gemini")
+    # each request runs in a copy of the caller's context, so telemetry knows its tab
+    pending = [executor.submit(contextvars.copy_context().run, run, index, item) for index, item in enumerate(items)]
+
+    results = []
+    for index, future in enumerate(pending):
+        while True:
+            done, _ = futures.wait([future], timeout=0.1)
+            if done:
+                try:
+                    text, latency = future.result()
+                    results.append(BatchResult(text=text, latency=latency))
+                except Exception as e:
+                    results.append(BatchResult(error=e, latency=time.monotonic() - started[index]))
+                break
+            if started[index] is not None and time.monotonic() - started[index] > timeout:
+                future.cancel()
+                tokens[index].cancel("timed out")
+                results.append(BatchResult(error=TimeoutError(f"request timed out after {timeout}s"),
+                                           latency=time.monotonic() - started[index]))
+                break
+
+    # do not wait for timed-out requests still running in the background
+    # (cancelled one by one; shutdown's cancel_futures needs Python 3.9 and the image runs 3.8)
+    for future, token in zip(pending, tokens):
+        future.cancel()
+        token.cancel("abandoned")
+    executor.shutdown(wait=False)
+    return results
+
+
+# run several text prompts concurrently; wall time approaches the slowest single request.
+def get_gemini_text_responses(model: GenerativeModel,
+                              prompts,
+                              generation_config: GenerationConfig,
+                              max_concurrency=MAX_CONCURRENT_REQUESTS,
+                              timeout=REQUEST_TIMEOUT_SECONDS):
+
+    return fan_out(lambda prompt: get_gemini_text_response(model, prompt, generation_config),
+                    prompts, max_concurrency, timeout)
+
+
+# run several multimodal prompt lists concurrently; wall time approaches the slowest single request.
+def get_gemini_vision_responses(model: GenerativeModel,
+                                prompt_lists,
+                                generation_config=None,
+                                max_concurrency=MAX_CONCURRENT_REQUESTS,
+                                timeout=REQUEST_TIMEOUT_SECONDS,
+                                use_context_cache=False):
+
+    return fan_out(lambda prompt_list: get_gemini_vision_response(model, prompt_list, generation_config,
+                                                                   use_context_cache=use_context_cache),
+                    prompt_lists, max_concurrency, timeout)
+
 
+# show the results of a batch run, one expander per labelled request.
+def render_batch_results(labels, results, elapsed):
+    slowest = max((result.latency for result in results), default=0.0)
+    st.caption(f"{len(results)} responses in {elapsed:.1f}s (slowest single request {slowest:.1f}s)")
+    for label, result in zip(labels, results):
+        with st.expander(f"{label} ({result.latency:.1f}s)", expanded=True):
+            if result.ok:
+                st.markdown(result.text)
+            else:
+                st.error(f"Request failed: {result.error}")
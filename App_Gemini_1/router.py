@@ -0,0 +1,143 @@
+"""Route each request to a Gemini model by its kind, with fallback.
+
+A route names the models that may serve a kind of request, in order of
+preference: a light model for short stories, campaigns and simple image
+questions, a stronger one for long-form writing and ER-diagram documentation.
+MODEL_ROUTES (a JSON object of route -> policy) overrides or adds routes.
+
+A policy is {"models": [...], "max_first_token_s": ..., "first_token_timeout_s": ...}:
+  - models are tried in order; a request falls back to the next one if the
+    previous fails before any output (quota still exhausted after retries,
+    server errors, or no first token within first_token_timeout_s).
+  - a model that failed is tried last for COOLDOWN_SECONDS.
+  - if the preferred model's observed time to first token (a moving average)
+    is over max_first_token_s, an alternate that is faster (or not yet
+    observed) is tried first; every PROBE_EVERY requests the preferred model
+    is tried anyway, so it can win its place back.
+
+Pass a ModelRouter wherever response_utils takes a model, with route= naming
+the kind of request.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from google.api_core.exceptions import GoogleAPICallError
+
+from rate_limiter import is_quota_error
+
+LIGHT_MODEL = "gemini-2.0-flash-lite"
+STRONG_MODEL = "gemini-2.0-flash"
+
+DEFAULT_ROUTES = {
+    "text": {"models": [STRONG_MODEL, LIGHT_MODEL]},
+    "story_short": {"models": [LIGHT_MODEL, STRONG_MODEL], "max_first_token_s": 5},
+    "story_long": {"models": [STRONG_MODEL, LIGHT_MODEL]},
+    # the outline must be valid JSON, which the stronger model gets right more often
+    "story_outline": {"models": [STRONG_MODEL, LIGHT_MODEL], "first_token_timeout_s": 30},
+    "story_chapter": {"models": [LIGHT_MODEL, STRONG_MODEL], "max_first_token_s": 5},
+    "campaign": {"models": [LIGHT_MODEL, STRONG_MODEL], "max_first_token_s": 5},
+    "vision": {"models": [LIGHT_MODEL, STRONG_MODEL], "max_first_token_s": 5},
+    "vision_complex": {"models": [STRONG_MODEL, LIGHT_MODEL]},
+}
+DEFAULT_ROUTE = "text"
+FIRST_TOKEN_TIMEOUT_SECONDS = float(os.environ.get("MODEL_FIRST_TOKEN_TIMEOUT_SECONDS", 60))
+COOLDOWN_SECONDS = 60
+# weight of the newest observation in the moving average of time to first token
+LATENCY_SMOOTHING = 0.3
+PROBE_EVERY = 20
+
+
+def load_routes():
+    routes = {name: dict(policy) for name, policy in DEFAULT_ROUTES.items()}
+    overrides = os.environ.get("MODEL_ROUTES")
+    if overrides:
+        routes.update(json.loads(overrides))
+    return routes
+
+
+# errors worth retrying on another model; bad prompts fail the same way everywhere.
+def should_fall_back(error):
+    if isinstance(error, TimeoutError) or is_quota_error(error):
+        return True
+    return isinstance(error, GoogleAPICallError) and getattr(error, "code", 500) >= 500
+
+
+class ModelRouter:
+
+    def __init__(self, load_model, routes=None, cooldown=COOLDOWN_SECONDS, clock=time.monotonic):
+        # load_model(name) returns a GenerativeModel, e.g. the class itself
+        self.load_model = load_model
+        self.routes = routes if routes is not None else load_routes()
+        self.cooldown = cooldown
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.models = {}
+        self.first_token_times = {}
+        self.failed_at = {}
+        self.requests = {}
+        self.fallbacks = 0
+
+    def policy(self, route):
+        return self.routes.get(route) or self.routes[DEFAULT_ROUTE]
+
+    def first_token_timeout(self, route):
+        return self.policy(route).get("first_token_timeout_s", FIRST_TOKEN_TIMEOUT_SECONDS)
+
+    def model(self, name):
+        with self.lock:
+            if name not in self.models:
+                self.models[name] = self.load_model(name)
+            return self.models[name]
+
+    # names of the models to try for a route, best first.
+    def order(self, route):
+        policy = self.policy(route)
+        names = list(policy["models"])
+        now = self.clock()
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            healthy = [name for name in names if now - self.failed_at.get(name, -self.cooldown) >= self.cooldown]
+            cooling = [name for name in names if name not in healthy]
+            limit = policy.get("max_first_token_s")
+            probe = self.requests[route] % PROBE_EVERY == 0
+            if limit is not None and len(healthy) > 1 and not probe:
+                preferred = self.first_token_times.get(healthy[0])
+                # a model not observed yet is given a chance
+                faster = min(healthy[1:], key=lambda name: self.first_token_times.get(name, 0.0))
+                if preferred is not None and preferred > limit and self.first_token_times.get(faster, 0.0) < preferred:
+                    healthy.remove(faster)
+                    healthy.insert(0, faster)
+        return healthy + cooling
+
+    # the models to try for a route, best first.
+    def candidates(self, route):
+        return [self.model(name) for name in self.order(route)]
+
+    def record_success(self, name, time_to_first_token):
+        if time_to_first_token is None:
+            return
+        with self.lock:
+            previous = self.first_token_times.get(name)
+            self.first_token_times[name] = (time_to_first_token if previous is None else
+                                            LATENCY_SMOOTHING * time_to_first_token + (1 - LATENCY_SMOOTHING) * previous)
+            self.failed_at.pop(name, None)
+
+    def record_failure(self, name, error, fell_back):
+        logging.warning(f"{name} failed{', falling back' if fell_back else ''}: {error}")
+        with self.lock:
+            self.failed_at[name] = self.clock()
+            if fell_back:
+                self.fallbacks += 1
+
+    def metrics(self):
+        now = self.clock()
+        with self.lock:
+            return {
+                "fallbacks": self.fallbacks,
+                "first_token_s": dict(self.first_token_times),
+                "cooling_down": sorted(name for name, at in self.failed_at.items() if now - at < self.cooldown),
+            }
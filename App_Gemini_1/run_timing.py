@@ -0,0 +1,48 @@
+"""Wall time of each script run and fragment rerun, kept per session.
+
+app.py times the full script; the tabs are fragments, so interacting with a
+widget in one tab only reruns that tab, which is timed on its own.
+"""
+
+import functools
+import logging
+import time
+from collections import deque
+
+import streamlit as st
+
+HISTORY = 20
+
+
+def record(name, seconds):
+    if "run_times" not in st.session_state:
+        st.session_state.run_times = {}
+    st.session_state.run_times.setdefault(name, deque(maxlen=HISTORY)).append(seconds)
+    logging.debug(f"{name} ran in {1000 * seconds:.1f}ms")
+
+
+# record the wall time of each call to the decorated function under name.
+def timed(name):
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+
+    return decorator
+
+
+# show the latest and median run time of the script and each fragment.
+def render_run_times():
+    run_times = st.session_state.get("run_times", {})
+    if not run_times:
+        return
+    with st.expander("Run times"):
+        for name, times in run_times.items():
+            ordered = sorted(times)
+            st.text(f"{name:<20} last {1000 * times[-1]:7.1f}ms   median {1000 * ordered[len(ordered) // 2]:7.1f}ms   ({len(times)} runs)")
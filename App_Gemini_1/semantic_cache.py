@@ -0,0 +1,267 @@
+"""Semantic cache of text responses, for near-duplicate prompts.
+
+Story and campaign prompts are mostly the tab defaults with small edits, so
+many requests differ from an earlier one only trivially. Each request is
+embedded and compared with earlier ones; if one is at least
+SEMANTIC_CACHE_THRESHOLD similar (cosine) and was generated in the same scope
+by the same model with the same generation config, its response is served.
+
+Callers embed only the free-text part of the request (e.g. a character's
+persona), not the whole prompt, and pass the fields that identify it (names,
+choices) to be matched exactly: an embedding of a long template, or of a
+list of fields, scores two requests that differ in one name as near-identical,
+and a story about one character would be served for another. The threshold
+has only been tried with fakes.FakeEmbedder, not with the Vertex AI model.
+
+The index is a NumPy matrix of normalised embeddings searched by brute force.
+With SEMANTIC_CACHE_ANN=lsh, random-hyperplane LSH narrows the search to the
+prompts sharing a bucket first. Entries expire after SEMANTIC_CACHE_TTL, the
+least recently used are evicted beyond SEMANTIC_CACHE_SIZE, and the index is
+saved to SEMANTIC_CACHE_PATH (if set) so it survives restarts.
+
+Like the response cache, only requests at or below
+RESPONSE_CACHE_MAX_TEMPERATURE are cached by default: above it a user asking
+again expects a different response. A scope can opt in to sampled responses
+by being listed in SEMANTIC_CACHE_SCOPES (e.g. "story,campaign"); its
+requests are then cached up to SEMANTIC_CACHE_MAX_TEMPERATURE, so the most
+creative settings still get a fresh response every time.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from response_cache import canonical_config, is_cacheable, model_name
+
+ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "1") == "1"
+THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.97))
+MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_SIZE", 5000))
+TTL = int(os.environ.get("SEMANTIC_CACHE_TTL", 7 * 24 * 60 * 60))
+INDEX_PATH = os.environ.get("SEMANTIC_CACHE_PATH")
+ANN = os.environ.get("SEMANTIC_CACHE_ANN", "")
+EMBEDDING_MODEL = os.environ.get("SEMANTIC_CACHE_EMBEDDING_MODEL", "text-embedding-005")
+SCOPES = {scope.strip() for scope in os.environ.get("SEMANTIC_CACHE_SCOPES", "").split(",") if scope.strip()}
+MAX_TEMPERATURE = float(os.environ.get("SEMANTIC_CACHE_MAX_TEMPERATURE", 0.8))
+# save the index after this many new entries
+SAVE_EVERY = 20
+
+
+# embeddings from a Vertex AI text embedding model.
+class VertexEmbedder:
+
+    def __init__(self, model=EMBEDDING_MODEL):
+        from vertexai.language_models import TextEmbeddingModel
+        self.model = TextEmbeddingModel.from_pretrained(model)
+
+    def embed(self, text):
+        return self.model.get_embeddings([text])[0].values
+
+
+# whether responses to a request in scope may be cached and reused.
+def is_semantic_cacheable(generation_config, scope=""):
+    if scope not in SCOPES:
+        return is_cacheable(generation_config)
+    return canonical_config(generation_config).get("temperature", 1.0) <= MAX_TEMPERATURE
+
+
+# the scope, identifying fields, model and generation config a cached response must match exactly.
+def config_key(model, generation_config, scope="", fields=None):
+    return json.dumps({"scope": scope, "fields": fields or {}, "model": model_name(model),
+                       "config": canonical_config(generation_config)}, sort_keys=True, default=str)
+
+
+# random-hyperplane LSH: prompts whose embeddings fall on the same side of
+# every hyperplane of a table share a bucket.
+class LSHIndex:
+
+    def __init__(self, dimensions, tables=8, planes=12, seed=0):
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((tables, planes, dimensions)).astype(np.float32)
+        self.buckets = [{} for _ in range(tables)]
+
+    def _keys(self, vector):
+        bits = (np.einsum("tpd,d->tp", self.planes, vector) > 0).astype(np.uint8)
+        return [bytes(np.packbits(row)) for row in bits]
+
+    def add(self, row, vector):
+        for table, key in zip(self.buckets, self._keys(vector)):
+            table.setdefault(key, set()).add(row)
+
+    def candidates(self, vector):
+        rows = set()
+        for table, key in zip(self.buckets, self._keys(vector)):
+            rows |= table.get(key, set())
+        return rows
+
+
+class SemanticCache:
+
+    def __init__(self, embedder=None, threshold=THRESHOLD, max_entries=MAX_ENTRIES, ttl=TTL,
+                 path=INDEX_PATH, ann=ANN, clock=time.time):
+        self._embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.ann = ann
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.vectors = None
+        self.entries = []
+        self.lsh = None
+        self.unsaved = 0
+
+        self.lookups = 0
+        self.hits = 0
+        self.lookup_latencies = deque(maxlen=1000)
+        self.hit_similarities = deque(maxlen=1000)
+
+        if path:
+            self.load()
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = VertexEmbedder()
+        return self._embedder
+
+    def embed(self, text):
+        vector = np.asarray(self.embedder.embed(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _rebuild_lsh(self):
+        self.lsh = None
+        if self.ann == "lsh" and self.vectors is not None:
+            self.lsh = LSHIndex(self.vectors.shape[1])
+            for row, vector in enumerate(self.vectors):
+                self.lsh.add(row, vector)
+
+    # (response, similarity) of the best matching entry, or (None, best similarity).
+    def _search(self, vector, key):
+        if self.vectors is None or not self.entries:
+            return None, 0.0
+        rows = np.arange(len(self.entries))
+        if self.lsh is not None:
+            rows = np.fromiter(self.lsh.candidates(vector), dtype=np.int64)
+            if not len(rows):
+                return None, 0.0
+        similarities = self.vectors[rows] @ vector
+
+        now = self.clock()
+        best, best_similarity = None, 0.0
+        for index in np.argsort(-similarities):
+            entry = self.entries[rows[index]]
+            if entry["config_key"] != key or entry["expires"] < now:
+                continue
+            best, best_similarity = entry, float(similarities[index])
+            break
+        if best is None or best_similarity < self.threshold:
+            return None, best_similarity
+        best["last_used"] = now
+        best["hits"] += 1
+        return best["text"], best_similarity
+
+    # look up a request by the text describing it; returns (response or None, similarity,
+    # embedding to pass to put).
+    def get(self, model, text, generation_config, scope="", fields=None):
+        start = time.perf_counter()
+        vector = self.embed(text)
+        with self.lock:
+            text, similarity = self._search(vector, config_key(model, generation_config, scope, fields))
+            self.lookups += 1
+            self.lookup_latencies.append(time.perf_counter() - start)
+            if text is not None:
+                self.hits += 1
+                self.hit_similarities.append(similarity)
+        return text, similarity, vector
+
+    def put(self, model, generation_config, vector, text, scope="", fields=None):
+        now = self.clock()
+        with self.lock:
+            entry = {"config_key": config_key(model, generation_config, scope, fields), "text": text,
+                     "created": now, "last_used": now, "expires": now + self.ttl, "hits": 0}
+            self.entries.append(entry)
+            row = vector.reshape(1, -1)
+            self.vectors = row if self.vectors is None else np.vstack([self.vectors, row])
+            if self.lsh is None and self.ann == "lsh":
+                self._rebuild_lsh()
+            elif self.lsh is not None:
+                self.lsh.add(len(self.entries) - 1, vector)
+
+            if len(self.entries) > self.max_entries:
+                # evict a little more than needed so this does not happen on every put
+                self._evict(int(self.max_entries * 0.9))
+            self.unsaved += 1
+            save = self.path and self.unsaved >= SAVE_EVERY
+        if save:
+            self.save()
+
+    # drop expired entries, then the least recently used beyond target entries.
+    def _evict(self, target=None):
+        now = self.clock()
+        keep = [row for row, entry in enumerate(self.entries) if entry["expires"] >= now]
+        keep.sort(key=lambda row: self.entries[row]["last_used"], reverse=True)
+        keep = sorted(keep[:target or self.max_entries])
+        self.entries = [self.entries[row] for row in keep]
+        self.vectors = self.vectors[keep] if keep else None
+        self._rebuild_lsh()
+
+    def save(self):
+        with self.lock:
+            if self.vectors is None:
+                return
+            vectors, entries = self.vectors.copy(), list(self.entries)
+            self.unsaved = 0
+        # write to temporary files first so a crash never leaves a partial index
+        np.save(f"{self.path}.vectors.tmp.npy", vectors)
+        with open(f"{self.path}.entries.tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(f"{self.path}.vectors.tmp.npy", f"{self.path}.vectors.npy")
+        os.replace(f"{self.path}.entries.tmp", f"{self.path}.entries.json")
+
+    def load(self):
+        try:
+            vectors = np.load(f"{self.path}.vectors.npy")
+            with open(f"{self.path}.entries.json", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.info(f"no semantic cache index loaded from {self.path}: {e}")
+            return
+        if len(vectors) != len(entries):
+            logging.warning(f"semantic cache index at {self.path} is inconsistent, starting empty")
+            return
+        with self.lock:
+            self.vectors, self.entries = vectors, entries
+            self._evict()
+
+    def metrics(self):
+        with self.lock:
+            latencies = sorted(self.lookup_latencies)
+            similarities = list(self.hit_similarities)
+            lookups, hits, entries = self.lookups, self.hits, len(self.entries)
+
+        def percentile(pct):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(pct / 100 * len(latencies)))]
+
+        return {
+            "entries": entries,
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "lookup_p50_ms": 1000 * percentile(50),
+            "lookup_p95_ms": 1000 * percentile(95),
+            "mean_hit_similarity": sum(similarities) / len(similarities) if similarities else 0.0,
+        }
+
+
+# one index per process, shared by all Streamlit sessions
+SEMANTIC_CACHE = SemanticCache()
@@ -0,0 +1,148 @@
+"""Chaptered story generation.
+
+Instead of asking for a whole book in one call, which truncates long stories at
+max_output_tokens and writes every chapter one after the other, the book is
+generated in stages:
+
+  1. outline  - one short call plans the title and a summary of the prologue,
+                each chapter and the epilogue.
+  2. expand   - every section is written by its own call, concurrently, with the
+                outline and its neighbours' summaries as shared context.
+  3. stitch   - the finished sections are joined in reading order.
+
+expand_sections yields sections as they finish so the UI can show them early.
+"""
+
+import contextvars
+import json
+import re
+import time
+from concurrent import futures
+
+from cancellation import CancelToken, cancel_scope, current_token
+from response_utils import (MAX_CONCURRENT_REQUESTS,
+                            BatchResult,
+                            get_gemini_text_response,
+                            max_output_tokens_for)
+
+CHAPTERS = {"Short": 5, "Long": 10}
+
+
+def _premise(details):
+    return f"""character_name: {details['name']}
+    character_type: {details['type']}
+    character_persona: {details['persona']}
+    character_location: {details['location']}
+    story_premise: {",".join(details['premise'])}"""
+
+
+def outline_prompt(details):
+    chapters = CHAPTERS[details["length"]]
+    return f"""Plan a book based on the following premise:
+    {_premise(details)}
+
+    The book has a prologue, {chapters} chapters and an epilogue, and a proper ending.
+    Reply with JSON only, in this form:
+    {{"title": "...",
+      "prologue": "two sentence summary",
+      "chapters": [{{"title": "...", "summary": "two sentence summary"}}],
+      "epilogue": "two sentence summary"}}
+    """
+
+
+# strip a ```json fence if the model added one.
+def _json_text(text):
+    match = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    return match.group(1) if match else text
+
+
+# turn the model's outline into a list of sections in reading order.
+# raises ValueError if the outline cannot be understood.
+def parse_outline(text):
+    try:
+        outline = json.loads(_json_text(text))
+        chapters = outline["chapters"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"could not read the story outline: {e}")
+    if not chapters:
+        raise ValueError("the story outline has no chapters")
+
+    sections = [{"title": "Prologue", "summary": outline.get("prologue", "")}]
+    for number, chapter in enumerate(chapters, start=1):
+        sections.append({"title": f"Chapter {number}: {chapter.get('title', '')}".rstrip(": "),
+                         "summary": chapter.get("summary", "")})
+    sections.append({"title": "Epilogue", "summary": outline.get("epilogue", "")})
+    return outline.get("title", "Untitled"), sections
+
+
+def section_prompt(details, book_title, sections, index):
+    section = sections[index]
+    plan = "\n".join(f"    - {s['title']}: {s['summary']}" for s in sections)
+    before = sections[index - 1]["summary"] if index > 0 else "(this is the start of the book)"
+    after = sections[index + 1]["summary"] if index + 1 < len(sections) else "(this is the end of the book)"
+    return f"""You are writing the book "{book_title}", based on the following premise:
+    {_premise(details)}
+
+    The plan for the whole book is:
+{plan}
+
+    Write only the section "{section['title']}": {section['summary']}
+    It follows on from: {before}
+    It leads into: {after}
+    Do not repeat the section title and do not write any other section.
+    """
+
+
+# plan the book; returns its title, the sections and the raw outline text.
+def generate_outline(model, details, temperature):
+    config = {"temperature": temperature, "max_output_tokens": max_output_tokens_for("story_outline")}
+    text = get_gemini_text_response(model, outline_prompt(details), config, route="story_outline")
+    title, sections = parse_outline(text)
+    return title, sections, text
+
+
+# write every section concurrently, yielding (index, BatchResult) in completion order.
+# if the caller stops reading, the sections still being written are cancelled.
+def expand_sections(model, details, book_title, sections, temperature, max_concurrency=MAX_CONCURRENT_REQUESTS):
+    config = {"temperature": temperature, "max_output_tokens": max_output_tokens_for("story_chapter")}
+    token = CancelToken(current_token())
+
+    def write(index):
+        start = time.monotonic()
+        with cancel_scope(token):
+            text = get_gemini_text_response(model, section_prompt(details, book_title, sections, index), config,
+                                            route="story_chapter")
+        return text, time.monotonic() - start
+
+    with futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="chapter") as executor:
+        pending = {executor.submit(contextvars.copy_context().run, write, index): index
+                   for index in range(len(sections))}
+        try:
+            for future in futures.as_completed(pending):
+                try:
+                    text, latency = future.result()
+                    yield pending[future], BatchResult(text=text, latency=latency)
+                except Exception as e:
+                    yield pending[future], BatchResult(error=e)
+        except BaseException:
+            # e.g. a Streamlit rerun closed this generator; the executor waits for the workers to stop
+            token.cancel("abandoned")
+            raise
+
+
+# join the finished sections in reading order.
+def stitch_story(book_title, sections, results):
+    parts = [f"# {book_title}"]
+    for section, result in zip(sections, results):
+        body = result.text if result is not None and result.ok else "*(this section could not be written)*"
+        parts.append(f"## {section['title']}\n\n{body.strip()}")
+    return "\n\n".join(parts)
+
+
+# run the whole pipeline without a UI; returns the stitched story.
+def generate_story(model, details, temperature, max_concurrency=MAX_CONCURRENT_REQUESTS):
+    book_title, sections, _ = generate_outline(model, details, temperature)
+    results = [None] * len(sections)
+    for index, result in expand_sections(model, details, book_title, sections, temperature, max_concurrency):
+        results[index] = result
+    return stitch_story(book_title, sections, results)
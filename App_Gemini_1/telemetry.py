@@ -0,0 +1,381 @@
+"""Telemetry of Gemini requests: latency, token usage and estimated cost.
+
+Every request made through response_utils is recorded as a span: wall time,
+time to first token, time queued for quota, input and output tokens (from the
+response's usage_metadata, else the local estimate), finish reason, whether it
+was served from a cache, and the estimated cost. Spans are aggregated per tab,
+model and generation config for the admin page (pages/admin.py), and exported
+as OpenTelemetry spans:
+
+  - TELEMETRY_SPANS_PATH: append each span to this file as a line of OTLP JSON.
+  - TELEMETRY_OTEL=1: emit each span through the OpenTelemetry API, if it is
+    installed. With opentelemetry-sdk and the OTLP exporter installed and
+    OTEL_EXPORTER_OTLP_ENDPOINT set, a tracer provider exporting there is set up.
+
+The tab is taken from the request_tab context, set around the code that makes
+the request (fan_out carries it into its worker threads).
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import Counter, deque
+
+from response_cache import model_name
+
+SPANS_PATH = os.environ.get("TELEMETRY_SPANS_PATH")
+OTEL_ENABLED = os.environ.get("TELEMETRY_OTEL") == "1"
+SPAN_NAME = "gemini.generate_content"
+# spans kept for the admin page's list of slowest requests
+RECENT_SPANS = 500
+# latencies kept per aggregate for percentiles
+LATENCY_HISTORY = 1000
+PROMPT_PREVIEW_CHARS = 200
+
+# list prices in USD per million tokens (input, output); cached input tokens are
+# billed at CACHED_INPUT_DISCOUNT of the input price. Estimates only.
+PRICES_PER_MILLION_TOKENS = {
+    "gemini-2.0-flash": (0.15, 0.60),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+}
+CACHED_INPUT_DISCOUNT = 0.25
+
+_tab = contextvars.ContextVar("telemetry_tab", default="other")
+
+
+# attribute the requests made inside to a tab; usable as a decorator or a with block.
+@contextlib.contextmanager
+def request_tab(tab):
+    token = _tab.set(tab)
+    try:
+        yield
+    finally:
+        _tab.reset(token)
+
+
+def current_tab():
+    return _tab.get()
+
+
+def estimate_cost(model, input_tokens, output_tokens, cached_input_tokens=0):
+    prices = PRICES_PER_MILLION_TOKENS.get(model)
+    if prices is None:
+        return None
+    input_price, output_price = prices
+    billed_input = input_tokens - cached_input_tokens + cached_input_tokens * CACHED_INPUT_DISCOUNT
+    return (billed_input * input_price + output_tokens * output_price) / 1_000_000
+
+
+def config_label(generation_config):
+    if hasattr(generation_config, "to_dict"):
+        generation_config = generation_config.to_dict()
+    config = generation_config or {}
+    return f"temperature={config.get('temperature')} max_output_tokens={config.get('max_output_tokens')}"
+
+
+def prompt_preview(contents):
+    if not isinstance(contents, list):
+        contents = [contents]
+    text = " ".join(part for part in contents if isinstance(part, str))
+    return " ".join(text.split())[:PROMPT_PREVIEW_CHARS]
+
+
+# one request, from the first call into response_utils to the end of its stream.
+class Span:
+
+    def __init__(self, model, contents, generation_config, tab=None):
+        self.trace_id = secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.tab = tab or current_tab()
+        self.model = model_name(model)
+        self.config = config_label(generation_config)
+        self.prompt = prompt_preview(contents)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+        self.error = None
+        self.cache = None
+        # models that failed before this one served the request
+        self.fallback_from = []
+        self.latency = None
+        self.time_to_first_token = None
+        self.queue_wait = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_input_tokens = 0
+        self.finish_reason = None
+        self.cost = None
+
+    # fill in the results from the request's StreamStats.
+    def finish(self, stats):
+        self.end_ns = time.time_ns()
+        self.latency = (self.end_ns - self.start_ns) / 1e9
+        self.time_to_first_token = stats.time_to_first_token
+        self.queue_wait = stats.queue_wait
+        self.output_tokens = stats.output_tokens
+        self.finish_reason = stats.finish_reason
+        if stats.cached:
+            self.cache = "semantic" if stats.semantic_similarity is not None else "response"
+            # nothing was sent to the model
+            self.input_tokens = 0
+            self.output_tokens = 0
+        else:
+            self.input_tokens = stats.input_tokens
+            self.cached_input_tokens = stats.context_cached_tokens
+        self.cost = estimate_cost(self.model, self.input_tokens, self.output_tokens, self.cached_input_tokens)
+
+    # attributes named after the OpenTelemetry generative AI semantic conventions.
+    def attributes(self):
+        attributes = {
+            "gen_ai.system": "vertex_ai",
+            "gen_ai.request.model": self.model,
+            "gen_ai.usage.input_tokens": self.input_tokens,
+            "gen_ai.usage.output_tokens": self.output_tokens,
+            "gemini.config": self.config,
+            "gemini.tab": self.tab,
+            "gemini.prompt_preview": self.prompt,
+            "gemini.queue_wait_s": self.queue_wait,
+            "gemini.cached_input_tokens": self.cached_input_tokens,
+        }
+        if self.finish_reason:
+            attributes["gen_ai.response.finish_reasons"] = [self.finish_reason]
+        if self.time_to_first_token is not None:
+            attributes["gemini.time_to_first_token_s"] = self.time_to_first_token
+        if self.cache:
+            attributes["gemini.cache"] = self.cache
+        if self.fallback_from:
+            attributes["gemini.fallback_from"] = list(self.fallback_from)
+        if self.cost is not None:
+            attributes["gemini.estimated_cost_usd"] = self.cost
+        if self.error is not None:
+            attributes["error.type"] = type(self.error).__name__
+        return attributes
+
+    def to_dict(self):
+        return {
+            "tab": self.tab,
+            "model": self.model,
+            "config": self.config,
+            "prompt": self.prompt,
+            "status": self.status,
+            "error": None if self.error is None else str(self.error),
+            "cache": self.cache,
+            "fallback_from": ", ".join(self.fallback_from),
+            "latency_s": self.latency,
+            "time_to_first_token_s": self.time_to_first_token,
+            "queue_wait_s": self.queue_wait,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "finish_reason": self.finish_reason,
+            "cost_usd": self.cost,
+        }
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, list):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+# the span in the OTLP JSON encoding.
+def otlp_json(span):
+    return {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": SPAN_NAME,
+        "kind": 3,  # SPAN_KIND_CLIENT
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes().items()],
+        "status": {"code": 2, "message": str(span.error)} if span.status == "error" else {"code": 1},
+    }
+
+
+# appends spans to a file, one line of OTLP JSON each.
+class JsonlSpanExporter:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(otlp_json(span))
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+# emits spans through the OpenTelemetry API, for whatever tracer provider is configured.
+class OpenTelemetryExporter:
+
+    def __init__(self):
+        from opentelemetry import trace
+        self._configure_sdk(trace)
+        self.trace = trace
+        self.tracer = trace.get_tracer("gemini-app")
+
+    @staticmethod
+    def _configure_sdk(trace):
+        if not os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            return
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            logging.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk or the OTLP exporter is not installed")
+            return
+        provider = TracerProvider(resource=Resource.create({"service.name": "gemini-app"}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+
+    def export(self, span):
+        otel_span = self.tracer.start_span(SPAN_NAME, kind=self.trace.SpanKind.CLIENT,
+                                           start_time=span.start_ns, attributes=span.attributes())
+        if span.status == "error":
+            otel_span.set_status(self.trace.Status(self.trace.StatusCode.ERROR, str(span.error)))
+        otel_span.end(end_time=span.end_ns)
+
+
+# running totals of the spans of one tab, model and generation config.
+class Aggregate:
+
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.abandoned = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self.first_token_times = deque(maxlen=LATENCY_HISTORY)
+        self.finish_reasons = Counter()
+
+    def add(self, span):
+        self.requests += 1
+        if span.cache:
+            self.cache_hits += 1
+            return
+        if span.status == "error":
+            self.errors += 1
+        elif span.status in ("abandoned", "cancelled"):
+            self.abandoned += 1
+        self.input_tokens += span.input_tokens
+        self.output_tokens += span.output_tokens
+        self.cost += span.cost or 0.0
+        self.latencies.append(span.latency)
+        if span.time_to_first_token is not None:
+            self.first_token_times.append(span.time_to_first_token)
+        if span.finish_reason:
+            self.finish_reasons[span.finish_reason] += 1
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class Telemetry:
+
+    def __init__(self, exporters=None):
+        self.exporters = exporters if exporters is not None else _exporters()
+        self.lock = threading.Lock()
+        self.aggregates = {}
+        self.recent = deque(maxlen=RECENT_SPANS)
+        self.started = time.time()
+
+    def start_span(self, model, contents, generation_config):
+        return Span(model, contents, generation_config)
+
+    def end_span(self, span, stats):
+        span.finish(stats)
+        with self.lock:
+            self.aggregates.setdefault((span.tab, span.model, span.config), Aggregate()).add(span)
+            self.recent.append(span)
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logging.warning(f"span export failed: {e}")
+
+    # one row per tab, model and generation config.
+    def summary(self):
+        with self.lock:
+            aggregates = list(self.aggregates.items())
+        rows = []
+        for (tab, model, config), aggregate in sorted(aggregates):
+            calls = aggregate.requests - aggregate.cache_hits
+            rows.append({
+                "tab": tab,
+                "model": model,
+                "config": config,
+                "requests": aggregate.requests,
+                "cache_hits": aggregate.cache_hits,
+                "errors": aggregate.errors,
+                "abandoned": aggregate.abandoned,
+                "input_tokens": aggregate.input_tokens,
+                "output_tokens": aggregate.output_tokens,
+                "mean_input_tokens": aggregate.input_tokens / calls if calls else 0,
+                "latency_p50_s": percentile(aggregate.latencies, 50),
+                "latency_p95_s": percentile(aggregate.latencies, 95),
+                "ttft_p50_s": percentile(aggregate.first_token_times, 50),
+                "ttft_p95_s": percentile(aggregate.first_token_times, 95),
+                "finish_reasons": dict(aggregate.finish_reasons),
+                "estimated_cost_usd": aggregate.cost,
+            })
+        return rows
+
+    # tokens per minute since the process started, for sizing quota.
+    def token_rates(self):
+        with self.lock:
+            aggregates = list(self.aggregates.values())
+        minutes = max((time.time() - self.started) / 60, 1 / 60)
+        return {
+            "input_tokens_per_minute": sum(a.input_tokens for a in aggregates) / minutes,
+            "output_tokens_per_minute": sum(a.output_tokens for a in aggregates) / minutes,
+            "requests_per_minute": sum(a.requests - a.cache_hits for a in aggregates) / minutes,
+        }
+
+    # the slowest recent requests that reached the model.
+    def slowest(self, count=20):
+        with self.lock:
+            spans = [span for span in self.recent if not span.cache]
+        spans.sort(key=lambda span: span.latency, reverse=True)
+        return [span.to_dict() for span in spans[:count]]
+
+    def reset(self):
+        with self.lock:
+            self.aggregates.clear()
+            self.recent.clear()
+            self.started = time.time()
+
+
+def _exporters():
+    exporters = []
+    if SPANS_PATH:
+        exporters.append(JsonlSpanExporter(SPANS_PATH))
+    if OTEL_ENABLED:
+        try:
+            exporters.append(OpenTelemetryExporter())
+        except ImportError:
+            logging.warning("TELEMETRY_OTEL=1 but opentelemetry is not installed, spans are not exported")
+    return exporters
+
+
+# one recorder per process, shared by all Streamlit sessions
+TELEMETRY = Telemetry()
@@ -0,0 +1,174 @@
+"""Measure Pub/Sub ingestion into a local redis-server, per message and in batches.
+
+Messages come from fakes.InMemorySubscription, whose pulls and acks each take
+--pubsub-ms, and Redis is reached through the proxy of benchmark_redis.py
+(each round trip +--rtt-ms).
+
+  - per message: --function-instances threads each take one message at a time
+    and run addToRedis on it (SET and GET, print), then acknowledge it, like
+    the function's push invocations. The platform's own cost per invocation
+    is not included.
+  - worker: ingest_worker.IngestWorker with --workers pull loops, batches of
+    --batch-size, one pipeline and one acknowledge per batch.
+
+Each case first drains a backlog of --messages messages (throughput), then
+takes --rate messages a second for --seconds seconds (lag from publish to
+write).
+
+    redis-server --port 6379 --save "" &
+    python benchmark_ingest.py
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from cloudevents.http import CloudEvent
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'redis-pubsub'))
+import main as function  # noqa: E402
+from benchmark_redis import DelayProxy  # noqa: E402
+from fakes import InMemorySubscription  # noqa: E402
+from ingest_worker import IngestWorker  # noqa: E402
+from redis_access import REDIS_HOST, REDIS_PORT, make_client, make_pool  # noqa: E402
+
+
+def message(number):
+    return json.dumps({'id': f'ingest:{number}', 'name': 'benchmark', 'payload': 'x' * 200}).encode()
+
+
+# addToRedis invocations, one message each, on a number of instances.
+class PerMessage:
+
+    def __init__(self, subscription, client, instances):
+        self.subscription = subscription
+        self.instances = instances
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.written = 0
+        self.all_lags = []
+        function.redis_client = client
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            for ack_id, data, publish_time in self.subscription.pull(1, timeout=0.1):
+                event = CloudEvent({'type': 'google.cloud.pubsub.topic.v1.messagePublished', 'source': 'benchmark'},
+                                   {'message': {'data': base64.b64encode(data).decode()}})
+                function.addToRedis(event)
+                self.subscription.acknowledge([ack_id])
+                with self.lock:
+                    self.written += 1
+                    self.all_lags.append(time.time() - publish_time)
+
+    def start(self):
+        self.threads = [threading.Thread(target=self._loop, daemon=True) for _ in range(self.instances)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+
+
+class Worker(IngestWorker):
+
+    def __init__(self, subscription, client, batch_size, workers):
+        super().__init__(subscription, client, batch_size=batch_size, workers=workers)
+        self.all_lags = []
+
+    def process_batch(self):
+        pulled = super().process_batch()
+        with self.lock:
+            self.all_lags.extend(self.lags)
+            self.lags = []
+        return pulled
+
+
+def written(runner):
+    with runner.lock:
+        return runner.written
+
+
+def lags(runner):
+    with runner.lock:
+        return sorted(runner.all_lags)
+
+
+def measure(make_runner, args):
+    subscription = InMemorySubscription(latency=args.pubsub_ms / 1000)
+    runner = make_runner(subscription)
+    for number in range(args.messages):
+        subscription.publish(message(number))
+
+    start = time.perf_counter()
+    runner.start()
+    while written(runner) < args.messages:
+        time.sleep(0.01)
+    throughput = args.messages / (time.perf_counter() - start)
+
+    # steady load, measured from a clean slate
+    with runner.lock:
+        runner.all_lags.clear()
+    target = args.messages + int(args.rate * args.seconds)
+    started = time.perf_counter()
+    for number in range(args.messages, target):
+        subscription.publish(message(number))
+        time.sleep(max(0.0, started + (number - args.messages + 1) / args.rate - time.perf_counter()))
+    deadline = time.perf_counter() + 30
+    while written(runner) < target and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    runner.stop()
+
+    steady = lags(runner)
+    return (throughput, steady[len(steady) // 2], steady[min(len(steady) - 1, int(len(steady) * 0.99))],
+            subscription.pulls, subscription.backlog())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default=REDIS_HOST)
+    parser.add_argument('--port', type=int, default=REDIS_PORT)
+    parser.add_argument('--messages', type=int, default=20000, help='backlog to drain')
+    parser.add_argument('--rate', type=float, default=2000.0, help='messages a second under steady load')
+    parser.add_argument('--seconds', type=float, default=5.0, help='length of the steady load')
+    parser.add_argument('--rtt-ms', type=float, default=1.0, help='round trip added by the Redis proxy')
+    parser.add_argument('--pubsub-ms', type=float, default=5.0, help='time of each pull and acknowledge')
+    parser.add_argument('--function-instances', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    proxy = DelayProxy(args.host, args.port, args.rtt_ms / 2000)
+
+    def client(connections):
+        return make_client(make_pool('127.0.0.1', proxy.port, max_connections=connections))
+
+    cases = [
+        (f'per message x{args.function_instances}',
+         lambda subscription: PerMessage(subscription, client(args.function_instances), args.function_instances)),
+    ] + [
+        (f'worker, batch {batch_size}',
+         lambda subscription, batch_size=batch_size: Worker(subscription, client(args.workers), batch_size, args.workers))
+        for batch_size in (100, 500)
+    ]
+
+    print(f"{'case':<20}{'msg/s':>9}{'lag p50 ms':>12}{'lag p99 ms':>12}{'pulls':>8}{'left':>6}")
+    for name, make_runner in cases:
+        # addToRedis prints every message; the logs are not what is measured
+        with contextlib.redirect_stdout(io.StringIO()):
+            throughput, p50, p99, pulls, left = measure(make_runner, args)
+        print(f'{name:<20}{throughput:>9.0f}{p50 * 1000:>12.1f}{p99 * 1000:>12.1f}{pulls:>8}{left:>6}')
+
+    make_client(make_pool(args.host, args.port)).delete(
+        *[f'ingest:{number}' for number in range(args.messages + int(args.rate * args.seconds))])
+
+
+if __name__ == '__main__':
+    main()
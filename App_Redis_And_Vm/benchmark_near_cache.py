@@ -0,0 +1,134 @@
+"""Measure getFromRedis's near cache against a local redis-server.
+
+Readers ask for --ids ids, 80% of the reads going to the 20 hottest, through
+the proxy of benchmark_redis.py (each round trip +--rtt-ms), while a writer
+updates random ids --writes-per-second times a second. Each case reports reads
+per second, latencies and the near cache's metrics.
+
+Then a key is rewritten --checks times and read straight back through the
+near cache, to count reads that returned the old value and to time how long
+the invalidation took to arrive.
+
+The benchmark turns on keyspace notifications (CONFIG SET
+notify-keyspace-events KA) on the server it is given.
+
+    redis-server --port 6379 --save "" &
+    python benchmark_near_cache.py
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+import redis
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'redis-http'))
+from benchmark_redis import DelayProxy  # noqa: E402
+from near_cache import NearCache  # noqa: E402
+from redis_access import REDIS_HOST, REDIS_PORT, make_client, make_pool  # noqa: E402
+
+HOT_IDS = 20
+HOT_SHARE = 0.8
+
+
+def pick(rng, ids):
+    if rng.random() < HOT_SHARE:
+        return ids[rng.randrange(HOT_IDS)]
+    return ids[rng.randrange(len(ids))]
+
+
+def run(read, ids, threads, seconds, writer_client, writes_per_second):
+    stop = threading.Event()
+    latencies = [[] for _ in range(threads)]
+
+    def reader(number):
+        rng = random.Random(number)
+        while not stop.is_set():
+            start = time.perf_counter()
+            read(pick(rng, ids))
+            latencies[number].append(time.perf_counter() - start)
+
+    def writer():
+        rng = random.Random(-1)
+        while not stop.wait(1 / writes_per_second):
+            writer_client.set(pick(rng, ids), f'value {time.time()}')
+
+    workers = [threading.Thread(target=reader, args=(number,)) for number in range(threads)]
+    workers.append(threading.Thread(target=writer))
+    for thread in workers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+
+    samples = sorted(latency for thread_latencies in latencies for latency in thread_latencies)
+    return len(samples) / seconds, samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+# rewrite a cached key and read it back at once, then until it is fresh.
+def check_invalidation(cache, client, checks):
+    stale_reads = 0
+    delays = []
+    for number in range(checks):
+        key = f'near:check:{number % 5}'
+        cache.get(key, client.get)
+        value = f'{number}'.encode()
+        client.set(key, value)
+        written = time.perf_counter()
+        if cache.get(key, client.get) != value:
+            stale_reads += 1
+        while cache.get(key, client.get) != value:
+            time.sleep(0.0001)
+        delays.append(time.perf_counter() - written)
+    delays.sort()
+    return stale_reads, delays[len(delays) // 2], delays[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default=REDIS_HOST)
+    parser.add_argument('--port', type=int, default=REDIS_PORT)
+    parser.add_argument('--ids', type=int, default=1000, help='ids that are read')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent readers')
+    parser.add_argument('--seconds', type=float, default=5.0, help='length of each case')
+    parser.add_argument('--writes-per-second', type=float, default=50.0)
+    parser.add_argument('--rtt-ms', type=float, default=1.0, help='round trip added by the proxy')
+    parser.add_argument('--checks', type=int, default=200, help='rewrites in the invalidation check')
+    args = parser.parse_args()
+
+    direct = redis.StrictRedis(host=args.host, port=args.port)
+    direct.config_set('notify-keyspace-events', 'KA')
+    ids = [f'near:{number}' for number in range(args.ids)]
+    direct.mset({id: f'value {id}' for id in ids})
+
+    proxy = DelayProxy(args.host, args.port, args.rtt_ms / 2000)
+    client = make_client(make_pool('127.0.0.1', proxy.port, max_connections=args.threads))
+    cache = NearCache(client).start()
+    if not cache.subscribed.wait(5):
+        raise SystemExit('the near cache could not subscribe to keyspace notifications')
+
+    print(f"{'case':<14}{'reads/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'hit rate':>10}{'invalidations':>15}")
+    for name, read in (('no cache', client.get), ('near cache', lambda id: cache.get(id, client.get))):
+        before = cache.metrics()
+        rate, p50, p99 = run(read, ids, args.threads, args.seconds, direct, args.writes_per_second)
+        metrics = {key: value - before[key] for key, value in cache.metrics().items() if isinstance(value, int)}
+        lookups = metrics['hits'] + metrics['misses']
+        hit_rate = f"{metrics['hits'] / lookups:.1%}" if lookups else '-'
+        print(f"{name:<14}{rate:>10.0f}{p50 * 1000:>9.3f}{p99 * 1000:>9.2f}{hit_rate:>10}{metrics['invalidations']:>15}")
+
+    stale_reads, p50, worst = check_invalidation(cache, direct, args.checks)
+    print(f'\n{args.checks} rewrites: {stale_reads} stale reads straight after the write, '
+          f'invalidation took {p50 * 1000:.2f} ms (median), {worst * 1000:.2f} ms (worst)')
+    print(cache.metrics())
+
+    cache.stop()
+    direct.delete(*ids, *[f'near:check:{number}' for number in range(5)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Measure the Redis functions against a local redis-server.
+
+Writes, as addToRedis does them:
+
+  - bare client: redis.StrictRedis as the functions created it, SET then GET,
+    two round trips.
+  - pooled, pipelined: redis_access's bounded pool, SET and GET in one
+    pipeline, one round trip.
+
+Each case runs a number of threads, like concurrent function requests, and is
+run straight against Redis and through a proxy that delays each direction by
+half of --rtt-ms, like the VPC connector between a function and Memorystore.
+
+Reads of --ids ids through getFromRedis, as a dashboard does them, over the
+proxy: one request per id, then one batch request with repeated ?id=
+parameters, then one with a POSTed JSON list. Only the function's own work is
+timed; a deployed function adds an invocation and a network hop per request.
+
+    redis-server --port 6379 --save "" &
+    python benchmark_redis.py
+    python benchmark_redis.py --threads 16 --ops 5000 --rtt-ms 2
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+import functions_framework
+import redis
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'redis-pubsub'))
+import redis_access  # noqa: E402
+from redis_access import REDIS_HOST, REDIS_PORT, make_client, make_pool, set_and_get  # noqa: E402
+
+VALUE = '{"id": "%s", "name": "benchmark", "payload": "' + 'x' * 200 + '"}'
+
+
+# Relays connections to Redis, holding each chunk for delay seconds.
+class DelayProxy:
+
+    def __init__(self, host, port, delay):
+        self.upstream = (host, port)
+        self.delay = delay
+        self.server = socket.create_server(('127.0.0.1', 0))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            downstream, _ = self.server.accept()
+            upstream = socket.create_connection(self.upstream)
+            for source, target in ((downstream, upstream), (upstream, downstream)):
+                source.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                threading.Thread(target=self._pump, args=(source, target), daemon=True).start()
+
+    def _pump(self, source, target):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                time.sleep(self.delay)
+                target.sendall(data)
+        except OSError:
+            pass
+        finally:
+            target.close()
+
+
+def bare_write(client, key, value):
+    client.set(key, value)
+    return client.get(key)
+
+
+def run(client, write, threads, ops):
+    latencies = [[] for _ in range(threads)]
+
+    def worker(number):
+        for op in range(ops):
+            key = f'benchmark:{number}:{op}'
+            start = time.perf_counter()
+            write(client, key, VALUE % key)
+            latencies[number].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    samples = sorted(latency for thread_latencies in latencies for latency in thread_latencies)
+    return len(samples) / elapsed, samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+# getFromRedis, served by the Functions Framework, reading through client.
+def http_function(client):
+    redis_access.client = client
+    return functions_framework.create_app('getFromRedis', os.path.join(HERE, 'redis-http', 'main.py')).test_client()
+
+
+def read_cases(app, ids):
+    query = '&'.join(f'id={id}' for id in ids)
+    return [
+        ('one request per id', len(ids), lambda: {id: app.get(f'/?id={id}').get_data(as_text=True) for id in ids}),
+        ('batch, ?id=...', 1, lambda: app.get(f'/?{query}').get_json()),
+        ('batch, JSON body', 1, lambda: app.post('/', json=ids).get_json()),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default=REDIS_HOST)
+    parser.add_argument('--port', type=int, default=REDIS_PORT)
+    parser.add_argument('--threads', type=int, default=8, help='concurrent writers')
+    parser.add_argument('--ops', type=int, default=2000, help='writes per thread')
+    parser.add_argument('--rtt-ms', type=float, default=1.0, help='round trip added by the proxy')
+    parser.add_argument('--ids', type=int, default=300, help='ids read by the dashboard')
+    args = parser.parse_args()
+
+    proxy = DelayProxy(args.host, args.port, args.rtt_ms / 2000)
+    print(f"{'case':<22}{'rtt':>8}{'ops/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for host, port, rtt in ((args.host, args.port, 'local'), ('127.0.0.1', proxy.port, f'+{args.rtt_ms:g}ms')):
+        ops = args.ops if rtt == 'local' else max(1, args.ops // 10)
+        cases = [
+            ('bare client', redis.StrictRedis(host=host, port=port), bare_write),
+            ('pooled, pipelined', make_client(make_pool(host, port, max_connections=args.threads)), set_and_get),
+        ]
+        for name, client, write in cases:
+            rate, p50, p99 = run(client, write, args.threads, ops)
+            print(f'{name:<22}{rtt:>8}{rate:>10.0f}{p50 * 1000:>9.2f}{p99 * 1000:>9.2f}')
+            client.close()
+
+    ids = [f'benchmark:0:{op}' for op in range(min(args.ids, args.ops))]
+    app = http_function(make_client(make_pool('127.0.0.1', proxy.port)))
+    print(f"\n{'reads of ' + str(len(ids)) + ' ids':<22}{'rtt':>8}{'requests':>10}{'ms':>9}")
+    for name, requests, read in read_cases(app, ids):
+        start = time.perf_counter()
+        values = read()
+        elapsed = time.perf_counter() - start
+        assert all(values[id] for id in ids), name
+        print(f"{name:<22}{'+' + format(args.rtt_ms, 'g') + 'ms':>8}{requests:>10}{elapsed * 1000:>9.1f}")
+
+    redis.StrictRedis(host=args.host, port=args.port).delete(
+        *[f'benchmark:{number}:{op}' for number in range(args.threads) for op in range(args.ops)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Local stand-ins for the benchmarks of the Redis functions."""
+
+import collections
+import itertools
+import threading
+import time
+
+
+# A Pub/Sub pull subscription in memory, with ingest_worker.PubSubSubscription's
+# interface. Each pull and acknowledge waits latency seconds, like a request to
+# Pub/Sub; messages not acknowledged within ack_deadline are delivered again.
+class InMemorySubscription:
+
+    def __init__(self, latency=0.0, ack_deadline=10.0, clock=time.time):
+        self.latency = latency
+        self.ack_deadline = ack_deadline
+        self.clock = clock
+        self.ids = itertools.count()
+        self.ready = collections.deque()
+        # ack_id -> (data, publish_time, deadline)
+        self.outstanding = {}
+        self.condition = threading.Condition()
+        self.pulls = 0
+        self.acknowledged = 0
+        self.redelivered = 0
+
+    def publish(self, data):
+        with self.condition:
+            self.ready.append((data, self.clock()))
+            self.condition.notify()
+
+    def _expire(self, now):
+        for ack_id, (data, publish_time, deadline) in list(self.outstanding.items()):
+            if deadline <= now:
+                del self.outstanding[ack_id]
+                self.ready.append((data, publish_time))
+                self.redelivered += 1
+
+    def pull(self, max_messages, timeout=1.0):
+        time.sleep(self.latency)
+        with self.condition:
+            self.pulls += 1
+            self._expire(self.clock())
+            if not self.ready:
+                self.condition.wait(timeout)
+            messages = []
+            now = self.clock()
+            while self.ready and len(messages) < max_messages:
+                data, publish_time = self.ready.popleft()
+                ack_id = str(next(self.ids))
+                self.outstanding[ack_id] = (data, publish_time, now + self.ack_deadline)
+                messages.append((ack_id, data, publish_time))
+            return messages
+
+    def acknowledge(self, ack_ids):
+        time.sleep(self.latency)
+        with self.condition:
+            for ack_id in ack_ids:
+                if self.outstanding.pop(ack_id, None) is not None:
+                    self.acknowledged += 1
+
+    def nack(self, ack_ids):
+        time.sleep(self.latency)
+        with self.condition:
+            for ack_id in ack_ids:
+                message = self.outstanding.pop(ack_id, None)
+                if message is not None:
+                    self.ready.append(message[:2])
+                    self.redelivered += 1
+            self.condition.notify_all()
+
+    def backlog(self):
+        with self.condition:
+            return len(self.ready) + len(self.outstanding)
@@ -1,20 +1,84 @@
+import json
 import os
 import redis
-from flask import request
+from flask import Response, request
 import functions_framework
+import near_cache
+from redis_access import client as redis_client, get_many
+
+# most ids one batch request may ask for
+MAX_BATCH_IDS = int(os.environ.get('REDIS_MAX_BATCH_IDS', 500))
+
+# hot ids are served from the instance when REDIS_NEAR_CACHE=1
+NEAR_CACHE = near_cache.NearCache(redis_client).start() if near_cache.ENABLED else None
+
+
+def read_one(id):
+    if NEAR_CACHE is None:
+        return redis_client.get(id)
+    return NEAR_CACHE.get(id, redis_client.get)
+
+
+def read_many(ids):
+    if NEAR_CACHE is None:
+        return get_many(redis_client, ids)
+    return NEAR_CACHE.get_many(ids, lambda keys: get_many(redis_client, keys))
+
+
+# The ids of a batch request: several ?id= parameters, or a POSTed JSON body
+# that is a list of ids or {"ids": [...]}. None for a single-id request.
+def batch_ids(request):
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        ids = body.get('ids') if isinstance(body, dict) else body
+        if not isinstance(ids, list):
+            return None
+    else:
+        ids = request.args.getlist('id')
+        if len(ids) < 2:
+            return None
+    return list(dict.fromkeys(str(id) for id in ids if id not in (None, '')))
+
+
+# Stream {"id": value, ...} a pair at a time; missing ids map to null.
+def json_map(ids, values):
+    yield '{'
+    for number, (id, value) in enumerate(zip(ids, values)):
+        if value is not None:
+            value = value.decode('utf-8', errors='replace')
+        yield (', ' if number else '') + json.dumps(id) + ': ' + json.dumps(value)
+    yield '}'
+
+
+def getBatchFromRedis(ids):
+    if len(ids) > MAX_BATCH_IDS:
+        return Response(json.dumps({'error': f'at most {MAX_BATCH_IDS} ids per request'}),
+                        status=400, mimetype='application/json')
+    try:
+        values = read_many(ids)
+    except redis.RedisError as e:
+        print(f"Error while reading from Redis: {e}")
+        return Response(json.dumps({'error': 'Redis is unavailable'}), status=503, mimetype='application/json')
+    return Response(json_map(ids, values), mimetype='application/json')
 
-redis_host = os.environ.get('REDISHOST', 'localhost')
-redis_port = int(os.environ.get('REDISPORT', 6379))
-redis_client = redis.StrictRedis(host=redis_host, port=redis_port)
 
 @functions_framework.http
 def getFromRedis(request):
+    if request.path == '/metrics':
+        metrics = NEAR_CACHE.metrics() if NEAR_CACHE is not None else {'enabled': False}
+        return Response(json.dumps(metrics), mimetype='application/json')
+
+    ids = batch_ids(request)
+    if ids is not None:
+        return getBatchFromRedis(ids)
+
     response_data = ""
     if request.method == 'GET':
         id = request.args.get('id')
         try:
-            response_data = redis_client.get(id)
-        except RuntimeError:
+            response_data = read_one(id)
+        except redis.RedisError as e:
+            print(f"Error while reading from Redis: {e}")
             response_data = ""
         if response_data is None:
             response_data = ""
@@ -0,0 +1,216 @@
+"""Per-instance cache of hot Redis values in front of getFromRedis.
+
+Off unless REDIS_NEAR_CACHE=1. Values (and misses) read from Redis are kept
+in a size-bounded LRU (REDIS_NEAR_CACHE_SIZE entries) for at most
+REDIS_NEAR_CACHE_TTL seconds, so repeated reads of a hot id are answered
+without leaving the instance.
+
+A background thread subscribes to the Redis keyspace notifications of the
+database and drops a key as soon as it is written, deleted, expired or evicted.
+Redis only sends these when notify-keyspace-events includes K and the events
+(e.g. "KA"); on Memorystore set it as an instance config:
+
+    gcloud redis instances update INSTANCE --update-redis-config notify-keyspace-events=KA
+
+While the subscription is down, the cache is emptied and not filled, since
+invalidations may have been missed. If the server does not send notifications,
+the TTL alone bounds how stale a value can be; FLUSHDB is never notified per
+key either. Notifications arrive a moment after the write (about one round
+trip), so a client that reads straight after its own write may get the old
+value. (Client-side caching with RESP3 tracking needs redis-py 5, not the
+4.3.4 the functions run.)
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+ENABLED = os.environ.get('REDIS_NEAR_CACHE', '0') == '1'
+MAX_ENTRIES = int(os.environ.get('REDIS_NEAR_CACHE_SIZE', 1000))
+TTL_SECONDS = float(os.environ.get('REDIS_NEAR_CACHE_TTL', 5.0))
+# wait between attempts to resubscribe
+RETRY_SECONDS = 1.0
+
+
+class NearCache:
+
+    def __init__(self, client, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, clock=time.monotonic):
+        self.client = client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        # key -> (expires, value)
+        self.entries = OrderedDict()
+        # key being read from Redis -> [readers, invalidations]; a reader
+        # caches its value only if the key was not invalidated meanwhile
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.subscribed = threading.Event()
+        self.stopped = threading.Event()
+        self.listener = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.skipped_fills = 0
+        # confirmed subscriptions; more than one means it was lost and renewed
+        self.subscriptions = 0
+
+    # start the invalidation listener; until it is subscribed nothing is cached.
+    def start(self):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self._listen, name='near-cache', daemon=True)
+                self.listener.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _subscriber(self):
+        # a connection of its own, without the pool's socket timeout, which
+        # would end a quiet subscription
+        kwargs = self.client.connection_pool.connection_kwargs
+        return redis.StrictRedis(host=kwargs.get('host', 'localhost'), port=kwargs.get('port', 6379),
+                                 db=kwargs.get('db', 0), socket_connect_timeout=kwargs.get('socket_connect_timeout'),
+                                 socket_keepalive=True, health_check_interval=30)
+
+    def _check_server_config(self, subscriber):
+        try:
+            flags = subscriber.config_get('notify-keyspace-events').get('notify-keyspace-events', '')
+        except redis.RedisError:
+            # CONFIG is not allowed on Memorystore; trust the instance config
+            return
+        if 'K' not in flags or not ('A' in flags or {'g', '$'} <= set(flags)):
+            logging.warning(f"notify-keyspace-events is {flags!r}, so writes are not seen by the near cache; "
+                            f"values may be up to {self.ttl}s stale")
+
+    def _listen(self):
+        while not self.stopped.is_set():
+            pubsub = None
+            try:
+                subscriber = self._subscriber()
+                self._check_server_config(subscriber)
+                db = self.client.connection_pool.connection_kwargs.get('db', 0)
+                prefix = f'__keyspace@{db}__:'
+                pubsub = subscriber.pubsub()
+                pubsub.psubscribe(prefix + '*')
+                while not self.stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message['type'] == 'psubscribe':
+                        # from here on no write is missed, so values may be
+                        # cached, but not those of reads already under way.
+                        # redis-py renews a dropped subscription by itself,
+                        # which also comes here.
+                        self.clear()
+                        with self.lock:
+                            self.subscriptions += 1
+                        self.subscribed.set()
+                    elif message['type'] == 'pmessage':
+                        self.invalidate(message['channel'][len(prefix):])
+            except redis.RedisError as e:
+                logging.warning(f"near cache lost its invalidation subscription: {e}")
+            finally:
+                self.subscribed.clear()
+                self.clear()
+                if pubsub is not None:
+                    pubsub.close()
+            self.stopped.wait(RETRY_SECONDS)
+
+    def invalidate(self, key):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        with self.lock:
+            self.invalidations += 1
+            self.entries.pop(key, None)
+            if key in self.loading:
+                self.loading[key][1] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            for loading in self.loading.values():
+                loading[1] += 1
+
+    def _lookup(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires <= now:
+            del self.entries[key]
+            return False, None
+        self.entries.move_to_end(key)
+        return True, value
+
+    # Values of keys, from the cache where fresh, the rest read with
+    # load(missing_keys) -> values. Keys are bytes, as in notifications.
+    def get_many(self, keys, load):
+        keys = [key.encode('utf-8') if isinstance(key, str) else key for key in keys]
+        found = {}
+        with self.lock:
+            now = self.clock()
+            for key in keys:
+                hit, value = self._lookup(key, now)
+                if hit:
+                    found[key] = value
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            versions = []
+            for key in missing:
+                loading = self.loading.setdefault(key, [0, 0])
+                loading[0] += 1
+                versions.append(loading[1])
+
+        if missing:
+            values = []
+            try:
+                values = load(missing)
+            finally:
+                self._fill(missing, versions, values)
+            found.update(zip(missing, values))
+        return [found[key] for key in keys]
+
+    def get(self, key, load):
+        return self.get_many([key], lambda keys: [load(keys[0])])[0]
+
+    def _fill(self, keys, versions, values):
+        with self.lock:
+            expires = self.clock() + self.ttl
+            cacheable = self.subscribed.is_set()
+            for key, version, value in zip(keys, versions, values):
+                if cacheable and self.loading[key][1] == version:
+                    self.entries[key] = (expires, value)
+                    self.entries.move_to_end(key)
+                else:
+                    self.skipped_fills += 1
+            for key in keys:
+                self.loading[key][0] -= 1
+                if not self.loading[key][0]:
+                    del self.loading[key]
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def metrics(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': True,
+                'subscribed': self.subscribed.is_set(),
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'skipped_fills': self.skipped_fills,
+                'subscriptions': self.subscriptions,
+            }
@@ -0,0 +1,68 @@
+"""Redis access shared by the redis-http and redis-pubsub functions.
+
+Each function is deployed from its own directory, so each has a copy of this
+file; keep the copies the same.
+
+One client per function instance, over a bounded connection pool. A request
+waits up to REDIS_POOL_TIMEOUT seconds for a free connection rather than
+opening more than REDIS_MAX_CONNECTIONS, connecting and socket operations time
+out instead of hanging the function until its own deadline, and a connection
+idle for longer than REDIS_HEALTH_CHECK_INTERVAL seconds is checked with a PING
+before it is used, since Memorystore and the VPC connector drop idle
+connections.
+"""
+
+import os
+
+import redis
+
+REDIS_HOST = os.environ.get('REDISHOST', 'localhost')
+REDIS_PORT = int(os.environ.get('REDISPORT', 6379))
+MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 10))
+POOL_TIMEOUT = float(os.environ.get('REDIS_POOL_TIMEOUT', 2.0))
+CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', 1.0))
+SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 2.0))
+HEALTH_CHECK_INTERVAL = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30))
+# keys per MGET, so a large batch does not hold Redis up in one command
+MGET_CHUNK = 100
+
+
+def make_pool(host=REDIS_HOST, port=REDIS_PORT, max_connections=MAX_CONNECTIONS):
+    return redis.BlockingConnectionPool(
+        host=host,
+        port=port,
+        max_connections=max_connections,
+        timeout=POOL_TIMEOUT,
+        socket_connect_timeout=CONNECT_TIMEOUT,
+        socket_timeout=SOCKET_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=HEALTH_CHECK_INTERVAL,
+        retry_on_timeout=True,
+    )
+
+
+def make_client(pool=None):
+    return redis.StrictRedis(connection_pool=pool or make_pool())
+
+
+# Set a key and read back what Redis now holds, in one round trip.
+# (SET ... GET would return the old value, and needs Redis 6.2.)
+def set_and_get(client, key, value):
+    pipe = client.pipeline(transaction=False)
+    pipe.set(key, value)
+    pipe.get(key)
+    _, stored = pipe.execute()
+    return stored
+
+
+# Values of many keys (None where missing), as MGETs of MGET_CHUNK keys
+# sent in one pipeline, so one round trip.
+def get_many(client, keys, chunk=MGET_CHUNK):
+    pipe = client.pipeline(transaction=False)
+    for start in range(0, len(keys), chunk):
+        pipe.mget(keys[start:start + chunk])
+    return [value for values in pipe.execute() for value in values]
+
+
+# one client per function instance, shared by its requests
+client = make_client()
@@ -0,0 +1,244 @@
+"""Pull-subscriber alternative to the addToRedis function, for high volumes.
+
+addToRedis is invoked once per Pub/Sub message and writes, reads back and
+prints each one. This worker instead pulls messages in batches of up to
+--batch-size, writes a batch to Redis in one pipeline (one round trip, or one
+MULTI/EXEC with --transaction), then acknowledges the whole batch in one
+request. Messages are stored as addToRedis stores them: the JSON text under
+its "id". Invalid messages, including ones whose "id" is not a string or a
+number, are logged and acknowledged, as the function drops them; if the write
+fails, the batch is handed back to Pub/Sub for redelivery.
+
+Several pull loops (--workers) run at once, so one batch is pulled while
+another is written. Every --report-seconds the worker logs its throughput and
+lag, the time from publishing a message to writing it:
+
+    ingest: 2000 msg/s, 851 batches, lag p50 0.01s max 0.02s, 0 invalid, 0 failed batches
+
+Run it next to Redis (e.g. on Cloud Run or a VM) with a pull subscription on
+the topic the function is triggered from; set PUBSUB_EMULATOR_HOST to use the
+Pub/Sub emulator:
+
+    python ingest_worker.py projects/PROJECT/subscriptions/SUBSCRIPTION
+"""
+
+import argparse
+import json
+import logging
+import signal
+import threading
+import time
+
+import redis
+
+from redis_access import client as redis_client
+
+BATCH_SIZE = 500
+WORKERS = 2
+PULL_TIMEOUT_SECONDS = 10.0
+REPORT_SECONDS = 10.0
+# wait after a failed write before pulling again
+RETRY_SECONDS = 1.0
+
+
+# A Pub/Sub pull subscription: pull() returns (ack_id, data, publish_time) tuples.
+class PubSubSubscription:
+
+    def __init__(self, name):
+        from google.cloud import pubsub_v1
+        self.name = name
+        self.subscriber = pubsub_v1.SubscriberClient()
+
+    def pull(self, max_messages, timeout=PULL_TIMEOUT_SECONDS):
+        from google.api_core import exceptions
+        try:
+            response = self.subscriber.pull(subscription=self.name, max_messages=max_messages, timeout=timeout)
+        except exceptions.DeadlineExceeded:
+            return []
+        return [(received.ack_id, received.message.data, received.message.publish_time.timestamp())
+                for received in response.received_messages]
+
+    def acknowledge(self, ack_ids):
+        self.subscriber.acknowledge(subscription=self.name, ack_ids=ack_ids)
+
+    # hand messages back for redelivery
+    def nack(self, ack_ids):
+        self.subscriber.modify_ack_deadline(subscription=self.name, ack_ids=ack_ids, ack_deadline_seconds=0)
+
+
+# (id, JSON text) of a message, or None if it has no "id" that Redis can use as
+# a key. A null, list or object id would fail the whole batch's pipeline.
+def parse_message(data):
+    try:
+        json_data_str = data.decode()
+        json_payload = json.loads(json_data_str)
+    except ValueError:
+        return None
+    if not isinstance(json_payload, dict):
+        return None
+    id = json_payload.get('id')
+    if isinstance(id, (str, int, float, bytes)) and not isinstance(id, bool):
+        return id, json_data_str
+    return None
+
+
+class IngestWorker:
+
+    def __init__(self, subscription, client=redis_client, batch_size=BATCH_SIZE, workers=WORKERS,
+                 transaction=False, clock=time.time):
+        self.subscription = subscription
+        self.client = client
+        self.batch_size = batch_size
+        self.workers = workers
+        self.transaction = transaction
+        self.clock = clock
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.started = None
+        self.written = 0
+        self.invalid = 0
+        self.batches = 0
+        self.failed_batches = 0
+        # lags of the messages written since the last report
+        self.lags = []
+
+    # pull, write and acknowledge one batch; returns the number of messages pulled.
+    def process_batch(self):
+        messages = self.subscription.pull(self.batch_size)
+        if not messages:
+            return 0
+
+        records = []
+        invalid = 0
+        for ack_id, data, publish_time in messages:
+            record = parse_message(data)
+            if record is None:
+                invalid += 1
+                print("Message is invalid, or missing an 'id' attribute")
+            else:
+                records.append((record, publish_time))
+
+        ack_ids = [ack_id for ack_id, _, _ in messages]
+        try:
+            try:
+                self._write(records)
+            except redis.DataError:
+                # a record Redis cannot encode would fail every redelivery of
+                # the batch too, so drop it and write the rest
+                valid = self._encodable(records)
+                invalid += len(records) - len(valid)
+                records = valid
+                self._write(records)
+        except redis.RedisError as e:
+            logging.warning(f"could not write a batch of {len(messages)} messages, it will be redelivered: {e}")
+            self.subscription.nack(ack_ids)
+            with self.lock:
+                self.failed_batches += 1
+            self.stopped.wait(RETRY_SECONDS)
+            return len(messages)
+
+        self.subscription.acknowledge(ack_ids)
+        written_at = self.clock()
+        with self.lock:
+            self.written += len(records)
+            self.invalid += invalid
+            self.batches += 1
+            self.lags.extend(written_at - publish_time for _, publish_time in records)
+        return len(messages)
+
+    def _write(self, records):
+        pipe = self.client.pipeline(transaction=self.transaction)
+        for (id, json_data_str), _ in records:
+            pipe.set(id, json_data_str)
+        pipe.execute()
+
+    # the records whose key and value Redis can encode.
+    def _encodable(self, records):
+        encoder = self.client.connection_pool.get_encoder()
+        valid = []
+        for record, publish_time in records:
+            try:
+                for value in record:
+                    encoder.encode(value)
+            except redis.DataError:
+                print(f"Message has an 'id' Redis cannot store: {record[0]!r}")
+            else:
+                valid.append((record, publish_time))
+        return valid
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            try:
+                self.process_batch()
+            except Exception as e:
+                # unacknowledged messages are redelivered after their ack deadline
+                logging.warning(f"ingest batch failed: {e}")
+                self.stopped.wait(RETRY_SECONDS)
+
+    # counters since start, and the lag of messages written since the last call.
+    def metrics(self):
+        with self.lock:
+            lags, self.lags = sorted(self.lags), []
+            elapsed = self.clock() - self.started if self.started else 0.0
+            return {
+                'written': self.written,
+                'invalid': self.invalid,
+                'batches': self.batches,
+                'failed_batches': self.failed_batches,
+                'messages_per_second': self.written / elapsed if elapsed else 0.0,
+                'lag_p50': lags[len(lags) // 2] if lags else None,
+                'lag_max': lags[-1] if lags else None,
+            }
+
+    def start(self):
+        self.started = self.clock()
+        self.threads = [threading.Thread(target=self._loop, name=f'ingest-{number}', daemon=True)
+                        for number in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    # stop pulling; batches under way are finished and acknowledged.
+    def stop(self):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+
+
+def run(worker, report_seconds=REPORT_SECONDS):
+    worker.start()
+    last_written, last_time = 0, time.monotonic()
+    while not worker.stopped.wait(report_seconds):
+        metrics = worker.metrics()
+        now = time.monotonic()
+        rate = (metrics['written'] - last_written) / (now - last_time)
+        last_written, last_time = metrics['written'], now
+        lag = (f"lag p50 {metrics['lag_p50']:.2f}s max {metrics['lag_max']:.2f}s"
+               if metrics['lag_p50'] is not None else 'no messages')
+        logging.info(f"ingest: {rate:.0f} msg/s, {metrics['batches']} batches, {lag}, "
+                     f"{metrics['invalid']} invalid, {metrics['failed_batches']} failed batches")
+    worker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('subscription', help='projects/PROJECT/subscriptions/SUBSCRIPTION')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='messages per pull and pipeline')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='concurrent pull loops')
+    parser.add_argument('--transaction', action='store_true', help='write each batch in MULTI/EXEC')
+    parser.add_argument('--report-seconds', type=float, default=REPORT_SECONDS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    worker = IngestWorker(PubSubSubscription(args.subscription), batch_size=args.batch_size,
+                          workers=args.workers, transaction=args.transaction)
+    # Cloud Run and systemd stop the worker with SIGTERM
+    signal.signal(signal.SIGTERM, lambda *_: worker.stopped.set())
+    try:
+        run(worker, args.report_seconds)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,7 @@
-import os
 import base64
 import json
-import redis
 import functions_framework
-
-redis_host = os.environ.get('REDISHOST', 'localhost')
-redis_port = int(os.environ.get('REDISPORT', 6379))
-redis_client = redis.StrictRedis(host=redis_host, port=redis_port)
+from redis_access import client as redis_client, set_and_get
 
 # Triggered from a message on a Pub/Sub topic.
 @functions_framework.cloud_event
@@ -18,8 +13,8 @@ def addToRedis(cloud_event):
     response_data = ""
     if json_payload and 'id' in json_payload:
         id = json_payload['id']
-        data = redis_client.set(id, json_data_str)
-        response_data = redis_client.get(id)
+        # write and read back in one round trip
+        response_data = set_and_get(redis_client, id, json_data_str)
         print(f"Added data to Redis: {response_data}")
     else:
         print("Message is invalid, or missing an 'id' attribute")
\ No newline at end of file
@@ -0,0 +1,351 @@
+"""
+In-process fakes for the Google Cloud services used by the bookshelf app.
+
+install() registers fake versions of the bookshelf's booksdb, profiledb,
+storage, translate, secrets and oauth modules (plus Cloud Logging and Error
+Reporting) in sys.modules, so that importing bookshelf/main.py talks to
+in-memory data instead of GCP.
+"""
+
+import datetime
+import json
+import secrets as stdlib_secrets
+import sys
+import threading
+import time
+import types
+from concurrent import futures
+from uuid import uuid4
+
+
+class Latency:
+    """
+    Simulated service latency, in seconds, applied to every fake call.
+    """
+
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+
+    def wait(self):
+        if self.seconds:
+            time.sleep(self.seconds)
+
+
+latency = Latency()
+
+
+class _Language:
+
+    def __init__(self, language_code, display_name):
+        self.language_code = language_code
+        self.display_name = display_name
+
+
+class _Translation:
+
+    def __init__(self, translated_text, detected_language_code):
+        self.translated_text = translated_text
+        self.detected_language_code = detected_language_code
+
+
+LANGUAGES = [
+    _Language('en', 'English'),
+    _Language('es', 'Spanish'),
+    _Language('fr', 'French'),
+    _Language('de', 'German'),
+    _Language('ja', 'Japanese'),
+]
+
+
+def _make_booksdb():
+    module = types.ModuleType('booksdb')
+    books = {}
+    lock = threading.Lock()
+
+    class ConflictError(Exception):
+
+        def __init__(self, current):
+            super().__init__('book was modified by another user')
+            self.current = current
+
+    class NotFoundError(Exception):
+
+        def __init__(self, book_id):
+            super().__init__(f'book {book_id} not found')
+            self.book_id = book_id
+
+    def _copy(book_id):
+        book = books.get(book_id)
+        if book is None:
+            return None
+        return dict(book, id=book_id)
+
+    def _version():
+        return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    def read(book_id):
+        latency.wait()
+        with lock:
+            return _copy(book_id)
+
+    def create(data):
+        latency.wait()
+        book_id = uuid4().hex
+        with lock:
+            books[book_id] = dict(data, version=_version())
+            return _copy(book_id)
+
+    def _check(book_id, version):
+        current = _copy(book_id)
+        if current is None:
+            raise NotFoundError(book_id)
+        if version is not None and version != current['version']:
+            raise ConflictError(current)
+        return current
+
+    def check_version(book_id, version=None):
+        latency.wait()
+        with lock:
+            return _check(book_id, version)
+
+    def update(data, book_id, version=None):
+        latency.wait()
+        with lock:
+            _check(book_id, version)
+            books[book_id].update(data)
+            books[book_id]['version'] = _version()
+            return _copy(book_id)
+
+    def delete(book_id):
+        latency.wait()
+        with lock:
+            books.pop(book_id, None)
+
+    def list():
+        latency.wait()
+        with lock:
+            result = [_copy(book_id) for book_id in books]
+        return sorted(result, key=lambda book: book.get('title', ''))
+
+    module.ConflictError = ConflictError
+    module.NotFoundError = NotFoundError
+    module.check_version = check_version
+    module.get_client = lambda: None
+    module.read = read
+    module.create = create
+    module.update = update
+    module.delete = delete
+    module.list = list
+    module.books = books
+    return module
+
+
+def _make_profiledb():
+    module = types.ModuleType('profiledb')
+    profiles = {}
+    default_profile = {"preferredLanguage": "en"}
+
+    def read(email):
+        latency.wait()
+        return dict(profiles.get(email, default_profile))
+
+    def read_entry(email, key, default_value=''):
+        return read(email).get(key, default_value)
+
+    def update(data, email):
+        latency.wait()
+        profiles[email] = dict(data)
+        return dict(data, id=email)
+
+    module.default_profile = default_profile
+    module.get_client = lambda: None
+    module.read = read
+    module.read_entry = read_entry
+    module.update = update
+    return module
+
+
+def _make_storage():
+    module = types.ModuleType('storage')
+
+    def upload_file(file_stream, filename, content_type):
+        latency.wait()
+        return f"https://storage.googleapis.com/fake-covers/{uuid4().hex}-{filename}"
+
+    def upload_image(img):
+        if not img:
+            return None
+        return upload_file(img.read(), img.filename, img.content_type)
+
+    def delete_file(public_url):
+        latency.wait()
+
+    module.get_client = lambda: None
+    module.upload_file = upload_file
+    module.delete_file = delete_file
+    module.upload_image = upload_image
+    return module
+
+
+def _make_translate():
+    module = types.ModuleType('translate')
+
+    def get_languages():
+        return LANGUAGES
+
+    def detect_language(text):
+        latency.wait()
+        return LANGUAGES[0]
+
+    translations = {}
+
+    def cached_translation(text, target_language_code):
+        return translations.get((target_language_code, text))
+
+    def translate_text(text, target_language_code):
+        translation = cached_translation(text, target_language_code)
+        if translation is None:
+            latency.wait()
+            translation = _Translation(f"[{target_language_code}] {text}", 'en')
+            translations[(target_language_code, text)] = translation
+        return translation
+
+    def translate_text_async(text, target_language_code):
+        future = futures.Future()
+        future.set_result(translate_text(text, target_language_code))
+        return future
+
+    module.translation_executor = futures.ThreadPoolExecutor(max_workers=4)
+    module.get_languages = get_languages
+    module.detect_language = detect_language
+    module.cached_translation = cached_translation
+    module.translate_text = translate_text
+    module.translate_text_async = translate_text_async
+    return module
+
+
+def _make_secrets():
+    module = types.ModuleType('secrets')
+
+    # the bookshelf's secrets module shadows the standard library one,
+    # so keep the standard functions available to other libraries
+    for name in stdlib_secrets.__all__:
+        setattr(module, name, getattr(stdlib_secrets, name))
+
+    values = {
+        'flask-secret-key': 'benchmark-secret-key',
+        'bookshelf-client-secrets': json.dumps({'web': {
+            'client_id': 'fake-client-id',
+            'client_secret': 'fake-client-secret',
+            'auth_uri': 'https://accounts.google.com/o/oauth2/auth',
+            'token_uri': 'https://oauth2.googleapis.com/token',
+        }}),
+    }
+
+    def get_secret(secret_id, version_id='latest'):
+        return values[secret_id]
+
+    module.get_secret = get_secret
+    return module
+
+
+def _make_oauth():
+    module = types.ModuleType('oauth')
+
+    def authorize(callback_uri, client_config, scopes):
+        state = str(uuid4())
+        return f"https://accounts.google.com/o/oauth2/auth?state={state}", state
+
+    def handle_callback(callback_uri, client_config, scopes, request_url,
+            stored_state, received_state):
+        latency.wait()
+        return fake_credentials(), fake_user()
+
+    module.authorize = authorize
+    module.handle_callback = handle_callback
+    return module
+
+
+def _make_cloud_logging():
+    module = types.ModuleType('google.cloud.logging')
+
+    class Client:
+
+        def setup_logging(self, *args, **kwargs):
+            pass
+
+    module.Client = Client
+    return module
+
+
+def _make_error_reporting():
+    module = types.ModuleType('google.cloud.error_reporting')
+
+    class Client:
+
+        def report(self, *args, **kwargs):
+            pass
+
+    module.Client = Client
+    module.build_flask_context = lambda request: None
+    return module
+
+
+def fake_credentials():
+    """
+    Session credentials for a logged-in benchmark user.
+    """
+    return {
+        'token': 'fake-token',
+        'refresh_token': None,
+        'token_uri': 'https://oauth2.googleapis.com/token',
+        'client_id': 'fake-client-id',
+        'client_secret': 'fake-client-secret',
+        'scopes': [],
+        'id_token': None,
+    }
+
+
+def fake_user():
+    """
+    Session user info for a logged-in benchmark user.
+    """
+    return {'email': 'reader@example.com', 'name': 'Benchmark Reader'}
+
+
+def _register_google_cloud(name, module):
+    """
+    Register a fake google.cloud submodule, creating the namespace
+    packages if the client libraries are not installed.
+    """
+    try:
+        import google.cloud as google_cloud
+    except ImportError:
+        google = sys.modules.setdefault('google', types.ModuleType('google'))
+        google.__path__ = []
+        google_cloud = types.ModuleType('google.cloud')
+        google_cloud.__path__ = []
+        google.cloud = google_cloud
+        sys.modules['google.cloud'] = google_cloud
+
+    sys.modules[f'google.cloud.{name}'] = module
+    setattr(google_cloud, name, module)
+
+
+def install():
+    """
+    Replace the bookshelf service modules with in-memory fakes.
+    Must be called before bookshelf/main.py is imported.
+    """
+    for name, factory in [
+        ('booksdb', _make_booksdb),
+        ('profiledb', _make_profiledb),
+        ('storage', _make_storage),
+        ('translate', _make_translate),
+        ('secrets', _make_secrets),
+        ('oauth', _make_oauth),
+    ]:
+        sys.modules[name] = factory()
+
+    _register_google_cloud('logging', _make_cloud_logging())
+    _register_google_cloud('error_reporting', _make_error_reporting())
@@ -0,0 +1,325 @@
+"""
+Load-test harness for the bookshelf app.
+
+Runs bookshelf/main.py in-process against the fakes in fakes.py, drives a
+weighted mix of browse, view, add (with image), edit and profile traffic
+from concurrent workers, and reports throughput, latency percentiles and
+allocations per route. Results are saved as JSON so runs can be compared.
+
+    python run_benchmark.py --requests 2000 --concurrency 8 --latency-ms 5
+    python run_benchmark.py --compare results/bench-20261019-120000.json
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+import fakes
+
+BOOKSHELF_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bookshelf')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+DEFAULT_MIX = 'browse=40,view=35,add=5,edit=10,profile=10'
+
+# smallest valid GIF, used as the uploaded cover image
+COVER_IMAGE = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff'
+    b'!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+
+def load_app():
+    """
+    Import the bookshelf app with all GCP services replaced by fakes.
+    """
+    fakes.install()
+    sys.path.insert(0, os.path.abspath(BOOKSHELF_DIR))
+    import main
+    return main.app
+
+
+def seed_books(count, rng):
+    """
+    Populate the fake database with books.
+    """
+    booksdb = sys.modules['booksdb']
+    for i in range(count):
+        booksdb.create({
+            'title': f"Book {i:05d}",
+            'author': f"Author {rng.randint(1, 200)}",
+            'publishedDate': str(rng.randint(1900, 2026)),
+            'description': ' '.join(rng.choice(['a', 'quick', 'brown', 'fox', 'jumps', 'over', 'the', 'lazy', 'dog'])
+                for _ in range(rng.randint(20, 80))),
+            'imageUrl': '',
+        })
+
+
+def logged_in_client(app):
+    """
+    Return a test client with a logged-in session.
+    """
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['credentials'] = fakes.fake_credentials()
+        session['user'] = fakes.fake_user()
+        session['preferred_language'] = 'es'
+    return client
+
+
+def random_book_id(rng):
+    return rng.choice(list(sys.modules['booksdb'].books))
+
+
+def browse(client, rng):
+    return [client.get('/')]
+
+
+def view(client, rng):
+    book_id = random_book_id(rng)
+    page = client.get(f"/books/{book_id}")
+
+    # the page fetches the translation itself when it was not cached
+    if b'Translating...' in page.data:
+        return [page, client.get(f"/books/{book_id}/translation")]
+    return [page]
+
+
+def add(client, rng):
+    return [client.post('/books/add', content_type='multipart/form-data', data={
+        'title': f"New book {rng.randint(0, 10 ** 6)}",
+        'author': 'Load Tester',
+        'publishedDate': '2026',
+        'description': 'Added by the benchmark.',
+        'imageUrl': '',
+        'image': (io.BytesIO(COVER_IMAGE), 'cover.gif', 'image/gif'),
+    })]
+
+
+def edit(client, rng):
+    book_id = random_book_id(rng)
+    form = client.get(f"/books/{book_id}/edit")
+    book = sys.modules['booksdb'].read(book_id)
+    saved = client.post(f"/books/{book_id}/edit", content_type='multipart/form-data', data={
+        'title': book['title'],
+        'author': book['author'],
+        'publishedDate': book['publishedDate'],
+        'description': f"{book['description'][:200]} (edited {rng.randint(0, 10 ** 6)})",
+        'imageUrl': book.get('imageUrl', ''),
+        'version': book['version'],
+    })
+    return [form, saved]
+
+
+def profile(client, rng):
+    return [client.get('/profile')]
+
+
+SCENARIOS = {
+    'browse': browse,
+    'view': view,
+    'add': add,
+    'edit': edit,
+    'profile': profile,
+}
+
+
+def parse_mix(text):
+    """
+    Parse a traffic mix such as "browse=40,view=60" into weights.
+    """
+    mix = {}
+    for item in text.split(','):
+        name, weight = item.split('=')
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name}, expected one of {sorted(SCENARIOS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_load(app, mix, total, concurrency, seed):
+    """
+    Run the traffic mix from concurrent workers and collect per-request samples.
+    """
+    names = [name for name in mix]
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        client = logged_in_client(app)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            responses = SCENARIOS[name](client, rng)
+            elapsed = time.perf_counter() - start
+            failed = any(r.status_code >= 400 for r in responses)
+            with lock:
+                samples[name].append(elapsed)
+                if failed:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    return samples, errors, wall_time
+
+
+def measure_allocations(app, names, iterations, seed):
+    """
+    Measure memory allocated per request for each route, sequentially so
+    tracemalloc only sees one request at a time.
+    """
+    rng = random.Random(seed)
+    client = logged_in_client(app)
+    allocations = {}
+
+    tracemalloc.start()
+    for name in names:
+        peaks = []
+        for _ in range(iterations):
+            baseline, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            SCENARIOS[name](client, rng)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - baseline)
+        allocations[name] = sum(peaks) / len(peaks)
+    tracemalloc.stop()
+
+    return allocations
+
+
+def summarize(samples, errors, wall_time, allocations):
+    routes = {}
+    total = 0
+    for name, latencies in samples.items():
+        total += len(latencies)
+        routes[name] = {
+            'requests': len(latencies),
+            'errors': errors[name],
+            'throughput_rps': len(latencies) / wall_time if wall_time else 0.0,
+            'mean_ms': 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            'p50_ms': 1000 * percentile(latencies, 50),
+            'p90_ms': 1000 * percentile(latencies, 90),
+            'p99_ms': 1000 * percentile(latencies, 99),
+            'alloc_peak_kib': allocations.get(name, 0.0) / 1024,
+        }
+    return {
+        'total_requests': total,
+        'wall_time_s': wall_time,
+        'throughput_rps': total / wall_time if wall_time else 0.0,
+        'routes': routes,
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"{report['total_requests']} requests in {report['wall_time_s']:.2f}s "
+        f"({report['throughput_rps']:.1f} req/s, concurrency {report['config']['concurrency']})")
+    print(f"{'route':<10}{'reqs':>7}{'errs':>6}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'alloc KiB':>11}")
+    for name, route in report['routes'].items():
+        print(f"{name:<10}{route['requests']:>7}{route['errors']:>6}{route['throughput_rps']:>9.1f}"
+            f"{route['p50_ms']:>9.2f}{route['p90_ms']:>9.2f}{route['p99_ms']:>9.2f}{route['alloc_peak_kib']:>11.1f}")
+
+    if baseline is None:
+        return
+
+    print()
+    print('change against baseline (negative latency / positive throughput is better)')
+    for name, route in report['routes'].items():
+        before = baseline['routes'].get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ['throughput_rps', 'p50_ms', 'p99_ms', 'alloc_peak_kib']:
+            if before[key]:
+                changes.append(f"{key} {100 * (route[key] - before[key]) / before[key]:+.1f}%")
+        print(f"{name:<10}" + '  '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=1000, help='total scenarios to run')
+    parser.add_argument('--concurrency', type=int, default=4, help='number of concurrent workers')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='weighted traffic mix')
+    parser.add_argument('--books', type=int, default=200, help='number of books to seed')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated latency per service call')
+    parser.add_argument('--alloc-iterations', type=int, default=20, help='requests per route for allocation measurement')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='file to save results to (default: results/bench-<timestamp>.json)')
+    parser.add_argument('--compare', help='previous results file to compare against')
+    parser.add_argument('--verbose', action='store_true', help='keep the app request logging enabled')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+
+    app = load_app()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        app.logger.setLevel(logging.WARNING)
+
+    seed_books(args.books, rng)
+    fakes.latency.seconds = args.latency_ms / 1000
+
+    # warm up templates and routes before measuring
+    run_load(app, mix, min(50, args.requests), 1, args.seed)
+
+    samples, errors, wall_time = run_load(app, mix, args.requests, args.concurrency, args.seed)
+    allocations = measure_allocations(app, list(mix), args.alloc_iterations, args.seed)
+
+    report = summarize(samples, errors, wall_time, allocations)
+    report['config'] = {
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'mix': mix,
+        'books': args.books,
+        'latency_ms': args.latency_ms,
+        'python': sys.version.split()[0],
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
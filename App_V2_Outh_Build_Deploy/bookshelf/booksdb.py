@@ -1,4 +1,45 @@
-from google.cloud import firestore
+import resilience
+import startup
+
+firestore_client = None
+
+
+def get_client():
+    """
+    Return the Firestore client, creating it on first use.
+    """
+
+    # use the global variable
+    global firestore_client
+
+    if firestore_client is None:
+        firestore = startup.lazy_import('google.cloud.firestore')
+        firestore_client = firestore.Client()
+
+    return firestore_client
+
+
+class ConflictError(Exception):
+    """
+    Raised when a book was changed by someone else after it was read.
+    The latest details of the book are available as `current`.
+    """
+
+    def __init__(self, current):
+        super().__init__('book was modified by another user')
+        self.current = current
+
+
+class NotFoundError(Exception):
+    """
+    Raised when a book to be updated does not exist, e.g. it was deleted
+    while it was being edited.
+    """
+
+    def __init__(self, book_id):
+        super().__init__(f'book {book_id} not found')
+        self.book_id = book_id
+
 
 def document_to_dict(doc):
     """
@@ -8,19 +49,29 @@ def document_to_dict(doc):
         return None
     doc_dict = doc.to_dict()
     doc_dict['id'] = doc.id
+
+    # the update time acts as an ETag for conditional updates
+    doc_dict['version'] = doc.update_time.rfc3339()
     return doc_dict
 
 
+def _get(book_ref):
+    """
+    Read a document, hedging the read if Firestore is slow to respond.
+    """
+    return resilience.call('firestore', book_ref.get, hedge=True, retry=None)
+
+
 def read(book_id):
     """
     Return the details for a single book.
     """
 
-    db = firestore.Client()
+    db = get_client()
 
     # retrieve a book from the database by ID
     book_ref = db.collection("books").document(book_id)
-    return document_to_dict(book_ref.get())
+    return document_to_dict(_get(book_ref))
 
 
 def create(data):
@@ -28,25 +79,75 @@ def create(data):
     Create a new book and return the book details.
     """
 
-    db = firestore.Client()
+    db = get_client()
 
     # store book in database
     book_ref = db.collection("books").document()
-    book_ref.set(data)
-    return document_to_dict(book_ref.get())
+    resilience.call('firestore', book_ref.set, data, retry=None)
+    return document_to_dict(_get(book_ref))
+
 
+def check_version(book_id, version=None):
+    """
+    Return the stored details of a book, checking that it can be updated.
+
+    Raises NotFoundError if the book does not exist, and ConflictError if a
+    version is supplied and the book has been modified since that version
+    was read.
+    """
+
+    book_ref = get_client().collection("books").document(book_id)
+    current = document_to_dict(_get(book_ref))
+    if current is None:
+        raise NotFoundError(book_id)
 
-def update(data, book_id):
+    # reject the update if the book changed after the editor read it
+    if version is not None and version != current['version']:
+        raise ConflictError(current)
+
+    return current
+
+
+def update(data, book_id, version=None):
     """
     Update an existing book, and return the updated book's details.
+
+    Only the fields that differ from the stored book are written. If a
+    version is supplied, the update only succeeds if the book has not been
+    modified since that version was read; otherwise ConflictError is raised.
+    NotFoundError is raised if the book does not exist.
     """
 
-    db = firestore.Client()
+    db = get_client()
 
-    # update book in database
     book_ref = db.collection("books").document(book_id)
-    book_ref.set(data)
-    return document_to_dict(book_ref.get())
+    current = check_version(book_id, version)
+
+    # only send the fields that changed
+    changes = {}
+    for key, value in data.items():
+        if current.get(key) != value:
+            changes[key] = value
+    if not changes:
+        return current
+
+    # the precondition catches writes that happen between the read and the update
+    exceptions = startup.lazy_import('google.api_core.exceptions')
+    datetime_helpers = startup.lazy_import('google.api_core.datetime_helpers')
+    last_update_time = datetime_helpers.DatetimeWithNanoseconds.from_rfc3339(current['version'])
+    try:
+        resilience.call('firestore', book_ref.update, changes,
+            option=db.write_option(last_update_time=last_update_time),
+            retry=None, idempotent=False)
+    except exceptions.FailedPrecondition:
+        current = document_to_dict(_get(book_ref))
+        if current is None:
+            raise NotFoundError(book_id)
+        raise ConflictError(current)
+    except exceptions.NotFound:
+        raise NotFoundError(book_id)
+
+    return document_to_dict(_get(book_ref))
 
 
 def delete(book_id):
@@ -54,11 +155,11 @@ def delete(book_id):
     Delete a book in the database.
     """
 
-    db = firestore.Client()
+    db = get_client()
 
     # remove book from database
     book_ref = db.collection("books").document(book_id)
-    book_ref.delete()
+    resilience.call('firestore', book_ref.delete, retry=None)
 
     # no return required
 
@@ -71,10 +172,11 @@ def list():
     # empty list of books
     books = []
 
-    db = firestore.Client()
+    db = get_client()
 
     # get an ordered list of documents in the collection
-    docs = db.collection("books").order_by("title").stream()
+    query = db.collection("books").order_by("title")
+    docs = resilience.call('firestore', query.get, hedge=True, retry=None)
 
     # retrieve each item in database and add to the list
     for doc in docs:
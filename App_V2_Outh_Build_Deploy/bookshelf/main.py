@@ -1,12 +1,14 @@
-from flask import current_app, Flask, redirect, render_template
+from flask import current_app, Flask, jsonify, redirect, render_template
 from flask import request, url_for, session
+from flask.sessions import SecureCookieSessionInterface
 import logging
-from google.cloud import logging as cloud_logging
-from google.cloud import error_reporting
 import json
 import os
+import threading
 from urllib.parse import urlparse
 
+import startup
+import resilience
 import booksdb
 import storage
 import secrets
@@ -35,10 +37,8 @@ def upload_image_file(img):
 
 app = Flask(__name__)
 app.config.update(
-    SECRET_KEY=secrets.get_secret('flask-secret-key'),
     MAX_CONTENT_LENGTH=8 * 1024 * 1024,
     ALLOWED_EXTENSIONS=set(['png', 'jpg', 'jpeg', 'gif']),
-    CLIENT_SECRETS=json.loads(secrets.get_secret('bookshelf-client-secrets')),
     SCOPES=[
         'openid',
         'https://www.googleapis.com/auth/contacts.readonly',
@@ -46,18 +46,72 @@ app.config.update(
         'https://www.googleapis.com/auth/userinfo.profile',
     ],
     EXTERNAL_HOST_URL=os.getenv('EXTERNAL_HOST_URL'),
+    # /metrics is only served when this is set
+    METRICS_ENABLED=os.getenv('METRICS_ENABLED') == '1',
 )
 
 app.debug = True
 app.testing = False
 
-# configure logging
-if not app.testing:
-    logging.basicConfig(level=logging.INFO)
+initialized = False
+initialize_lock = threading.Lock()
+
+
+def initialize():
+    """
+    Fetch the secrets and set up logging.
+    Runs once, on the first request or warm-up rather than at import.
+    """
+
+    # use the global variable
+    global initialized
+
+    if initialized:
+        return
+
+    with initialize_lock:
+        if initialized:
+            return
+
+        app.config.update(
+            SECRET_KEY=secrets.get_secret('flask-secret-key'),
+            CLIENT_SECRETS=json.loads(secrets.get_secret('bookshelf-client-secrets')),
+        )
+
+        # configure logging
+        if not app.testing:
+            logging.basicConfig(level=logging.INFO)
+
+            # attach a Cloud Logging handler to the root logger
+            cloud_logging = startup.lazy_import('google.cloud.logging')
+            client = cloud_logging.Client()
+            client.setup_logging()
+
+        initialized = True
+
+
+class SessionInterface(SecureCookieSessionInterface):
+    """
+    Session interface that initializes the app before the session is opened,
+    because the session needs the secret key.
+    """
+
+    def open_session(self, app, request):
+        initialize()
+        return super().open_session(app, request)
+
+
+app.session_interface = SessionInterface()
+
+
+@app.before_request
+def record_first_request():
+    """
+    Log the time from startup to the first request.
+    """
+    if startup.record_first_request():
+        current_app.logger.info(f"time to first request: {startup.first_request_time:.3f}s")
 
-    # attach a Cloud Logging handler to the root logger
-    client = cloud_logging.Client()
-    client.setup_logging()
 
 def log_request(req):
     """
@@ -65,10 +119,82 @@ def log_request(req):
     """
     current_app.logger.info('REQ: {0} {1}'.format(req.method, req.url))
 
-# build a mapping of language codes to display names
-display_languages = {}
-for l in translate.get_languages():
-    display_languages[l.language_code] = l.display_name
+# mapping of language codes to display names, built on first use
+display_languages = None
+display_languages_lock = threading.Lock()
+
+
+def get_display_languages():
+    """
+    Return the mapping of language codes to display names.
+    """
+
+    # use the global variable
+    global display_languages
+
+    if display_languages is None:
+        with display_languages_lock:
+            if display_languages is None:
+                # build the mapping before publishing it, so no request
+                # sees a partly filled one
+                display_languages = {l.language_code: l.display_name
+                    for l in translate.get_languages()}
+
+    return display_languages
+
+
+# whether the mapping is being loaded in the background
+display_languages_loading = False
+
+
+def _load_display_languages():
+    """
+    Load the display language mapping, logging rather than raising errors.
+    """
+    global display_languages_loading
+    try:
+        get_display_languages()
+    except Exception as e:
+        logging.warning(f"could not load the language list: {e}")
+    finally:
+        display_languages_loading = False
+
+
+def loaded_display_languages():
+    """
+    Return the mapping of language codes to display names if it is loaded,
+    otherwise start loading it in the background and return None, so that
+    pages never wait for the Translation API.
+    """
+    global display_languages_loading
+    if display_languages is None and not display_languages_loading:
+        display_languages_loading = True
+        translate.translation_executor.submit(_load_display_languages)
+    return display_languages
+
+
+def display_name(language_code, languages):
+    """
+    Display name of a language, or its code if the names are not loaded.
+    """
+    if not languages:
+        return language_code
+    return languages.get(language_code, language_code)
+
+
+def warm_up():
+    """
+    Import the client libraries, create the clients and load the language
+    list, so that the first real request does not pay for them.
+    """
+    initialize()
+    get_display_languages()
+    booksdb.get_client()
+    profiledb.get_client()
+    storage.get_client()
+    startup.lazy_import('google_auth_oauthlib.flow')
+    startup.lazy_import('googleapiclient.discovery')
+    startup.lazy_import('google.cloud.error_reporting')
 
 
 def logout_session():
@@ -215,23 +341,71 @@ def view(book_id):
     description_language = None
     translation_language = None
     translated_text = ''
+    translation_pending = False
     if book['description'] and "credentials" in session:
         preferred_language = session.get('preferred_language', 'en')
 
-        # translate description
-        translation = translate.translate_text(
-            text=book['description'],
-            target_language_code=preferred_language,
-        )
-        description_language = display_languages[translation.detected_language_code]
-        translation_language = display_languages[preferred_language]
-        translated_text = translation.translated_text
+        # show a cached translation, otherwise translate in the background
+        # and let the page fetch it, so translation never delays the page;
+        # language codes stand in for names until the names are loaded
+        languages = loaded_display_languages()
+        translation_language = display_name(preferred_language, languages)
+        translation = translate.cached_translation(book['description'], preferred_language)
+        if translation is not None:
+            description_language = display_name(translation.detected_language_code, languages)
+            translated_text = translation.translated_text
+        else:
+            translate.translate_text_async(book['description'], preferred_language)
+            translation_pending = True
 
     # render book details
     return render_template('view.html', book=book,
         translated_text=translated_text,
         description_language=description_language,
         translation_language=translation_language,
+        translation_pending=translation_pending,
+    )
+
+
+@app.route('/books/<book_id>/translation')
+def translation(book_id):
+    """
+    Return the translation of a book's description as JSON.
+    Fetched by the book page when the translation was not cached.
+    """
+    log_request(request)
+
+    # must be logged in
+    if "credentials" not in session:
+        return jsonify(status='unauthorized'), 401
+
+    book = booksdb.read(book_id)
+    if book is None or not book['description']:
+        return jsonify(status='not_found'), 404
+
+    preferred_language = session.get('preferred_language', 'en')
+
+    try:
+        translation = translate.translate_text(
+            text=book['description'],
+            target_language_code=preferred_language,
+        )
+    except resilience.DependencyUnavailable as e:
+        current_app.logger.warning(f"translation unavailable: {e}")
+        return jsonify(status='unavailable'), 503
+
+    # the translation took a call to the API anyway, so wait for the names
+    try:
+        languages = get_display_languages()
+    except resilience.DependencyUnavailable as e:
+        current_app.logger.warning(f"showing language codes: {e}")
+        languages = None
+
+    return jsonify(
+        status='ready',
+        translated_text=translation.translated_text,
+        description_language=display_name(translation.detected_language_code, languages),
+        translation_language=display_name(preferred_language, languages),
     )
 
 
@@ -253,6 +427,7 @@ def add():
 
         # get book details from form
         data = request.form.to_dict(flat=True)
+        data.pop('version', None)
 
         image_url = upload_image_file(request.files.get('image'))
 
@@ -283,27 +458,60 @@ def edit(book_id):
         session['login_return'] = url_for('.edit', book_id=book_id)
         return redirect(url_for('.login'))
 
-    # read existing book details
-    book = booksdb.read(book_id)
-
     # Save details if form was posted
     if request.method == 'POST':
 
         # get book details from form
         data = request.form.to_dict(flat=True)
 
-        image_url = upload_image_file(request.files.get('image'))
-
-        # If an image was uploaded, update the data to point to the image.
-        if image_url:
-            data['imageUrl'] = image_url
-
-        # update book
-        book = booksdb.update(data, book_id)
+        # version of the book the form was based on
+        version = data.pop('version', None) or None
+
+        image_url = None
+        try:
+            # check before uploading, so a rejected edit leaves no image behind
+            booksdb.check_version(book_id, version)
+
+            image_url = upload_image_file(request.files.get('image'))
+
+            # If an image was uploaded, update the data to point to the image.
+            if image_url:
+                data['imageUrl'] = image_url
+
+            # update book, unless someone else changed it in the meantime
+            book = booksdb.update(data, book_id, version=version)
+        except (booksdb.ConflictError, booksdb.NotFoundError) as e:
+            image_message = ''
+            if image_url:
+                storage.delete_file(image_url)
+                data['imageUrl'] = request.form.get('imageUrl', '')
+                image_message = ' Choose the cover image again.'
+
+            if isinstance(e, booksdb.NotFoundError):
+                current_app.logger.info(f"edit of deleted book {book_id}")
+                return render_template('error.html',
+                    error_message='This book no longer exists.'), 404
+
+            current_app.logger.info(f"edit conflict for book {book_id}")
+
+            # keep the user's edits, based on the latest version, and show
+            # what is stored now so they can review and save again
+            data['version'] = e.current['version']
+            return render_template('form.html', action='Edit', book=data,
+                current=e.current,
+                conflict_message='This book was changed by someone else. '
+                    'Your changes are below and the saved details are shown '
+                    'underneath; review them and save again.' + image_message), 409
 
         # render book details
         return redirect(url_for('.view', book_id=book['id']))
 
+    # read existing book details
+    book = booksdb.read(book_id)
+    if book is None:
+        return render_template('error.html',
+            error_message='This book no longer exists.'), 404
+
     # render form to update book
     return render_template('form.html', action='Edit', book=book)
 
@@ -371,6 +579,7 @@ def raise_error():
     log_request(request)
 
     print('raise_error()')
+    error_reporting = startup.lazy_import('google.cloud.error_reporting')
     error_client = error_reporting.Client()
     error_message = 'Intentionally Created Error'
     error_client.report(
@@ -381,6 +590,51 @@ def raise_error():
     return redirect(url_for('.error'))
 
 
+@app.errorhandler(resilience.DependencyUnavailable)
+def dependency_unavailable(e):
+    """
+    Show an error page when a backing service is unavailable.
+    """
+    current_app.logger.error(f"dependency unavailable: {e}")
+    return render_template('error.html',
+        error_message=f"{e.dependency} is temporarily unavailable, please try again shortly."), 503
+
+
+@app.route('/metrics')
+def metrics():
+    """
+    Return circuit breaker state and call counters for each dependency.
+    Only served when METRICS_ENABLED=1, and only to logged-in users.
+    """
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify(status='not_found'), 404
+
+    # must be logged in
+    if "credentials" not in session:
+        return jsonify(status='unauthorized'), 401
+
+    return jsonify(resilience.metrics())
+
+
+@app.route('/warmup')
+def warmup():
+    """
+    Warm up the instance, for use as a Cloud Run startup probe.
+    Returns the startup timings, or an import time report if format=importtime.
+    """
+    log_request(request)
+
+    warm_up()
+
+    if request.args.get('format') == 'importtime':
+        return startup.import_report(), 200, {'Content-Type': 'text/plain'}
+    return jsonify(startup.report())
+
+
+# load everything at import when running in eager startup mode
+if startup.EAGER:
+    warm_up()
+
 
 # this is only used when running locally
 if __name__ == '__main__':
@@ -1,9 +1,8 @@
-import google.oauth2.credentials
-import google_auth_oauthlib.flow
 from uuid import uuid4
-from googleapiclient.discovery import build
 from werkzeug.exceptions import Unauthorized
 
+import startup
+
 def _credentials_to_dict(credentials):
     """
     Convert credentials mapping (object) into a dictionary.
@@ -26,7 +25,8 @@ def authorize(callback_uri, client_config, scopes):
     """
 
     # specify the flow configuration details
-    flow = google_auth_oauthlib.flow.Flow.from_client_config(
+    flow_module = startup.lazy_import('google_auth_oauthlib.flow')
+    flow = flow_module.Flow.from_client_config(
         client_config=client_config,
         scopes=scopes,
     )
@@ -58,7 +58,8 @@ def handle_callback(callback_uri, client_config, scopes, request_url, stored_sta
         raise Unauthorized(f'Invalid state parameter: received={received_state} stored={stored_state}')
 
     # specify the flow configuration details
-    flow = google_auth_oauthlib.flow.Flow.from_client_config(
+    flow_module = startup.lazy_import('google_auth_oauthlib.flow')
+    flow = flow_module.Flow.from_client_config(
         client_config=client_config,
         scopes=scopes
     )
@@ -68,7 +69,8 @@ def handle_callback(callback_uri, client_config, scopes, request_url, stored_sta
     flow.fetch_token(authorization_response=request_url)
     credentials = flow.credentials
 
-    oauth2_client = build('oauth2','v2',credentials=credentials, cache_discovery=False)
+    discovery = startup.lazy_import('googleapiclient.discovery')
+    oauth2_client = discovery.build('oauth2','v2',credentials=credentials, cache_discovery=False)
     user_info = oauth2_client.userinfo().get().execute()
 
     return _credentials_to_dict(credentials), user_info
@@ -1,8 +1,26 @@
-from google.cloud import firestore
+import resilience
+import startup
 
 
 default_profile = { "preferredLanguage": "en" }
 
+firestore_client = None
+
+
+def get_client():
+    """
+    Return the Firestore client, creating it on first use.
+    """
+
+    # use the global variable
+    global firestore_client
+
+    if firestore_client is None:
+        firestore = startup.lazy_import('google.cloud.firestore')
+        firestore_client = firestore.Client()
+
+    return firestore_client
+
 
 def __document_to_dict(doc):
     if not doc.exists:
@@ -17,12 +35,13 @@ def read(email):
     Return a profile by email.
     """
 
-    db = firestore.Client()
+    db = get_client()
 
     # retrieve a profile from the database by ID
     profile_ref = db.collection("profiles").document(email)
 
-    profile_dict = __document_to_dict(profile_ref.get())
+    profile_dict = __document_to_dict(
+        resilience.call('firestore', profile_ref.get, hedge=True, retry=None))
 
     # return empty dictionary if no profile
     if profile_dict is None:
@@ -45,11 +64,12 @@ def update(data, email):
     Update a profile, and return the updated profile's details.
     """
 
-    db = firestore.Client()
+    db = get_client()
 
     # update profile in database
     profile_ref = db.collection("profiles").document(email)
-    profile_ref.set(data)
+    resilience.call('firestore', profile_ref.set, data, retry=None)
 
-    return __document_to_dict(profile_ref.get())
+    return __document_to_dict(
+        resilience.call('firestore', profile_ref.get, hedge=True, retry=None))
 
@@ -0,0 +1,290 @@
+"""
+Deadlines, retries, circuit breakers and hedged reads for calls to
+Google Cloud services.
+
+Every call goes through call(), which gives it a per-dependency deadline,
+retries transient errors with jittered exponential backoff while the shared
+retry budget allows, and fails fast with DependencyUnavailable while the
+dependency's circuit breaker is open.
+"""
+
+import random
+import sys
+import threading
+import time
+from concurrent import futures
+
+# total time allowed for a call to each dependency, including retries (seconds)
+DEADLINES = {
+    'firestore': 5.0,
+    'storage': 30.0,
+    'translate': 3.0,
+    'secretmanager': 10.0,
+}
+DEFAULT_DEADLINE = 10.0
+
+# how long a read may take before a second, hedged copy is sent (seconds)
+HEDGE_DELAYS = {
+    'firestore': 0.25,
+}
+DEFAULT_HEDGE_DELAY = 0.5
+
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.1
+BACKOFF_MAX = 2.0
+
+# circuit breaker settings
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+# retries earned per call, and the most that can be saved up
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_MAX = 10.0
+
+# HTTP status codes of errors worth retrying
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class DependencyUnavailable(Exception):
+    """
+    Raised when a dependency's circuit breaker is open, or a call to it
+    failed after all allowed retries.
+    """
+
+    def __init__(self, dependency, message='unavailable'):
+        super().__init__(f'{dependency} {message}')
+        self.dependency = dependency
+
+
+class CircuitBreaker:
+    """
+    Opens after a run of consecutive failures, rejecting calls until the
+    reset timeout passes, then lets a single trial call through.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """
+        Return True if a call may be made now.
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self.trial_in_progress:
+                self.trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.trial_in_progress = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_progress = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of calls across all dependencies, so that
+    retries cannot multiply the load on a service that is already failing.
+    """
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, maximum=RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.tokens = maximum
+        self.lock = threading.Lock()
+
+    def record_call(self):
+        with self.lock:
+            self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def try_spend(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class Stats:
+    """
+    Counters for calls to a single dependency.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.rejected = 0
+        self.hedged = 0
+
+
+breakers = {}
+stats = {}
+retry_budget = RetryBudget()
+
+_lock = threading.Lock()
+_executor = futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix='hedge')
+
+
+def _get(dependency):
+    """
+    Return the circuit breaker and stats for a dependency.
+    """
+    with _lock:
+        if dependency not in breakers:
+            breakers[dependency] = CircuitBreaker()
+            stats[dependency] = Stats()
+        return breakers[dependency], stats[dependency]
+
+
+def _transport_errors():
+    """
+    Transient transport errors of the requests library, used by the Cloud
+    Storage client. They are not the builtin ConnectionError/TimeoutError
+    and have no status code. requests is only looked up once a client has
+    imported it, so this module does not import it at startup.
+    """
+    requests = sys.modules.get('requests')
+    if requests is None:
+        return ()
+    return (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+        requests.exceptions.ChunkedEncodingError)
+
+
+def _is_retryable(e):
+    """
+    Transient errors: timeouts, connection errors and retryable status codes.
+    """
+    if isinstance(e, (TimeoutError, ConnectionError) + _transport_errors()):
+        return True
+    return getattr(e, 'code', None) in RETRYABLE_CODES
+
+
+def _backoff(attempt):
+    """
+    Exponential backoff with full jitter.
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _hedged(dependency, dependency_stats, fn, args, kwargs, timeout):
+    """
+    Call fn, and if it has not finished within the hedge delay, call it
+    again in parallel and return whichever succeeds first.
+    """
+    delay = HEDGE_DELAYS.get(dependency, DEFAULT_HEDGE_DELAY)
+
+    first = _executor.submit(fn, *args, timeout=timeout, **kwargs)
+    done, _ = futures.wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    dependency_stats.hedged += 1
+    second = _executor.submit(fn, *args, timeout=max(0.0, timeout - delay), **kwargs)
+
+    error = None
+    pending = {first, second}
+    while pending:
+        done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def call(dependency, fn, *args, hedge=False, idempotent=True, **kwargs):
+    """
+    Call fn(*args, timeout=<seconds left>, **kwargs) under the dependency's
+    deadline, retry budget and circuit breaker.
+
+    Set hedge for idempotent reads that should be hedged, and idempotent=False
+    for calls that must not be retried.
+    """
+    breaker, dependency_stats = _get(dependency)
+    dependency_stats.calls += 1
+
+    if not breaker.allow():
+        dependency_stats.rejected += 1
+        raise DependencyUnavailable(dependency, 'circuit breaker is open')
+
+    retry_budget.record_call()
+    deadline = time.monotonic() + DEADLINES.get(dependency, DEFAULT_DEADLINE)
+    attempt = 0
+
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            if hedge:
+                result = _hedged(dependency, dependency_stats, fn, args, kwargs, remaining)
+            else:
+                result = fn(*args, timeout=remaining, **kwargs)
+        except Exception as e:
+            if not _is_retryable(e):
+                # the service answered, it just did not like the request
+                breaker.record_success()
+                raise
+
+            dependency_stats.failures += 1
+            breaker.record_failure()
+            attempt += 1
+
+            pause = _backoff(attempt)
+            if (not idempotent or attempt >= MAX_ATTEMPTS
+                    or time.monotonic() + pause >= deadline
+                    or not breaker.allow() or not retry_budget.try_spend()):
+                raise DependencyUnavailable(dependency, f'failed: {e}') from e
+
+            dependency_stats.retries += 1
+            time.sleep(pause)
+            continue
+
+        breaker.record_success()
+        return result
+
+
+def metrics():
+    """
+    Return circuit breaker state and call counters for every dependency.
+    """
+    with _lock:
+        dependencies = {}
+        for dependency, breaker in breakers.items():
+            dependency_stats = stats[dependency]
+            dependencies[dependency] = {
+                'state': breaker.state,
+                'consecutive_failures': breaker.failures,
+                'calls': dependency_stats.calls,
+                'failures': dependency_stats.failures,
+                'retries': dependency_stats.retries,
+                'rejected': dependency_stats.rejected,
+                'hedged': dependency_stats.hedged,
+            }
+
+    return {
+        'dependencies': dependencies,
+        'retry_budget_tokens': retry_budget.tokens,
+    }
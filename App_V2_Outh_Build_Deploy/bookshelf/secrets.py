@@ -1,17 +1,38 @@
 import os
-from google.cloud import secretmanager
+
+import resilience
+import startup
+
+secret_client = None
+
+
+def get_client():
+    """
+    Return the Secret Manager client, creating it on first use.
+    """
+
+    # use the global variable
+    global secret_client
+
+    if secret_client is None:
+        secretmanager = startup.lazy_import('google.cloud.secretmanager')
+        secret_client = secretmanager.SecretManagerServiceClient()
+
+    return secret_client
+
 
 def get_secret(secret_id, version_id='latest'):
 
-    # create the secret manager client
-    client = secretmanager.SecretManagerServiceClient()
+    # get the secret manager client
+    client = get_client()
 
     # build the resource name of the secret version
     project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
     name = f"projects/{project_id}/secrets/{secret_id}/versions/{version_id}"
 
     # access the secret version
-    response = client.access_secret_version(name=name)
+    response = resilience.call('secretmanager', client.access_secret_version,
+        name=name, retry=None)
 
     # return the decoded secret
     return response.payload.data.decode('UTF-8')
@@ -0,0 +1,136 @@
+"""
+Startup helpers: deferred imports, import timing and warm-up state.
+
+Set BOOKSHELF_STARTUP=eager to import and construct everything when the
+app module is loaded instead of on first use. Set BOOKSHELF_IMPORT_PROFILE=1
+to time every module imported after startup, similar to -X importtime.
+"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+
+PROCESS_START = time.perf_counter()
+
+EAGER = os.getenv('BOOKSHELF_STARTUP', 'lazy') == 'eager'
+IMPORT_PROFILE = os.getenv('BOOKSHELF_IMPORT_PROFILE') == '1'
+
+# seconds spent in each deferred import (cumulative, including dependencies)
+import_times = {}
+
+# (self seconds, cumulative seconds, depth) for every module, if profiling
+module_times = {}
+
+first_request_time = None
+
+_lock = threading.Lock()
+
+
+class _TimedLoader:
+    """
+    Wraps a module loader to record how long executing the module takes.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        _ImportProfiler.stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = _ImportProfiler.stack.pop()
+            if _ImportProfiler.stack:
+                _ImportProfiler.stack[-1] += cumulative
+            module_times[module.__name__] = (
+                cumulative - children, cumulative, len(_ImportProfiler.stack))
+
+
+class _ImportProfiler:
+    """
+    Meta path finder that times the loading of every module.
+    """
+
+    stack = []
+
+    @classmethod
+    def find_spec(cls, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is cls or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+if IMPORT_PROFILE:
+    sys.meta_path.insert(0, _ImportProfiler)
+
+
+def lazy_import(name):
+    """
+    Import a module on first use, recording how long the import took.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        import_times.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def record_first_request():
+    """
+    Record the time from process start to the first request.
+    Returns True only for the first request.
+    """
+    global first_request_time
+
+    with _lock:
+        if first_request_time is not None:
+            return False
+        first_request_time = time.perf_counter() - PROCESS_START
+    return True
+
+
+def import_report():
+    """
+    Return an -X importtime style report of the deferred imports, or of
+    every module if import profiling is enabled.
+    """
+    lines = ['import time: self [us] | cumulative | imported package']
+    if module_times:
+        for name, (self_time, cumulative, depth) in module_times.items():
+            lines.append(f"import time: {int(self_time * 1e6):>9} | {int(cumulative * 1e6):>10} | {'  ' * depth}{name}")
+    else:
+        for name, cumulative in import_times.items():
+            lines.append(f"import time: {'':>9} | {int(cumulative * 1e6):>10} | {name}")
+    return '\n'.join(lines)
+
+
+def report():
+    """
+    Return startup timings as a dictionary.
+    """
+    return {
+        'mode': 'eager' if EAGER else 'lazy',
+        'uptime_seconds': time.perf_counter() - PROCESS_START,
+        'first_request_seconds': first_request_time,
+        'import_seconds': dict(import_times),
+    }
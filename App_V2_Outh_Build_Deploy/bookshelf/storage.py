@@ -7,7 +7,25 @@ from flask import current_app
 from werkzeug.exceptions import BadRequest
 from werkzeug.utils import secure_filename
 
-from google.cloud import storage
+import resilience
+import startup
+
+storage_client = None
+
+
+def get_client():
+    """
+    Return the Cloud Storage client, creating it on first use.
+    """
+
+    # use the global variable
+    global storage_client
+
+    if storage_client is None:
+        storage = startup.lazy_import('google.cloud.storage')
+        storage_client = storage.Client()
+
+    return storage_client
 
 
 def _check_extension(filename, allowed_extensions):
@@ -44,7 +62,7 @@ def upload_file(file_stream, filename, content_type):
     # build the name of the bucket
     bucket_name = os.getenv('GOOGLE_CLOUD_PROJECT') + '-covers'
 
-    client = storage.Client()
+    client = get_client()
 
     # create a bucket object
     bucket = client.bucket(bucket_name)
@@ -52,10 +70,12 @@ def upload_file(file_stream, filename, content_type):
     # create an object in the bucket for the specified path
     blob = bucket.blob(filename)
 
-    # upload the contents of the string into the object
-    blob.upload_from_string(
+    # upload the contents of the string into the object; retries are left to
+    # resilience.call rather than stacked on the library's own
+    resilience.call('storage', blob.upload_from_string,
         file_stream,
-        content_type=content_type)
+        content_type=content_type,
+        retry=None)
 
     # get the public URL for the object, which is used for storing a reference
     # to the image in the database and displaying the image in the app
@@ -64,6 +84,20 @@ def upload_file(file_stream, filename, content_type):
     return url
 
 
+def delete_file(public_url):
+    """
+    Delete an object uploaded by upload_file, given its public URL.
+    Used to remove an uploaded image that ended up not being saved.
+    """
+    bucket_name = os.getenv('GOOGLE_CLOUD_PROJECT') + '-covers'
+    prefix = f"https://storage.googleapis.com/{bucket_name}/"
+    if not public_url or not public_url.startswith(prefix):
+        return
+
+    blob = get_client().bucket(bucket_name).blob(public_url[len(prefix):])
+    resilience.call('storage', blob.delete, retry=None)
+
+
 def upload_image(img):
     """
     Upload the user-uploaded file to Cloud Storage and retrieve its
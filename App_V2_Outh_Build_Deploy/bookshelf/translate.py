@@ -1,11 +1,45 @@
+import hashlib
 import os
-from google.cloud import translate
+import threading
+from collections import OrderedDict
+from concurrent import futures
+
+import resilience
+import startup
 
 PROJECT_ID = os.getenv('GOOGLE_CLOUD_PROJECT')
 PARENT = f"projects/{PROJECT_ID}"
 
+# number of recent translations kept in memory
+TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', 1024))
+
 supported_languages = None
 
+# recent translations and in-progress translations, keyed by _cache_key()
+translations = OrderedDict()
+in_flight = {}
+translations_lock = threading.Lock()
+
+translation_executor = futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix='translate')
+
+translation_client = None
+
+
+def get_client():
+    """
+    Return the Translation client, creating it on first use.
+    """
+
+    # use the global variable
+    global translation_client
+
+    if translation_client is None:
+        translate = startup.lazy_import('google.cloud.translate')
+        translation_client = translate.TranslationServiceClient()
+
+    return translation_client
+
+
 def get_languages():
     """
     Gets the list of supported languages.
@@ -16,11 +50,12 @@ def get_languages():
 
     # retrieve supported languages if not previously retrieved
     if not supported_languages:
-        client = translate.TranslationServiceClient()
+        client = get_client()
 
-        response = client.get_supported_languages(
+        response = resilience.call('translate', client.get_supported_languages,
             parent=PARENT,
             display_language_code='en',
+            retry=None,
         )
 
         supported_languages = response.languages
@@ -34,27 +69,89 @@ def detect_language(text):
     Returns the most likely language.
     """
 
-    client = translate.TranslationServiceClient()
+    client = get_client()
 
-    response = client.detect_language(
+    response = resilience.call('translate', client.detect_language,
         parent=PARENT,
         content=text,
+        retry=None,
     )
 
     return response.languages[0]
 
 
+def _cache_key(text, target_language_code):
+    """
+    Key for a translation; a changed text gets a new key.
+    """
+    return (target_language_code, hashlib.sha256(text.encode('utf-8')).hexdigest())
+
+
+def cached_translation(text, target_language_code):
+    """
+    Return the translation if it is in the cache, or None.
+    """
+    key = _cache_key(text, target_language_code)
+    with translations_lock:
+        translation = translations.get(key)
+        if translation is not None:
+            translations.move_to_end(key)
+        return translation
+
+
+def _translate_and_cache(key, text, target_language_code):
+    """
+    Translate the text and add the translation to the cache.
+    """
+    try:
+        translation = _translate(text, target_language_code)
+        with translations_lock:
+            translations[key] = translation
+            while len(translations) > TRANSLATION_CACHE_SIZE:
+                translations.popitem(last=False)
+        return translation
+    finally:
+        with translations_lock:
+            in_flight.pop(key, None)
+
+
+def translate_text_async(text, target_language_code):
+    """
+    Start translating the text in the background and return a future.
+    Requests for a translation that is already in progress share it.
+    """
+    key = _cache_key(text, target_language_code)
+    with translations_lock:
+        future = in_flight.get(key)
+        if future is None:
+            future = translation_executor.submit(_translate_and_cache, key, text, target_language_code)
+            in_flight[key] = future
+    return future
+
+
 def translate_text(text, target_language_code):
+    """
+    Translate the text to the target language, using the cache if possible.
+    """
+    translation = cached_translation(text, target_language_code)
+    if translation is not None:
+        return translation
+
+    return translate_text_async(text, target_language_code).result()
+
+
+def _translate(text, target_language_code):
     """
     Translate the text to the target language.
     """
 
-    client = translate.TranslationServiceClient()
+    client = get_client()
 
-    response = client.translate_text(
+    response = resilience.call('translate', client.translate_text,
         parent=PARENT,
         contents=[text],
         target_language_code=target_language_code,
+        retry=None,
     )
 
     return response.translations[0]
@@ -154,6 +154,9 @@ gcloud builds submit --tag "$REGION-docker.pkg.dev/$PROJECT_ID/$AR_REPO/$SERVICE
 # --set-env-vars: Environment variables passed to container
 #   PROJECT_ID: Used by app to access Vertex AI
 #   REGION: Used by app to access regional Vertex AI endpoint
+#   OUTPUT_STORE_LOG: Cloud Logging log that keeps every full prompt and response
+#     (the container's own disk is lost when an instance stops); needs the
+#     service account to have roles/logging.logWriter
 # Exam Tip: Environment variables visible in console; use Secrets for sensitive data
 # Auto-scaling: 0 to 1000 instances by default
 gcloud run deploy "$SERVICE_NAME" \
@@ -163,7 +166,7 @@ gcloud run deploy "$SERVICE_NAME" \
   --region=$REGION \
   --platform=managed  \
   --project=$PROJECT_ID \
-  --set-env-vars=PROJECT_ID=$PROJECT_ID,REGION=$REGION
+  --set-env-vars=PROJECT_ID=$PROJECT_ID,REGION=$REGION,OUTPUT_STORE_LOG=gemini-outputs
 
 ################################################################################
 # LAB COMPLETE - KEY CONCEPTS REVIEW